@@ -0,0 +1,312 @@
+"""
+Admission control và fair scheduling cho các lời gọi solver.
+
+Mỗi vòng gọi solver của request /pack, /pack_step_by_step phải giữ một slot; slot được
+trả lại sau mỗi vòng, nên các vòng sau (spill-over sang container khác, vòng so sánh của
+decomposition) được xếp hàng lại theo kích thước của chính vòng đó.
+Số slot của process là ADMISSION_MAX_CONCURRENT; mỗi client (xem client_key) giữ tối
+đa ADMISSION_CLIENT_CONCURRENCY slot cùng lúc. Khi hết slot, request chờ trong hàng
+đợi; slot trống được trao cho request chờ tốt nhất theo ADMISSION_POLICY:
+- "smallest": manifest ít items nhất trước; độ ưu tiên tăng dần theo thời gian chờ
+  (ADMISSION_AGING giây) để manifest lớn không bị đói
+- "fair": start-time fair queuing theo số items - mỗi client nhận phần solver tỉ lệ với
+  trọng số (ADMISSION_CLIENT_WEIGHTS, ví dụ "planner-a=2,batch=0.5"), bất kể kích thước
+  manifest từng request
+
+Hàng đợi đầy (ADMISSION_MAX_QUEUE / ADMISSION_CLIENT_QUEUE) hoặc chờ quá
+ADMISSION_QUEUE_TIMEOUT giây -> 429 với header Retry-After ước lượng từ thời gian giữ slot
+trung bình.
+
+Giới hạn áp dụng cho từng process (worker), nên chỉ có tác dụng khi một process xử lý
+nhiều request cùng lúc: ASGI mode hoặc WSGI worker nhiều thread (gunicorn.conf.py dùng
+gthread). gunicorn.conf.py cảnh báo lúc khởi động nếu cấu hình worker đồng bộ; admission
+không bao giờ tự tắt, nhưng request đầu tiên chạy trên worker đồng bộ (wsgi.multithread =
+False) được ghi log cảnh báo và /admission báo lại.
+
+ADMISSION_MAX_CONCURRENT=0 (mặc định) tắt scheduler: admitted() là nullcontext.
+"""
+import asyncio
+import hmac
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+
+ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', 0))
+ADMISSION_CLIENT_CONCURRENCY = int(os.environ.get('ADMISSION_CLIENT_CONCURRENCY', 2))
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', 100))
+ADMISSION_CLIENT_QUEUE = int(os.environ.get('ADMISSION_CLIENT_QUEUE', 20))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 30))
+ADMISSION_POLICY = os.environ.get('ADMISSION_POLICY', 'smallest')
+ADMISSION_AGING = float(os.environ.get('ADMISSION_AGING', 10))
+ADMISSION_CLIENT_HEADER = os.environ.get('ADMISSION_CLIENT_HEADER', 'X-Client-Id')
+# ADMISSION_CLIENT_HEADER chỉ được tin khi proxy xác thực gửi kèm X-Proxy-Token bằng giá trị này
+ADMISSION_PROXY_TOKEN = os.environ.get('ADMISSION_PROXY_TOKEN') or None
+# Số reverse proxy tin cậy phía trước app (1 với nginx.conf); 0 = dùng địa chỉ kết nối
+ADMISSION_PROXY_HOPS = int(os.environ.get('ADMISSION_PROXY_HOPS', 0))
+ADMISSION_CLIENT_WEIGHTS = {
+    name.strip(): float(weight)
+    for name, _, weight in (
+        entry.partition('=') for entry in os.environ.get('ADMISSION_CLIENT_WEIGHTS', '').split(',') if '=' in entry
+    )
+}
+# Số lần chờ gần nhất dùng cho percentiles trong metrics
+METRICS_WINDOW = 1000
+
+
+class AdmissionRejected(Exception):
+    """Request bị từ chối (hàng đợi đầy hoặc chờ quá lâu) - trả về 429 với Retry-After"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+class Waiter:
+    def __init__(self, client, cost, wake):
+        self.client = client
+        self.cost = cost
+        self.wake = wake
+        self.enqueued_at = time.monotonic()
+        self.granted_at = None
+        self.tag = 0.0
+
+    @property
+    def queue_time(self):
+        return (self.granted_at or time.monotonic()) - self.enqueued_at
+
+
+class FairScheduler:
+    def __init__(self, max_concurrent, client_concurrency=ADMISSION_CLIENT_CONCURRENCY,
+                 max_queue=ADMISSION_MAX_QUEUE, client_queue=ADMISSION_CLIENT_QUEUE,
+                 policy=ADMISSION_POLICY, weights=None):
+        self.max_concurrent = max_concurrent
+        self.client_concurrency = client_concurrency
+        self.max_queue = max_queue
+        self.client_queue = client_queue
+        self.policy = policy
+        self.weights = weights if weights is not None else ADMISSION_CLIENT_WEIGHTS
+        self.lock = threading.Lock()
+        self.waiting = []
+        self.running = 0
+        self.client_running = Counter()
+        self.client_waiting = Counter()
+        # Fair queuing: virtual time và start tag kế tiếp của từng client
+        self.virtual_time = 0.0
+        self.client_finish = {}
+        # Metrics
+        self.queue_times = deque(maxlen=METRICS_WINDOW)
+        self.admitted = Counter()
+        self.rejected = Counter()
+        self.hold_time = None
+
+    def _priority(self, waiter, now):
+        if self.policy == 'fair':
+            return waiter.tag
+        return waiter.cost / (1 + (now - waiter.enqueued_at) / ADMISSION_AGING)
+
+    def _dispatch(self):
+        """Trao slot trống cho các request chờ tốt nhất còn được phép chạy (gọi khi giữ lock)"""
+        granted = []
+        now = time.monotonic()
+        while self.running < self.max_concurrent:
+            eligible = [w for w in self.waiting if self.client_running[w.client] < self.client_concurrency]
+            if not eligible:
+                break
+            waiter = min(eligible, key=lambda w: (self._priority(w, now), w.enqueued_at))
+            self.waiting.remove(waiter)
+            self.client_waiting[waiter.client] -= 1
+            self.running += 1
+            self.client_running[waiter.client] += 1
+            self.virtual_time = max(self.virtual_time, waiter.tag)
+            waiter.granted_at = now
+            granted.append(waiter)
+        return granted
+
+    def retry_after(self):
+        """Ước lượng số giây tới khi có slot cho request mới"""
+        hold_time = self.hold_time or 1.0
+        return max(1, math.ceil(hold_time * (len(self.waiting) + 1) / max(self.max_concurrent, 1)))
+
+    def _reject(self, client, message):
+        self.rejected[client] += 1
+        return AdmissionRejected(message, self.retry_after())
+
+    def enqueue(self, waiter):
+        """Thêm request vào hàng đợi và trao slot nếu được; raise AdmissionRejected nếu hàng đợi đầy"""
+        with self.lock:
+            if len(self.waiting) >= self.max_queue:
+                raise self._reject(waiter.client, 'Hệ thống đang quá tải, vui lòng thử lại sau')
+            if self.client_waiting[waiter.client] >= self.client_queue:
+                raise self._reject(waiter.client, 'Quá nhiều request đang chờ của client này, vui lòng thử lại sau')
+            weight = self.weights.get(waiter.client, 1.0)
+            waiter.tag = max(self.virtual_time, self.client_finish.get(waiter.client, 0.0))
+            self.client_finish[waiter.client] = waiter.tag + waiter.cost / weight
+            self.waiting.append(waiter)
+            self.client_waiting[waiter.client] += 1
+            granted = self._dispatch()
+        for other in granted:
+            other.wake()
+
+    def cancel(self, waiter):
+        """Bỏ request khỏi hàng đợi khi hết thời gian chờ; trả về False nếu nó vừa được trao slot"""
+        with self.lock:
+            if waiter.granted_at is not None:
+                return False
+            self.waiting.remove(waiter)
+            self.client_waiting[waiter.client] -= 1
+            raise self._reject(waiter.client, f'Request đã chờ quá {ADMISSION_QUEUE_TIMEOUT:g}s trong hàng đợi solver')
+
+    def abandon(self, waiter):
+        """Request bị hủy khi đang chờ (client ngắt kết nối): bỏ khỏi hàng đợi hoặc trả lại slot"""
+        with self.lock:
+            granted = waiter.granted_at is not None
+            if not granted:
+                self.waiting.remove(waiter)
+                self.client_waiting[waiter.client] -= 1
+        if granted:
+            self.release(waiter)
+
+    def release(self, waiter):
+        with self.lock:
+            self.running -= 1
+            self.client_running[waiter.client] -= 1
+            held = time.monotonic() - waiter.granted_at
+            self.hold_time = held if self.hold_time is None else 0.8 * self.hold_time + 0.2 * held
+            self.queue_times.append(waiter.queue_time)
+            self.admitted[waiter.client] += 1
+            granted = self._dispatch()
+        for other in granted:
+            other.wake()
+
+    @contextmanager
+    def slot(self, client, cost, timeout=ADMISSION_QUEUE_TIMEOUT):
+        event = threading.Event()
+        waiter = Waiter(client, cost, event.set)
+        self.enqueue(waiter)
+        if waiter.granted_at is None and not event.wait(timeout):
+            self.cancel(waiter)
+        try:
+            yield waiter
+        finally:
+            self.release(waiter)
+
+    @asynccontextmanager
+    async def aslot(self, client, cost, timeout=ADMISSION_QUEUE_TIMEOUT):
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = Waiter(client, cost, lambda: loop.call_soon_threadsafe(event.set))
+        self.enqueue(waiter)
+        if waiter.granted_at is None:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                self.cancel(waiter)
+            except asyncio.CancelledError:
+                self.abandon(waiter)
+                raise
+        try:
+            yield waiter
+        finally:
+            self.release(waiter)
+
+    def snapshot(self):
+        with self.lock:
+            queue_times = sorted(self.queue_times)
+            clients = set(self.client_running) | set(self.client_waiting) | set(self.admitted) | set(self.rejected)
+            return {
+                'enabled': True,
+                'policy': self.policy,
+                'max_concurrent': self.max_concurrent,
+                'client_concurrency': self.client_concurrency,
+                'running': self.running,
+                'waiting': len(self.waiting),
+                'hold_time': self.hold_time,
+                'queue_time': {
+                    'samples': len(queue_times),
+                    'p50': queue_times[len(queue_times) // 2] if queue_times else None,
+                    'p95': queue_times[int(len(queue_times) * 0.95)] if queue_times else None,
+                    'max': queue_times[-1] if queue_times else None
+                },
+                'clients': {
+                    client: {
+                        'running': self.client_running[client],
+                        'waiting': self.client_waiting[client],
+                        'admitted': self.admitted[client],
+                        'rejected': self.rejected[client]
+                    }
+                    for client in sorted(clients)
+                }
+            }
+
+
+_scheduler = FairScheduler(ADMISSION_MAX_CONCURRENT) if ADMISSION_MAX_CONCURRENT > 0 else None
+_serving_warning = None
+
+SYNC_WORKER_WARNING = 'sync worker: mỗi process chỉ chạy một request nên không có request nào phải chờ slot; dùng ASGI mode hoặc WSGI worker nhiều thread'
+
+def get_scheduler():
+    return _scheduler
+
+def warn_sync_worker():
+    """Ghi log một lần khi admission chạy trên worker đồng bộ (admission vẫn bật)"""
+    global _serving_warning
+    if _serving_warning is None:
+        _serving_warning = SYNC_WORKER_WARNING
+        logging.warning(f"Admission control: {SYNC_WORKER_WARNING}")
+
+def client_key(headers, remote_addr=None):
+    """
+    Định danh client cho admission control:
+    - ADMISSION_CLIENT_HEADER, chỉ khi request có X-Proxy-Token khớp ADMISSION_PROXY_TOKEN
+    - sau ADMISSION_PROXY_HOPS proxy tin cậy: X-Real-IP (một proxy, nginx ghi đè header này)
+      hoặc phần tử X-Forwarded-For do proxy tin cậy ngoài cùng thêm vào
+    - địa chỉ kết nối
+    Phần đầu X-Forwarded-For do client tự gửi nên không bao giờ được dùng.
+    """
+    if ADMISSION_PROXY_TOKEN is not None:
+        token = headers.get('X-Proxy-Token', '')
+        client = headers.get(ADMISSION_CLIENT_HEADER)
+        if client and hmac.compare_digest(token.encode(), ADMISSION_PROXY_TOKEN.encode()):
+            return client
+    if ADMISSION_PROXY_HOPS > 0:
+        real_ip = headers.get('X-Real-IP')
+        if ADMISSION_PROXY_HOPS == 1 and real_ip:
+            return real_ip.strip()
+        forwarded = [entry.strip() for entry in headers.get('X-Forwarded-For', '').split(',') if entry.strip()]
+        if len(forwarded) >= ADMISSION_PROXY_HOPS:
+            return forwarded[-ADMISSION_PROXY_HOPS]
+    return remote_addr or 'unknown'
+
+def solver_cost(solver_requests):
+    """Kích thước công việc của các solver request: tổng số items"""
+    return sum(int(item.get('quantity', 1)) for solver_request in solver_requests for item in solver_request.get('items', []))
+
+def admitted(client, solver_requests, multithread=True):
+    """
+    Context manager giữ slot solver cho một vòng gọi solver (sync); nullcontext nếu tắt
+    hoặc không gọi solver. multithread: wsgi.multithread của request (False -> cảnh báo).
+    """
+    if _scheduler is None or not solver_requests:
+        return nullcontext()
+    if not multithread:
+        warn_sync_worker()
+    return _scheduler.slot(client, solver_cost(solver_requests))
+
+def aadmitted(client, solver_requests):
+    """Như admitted() cho ASGI mode (async with)"""
+    if _scheduler is None or not solver_requests:
+        return nullcontext()
+    return _scheduler.aslot(client, solver_cost(solver_requests))
+
+def admission_metrics():
+    if _scheduler is None:
+        return {'enabled': False}
+    metrics = _scheduler.snapshot()
+    if _serving_warning is not None:
+        metrics['warning'] = _serving_warning
+    return metrics
@@ -1,14 +1,39 @@
 import os
 import logging
 from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import DeclarativeBase
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+
 # Create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 
+# Configure the run history database (SQLite locally, PostgreSQL via DATABASE_URL in production)
+database_url = os.environ.get("DATABASE_URL", "sqlite:///packing_runs.db")
+if database_url.startswith("postgres://"):
+    database_url = database_url.replace("postgres://", "postgresql://", 1)
+app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+    "pool_recycle": 300,
+    "pool_pre_ping": True,
+}
+app.config["RUN_STORE_ENABLED"] = os.environ.get("RUN_STORE_ENABLED", "1") != "0"
+db.init_app(app)
+
+with app.app_context():
+    import models  # noqa: F401
+    db.create_all()
+
 # Import routes after app creation to avoid circular imports
 from routes import *
 
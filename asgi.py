@@ -0,0 +1,293 @@
+"""
+ASGI serving mode.
+
+Các route gọi tới external packing endpoint (/pack, /pack_step_by_step,
+/check_endpoint) chạy trực tiếp trên asyncio event loop với httpx async client,
+nên mỗi request đang chờ solver không chiếm một worker. Các bước tốn CPU
+(validate/chuyển đổi items, tính utilization và training score) được đẩy sang
+executor. Các route còn lại được phục vụ bởi Flask app hiện có qua WSGI adapter.
+
+Chạy với:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+from app import app as flask_app
+from packing import (
+    PackingError, build_step_request, log_packing_request, shape_step_result, solver_error_message,
+    validate_endpoint_url, shape_health_status
+)
+from pipeline import PackPlan, plan_pack, solver_results, finish_pack
+from admission import AdmissionRejected, aadmitted, client_key
+from health_monitor import acached_health, record_call, route_endpoint
+from recording import start_recording
+from profiling import aprofiled, active_sampler, sampled_call
+from run_store import save_run, attach_incremental_base
+from solver_client import (
+    acall_solver, acall_solver_many, close_async_client, SolverUnavailable, SolverTimeout
+)
+
+# Executor cho các bước tốn CPU: "process" (mặc định) hoặc "thread"
+CPU_EXECUTOR = os.environ.get('PACKING_CPU_EXECUTOR', 'process')
+CPU_WORKERS = int(os.environ.get('PACKING_CPU_WORKERS', 0)) or None
+
+_cpu_executor = None
+
+def get_cpu_executor():
+    global _cpu_executor
+    if _cpu_executor is None:
+        if CPU_EXECUTOR == 'thread':
+            _cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS)
+        else:
+            # spawn: không fork process đang chạy event loop và connection pool
+            _cpu_executor = ProcessPoolExecutor(
+                max_workers=CPU_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+    return _cpu_executor
+
+async def run_cpu(func, *args):
+    """Chạy func(*args) trên CPU executor mà không block event loop"""
+    loop = asyncio.get_running_loop()
+    sampler = active_sampler()
+    if sampler is None:
+        return await loop.run_in_executor(get_cpu_executor(), func, *args)
+    # Request đang được profile: lấy mẫu ngay trong worker (thread hoặc process)
+    result, counts, samples = await loop.run_in_executor(get_cpu_executor(), sampled_call, func, *args)
+    sampler.add(counts, samples)
+    return result
+
+def in_app_context(func, *args):
+    """Chạy func cần Flask app context (run store) - gọi qua asyncio.to_thread"""
+    with flask_app.app_context():
+        return func(*args)
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def admission_rejected(error):
+    """Response 429 khi admission control từ chối request"""
+    return JSONResponse({
+        'success': False,
+        'message': error.message,
+        'retry_after': error.retry_after
+    }, status_code=429, headers={'Retry-After': str(error.retry_after)})
+
+
+async def check_packing_endpoint(request):
+    """Kiểm tra endpoint thuật toán packing có hoạt động không (trạng thái từ health monitor)"""
+    try:
+        data = await read_json(request)
+        endpoint_url = validate_endpoint_url(data or {})
+
+        # Chỉ probe (qua async client, không chiếm thread) khi chưa có trạng thái còn mới trong cache
+        payload, status_code = shape_health_status(await acached_health(endpoint_url))
+        return JSONResponse(payload, status_code=status_code)
+
+    except PackingError as e:
+        return JSONResponse({'success': False, 'message': e.message}, status_code=e.status_code)
+    except Exception as e:
+        logging.error(f"Check endpoint error: {str(e)}")
+        return JSONResponse({
+            'success': False,
+            'message': f'Lỗi server: {str(e)}'
+        }, status_code=500)
+
+async def pack_items(request):
+    """API endpoint for packing items - async version"""
+    try:
+        start_time = time.time()
+        logging.info("Starting packing request...")
+
+        data = await read_json(request)
+        # Ghi/đọc DB là blocking I/O - chạy trong thread
+        await asyncio.to_thread(in_app_context, attach_incremental_base, data)
+        recording = request.state.recording = start_recording('/pack', data, start_time)
+        plan = await run_cpu(plan_pack, data)
+
+        try:
+            root_plan = plan
+            solver_time = 0.0
+            queue_time = None
+            client = client_key(request.headers, request.client.host if request.client else None)
+            while True:
+                logging.info(f"Calling external packing endpoint ({len(plan.calls)} requests)...")
+                for packing_request in plan.calls:
+                    log_packing_request(packing_request)
+
+                # Admission control: mỗi vòng gọi solver chờ slot theo client và kích thước của vòng đó
+                async with aadmitted(client, plan.calls) as ticket:
+                    solver_start = time.time()
+                    endpoint = route_endpoint(plan.endpoint)
+                    try:
+                        responses = await acall_solver_many(endpoint, plan.calls)
+                    except (SolverUnavailable, SolverTimeout) as e:
+                        record_call(endpoint, error=e)
+                        raise
+                    record_call(endpoint, responses)
+                    solver_time += time.time() - solver_start
+                if ticket is not None:
+                    queue_time = (queue_time or 0.0) + ticket.queue_time
+                if recording is not None:
+                    recording.add_calls(plan.calls, responses, time.time() - solver_start)
+
+                results = solver_results(responses)
+                outcome = await run_cpu(finish_pack, plan, results, time.time() - start_time)
+                if not isinstance(outcome, PackPlan):
+                    break
+                plan = outcome
+
+            payload = outcome
+            if queue_time is not None:
+                payload['queue_time'] = queue_time
+            payload['run_id'] = await asyncio.to_thread(
+                in_app_context, save_run, root_plan.endpoint, root_plan.manifest, payload, solver_time, root_plan.mode
+            )
+            return JSONResponse(payload)
+
+        except PackingError:
+            raise
+        except AdmissionRejected as e:
+            return admission_rejected(e)
+        except SolverUnavailable:
+            return JSONResponse({
+                'success': False,
+                'message': 'Không thể kết nối tới packing endpoint. Kiểm tra URL và server có đang chạy không.'
+            }, status_code=400)
+        except SolverTimeout:
+            return JSONResponse({
+                'success': False,
+                'message': 'Packing endpoint không phản hồi trong thời gian cho phép (timeout)'
+            }, status_code=504)
+        except Exception as e:
+            logging.error(f"External endpoint call error: {str(e)}")
+            return JSONResponse({
+                'success': False,
+                'message': f'Lỗi khi gọi external endpoint: {str(e)}'
+            }, status_code=500)
+
+    except PackingError as e:
+        return JSONResponse({'success': False, 'message': e.message}, status_code=e.status_code)
+    except Exception as e:
+        logging.error(f"Packing error: {str(e)}")
+        return JSONResponse({
+            'success': False,
+            'message': f'Server error: {str(e)}'
+        }, status_code=500)
+
+async def pack_items_step_by_step(request):
+    """API endpoint for step-by-step packing - async version"""
+    try:
+        start_time = time.time()
+        logging.info("Starting step-by-step packing request...")
+
+        data = await read_json(request)
+        packing_endpoint, packing_request, bin_dims = await run_cpu(build_step_request, data)
+        packing_endpoint = route_endpoint(packing_endpoint)
+        recording = request.state.recording = start_recording('/pack_step_by_step', data, start_time)
+
+        try:
+            logging.info("Calling external step-by-step packing endpoint...")
+
+            async with aadmitted(client_key(request.headers, request.client.host if request.client else None), [packing_request]):
+                try:
+                    response = await acall_solver(packing_endpoint, packing_request)
+                except (SolverUnavailable, SolverTimeout) as e:
+                    record_call(packing_endpoint, error=e)
+                    raise
+                record_call(packing_endpoint, [response])
+            if recording is not None:
+                recording.add_calls([packing_request], [response], response.elapsed)
+
+            if response.status_code == 200:
+                end_time = time.time()
+                result = await run_cpu(
+                    shape_step_result, response.body, bin_dims, end_time - start_time, data.get('step_encoding', 'delta')
+                )
+                return JSONResponse(result)
+
+            error_msg = solver_error_message(response.status_code, response.body, response.text)
+            logging.error(f"External step-by-step endpoint error: {error_msg}")
+            return JSONResponse({'success': False, 'message': error_msg}, status_code=400)
+
+        except AdmissionRejected as e:
+            return admission_rejected(e)
+        except SolverUnavailable:
+            return JSONResponse({
+                'success': False,
+                'message': 'Không thể kết nối tới packing endpoint'
+            }, status_code=400)
+        except SolverTimeout:
+            return JSONResponse({
+                'success': False,
+                'message': 'Packing endpoint không phản hồi trong thời gian cho phép (timeout)'
+            }, status_code=504)
+        except Exception as e:
+            logging.error(f"External step-by-step endpoint call error: {str(e)}")
+            return JSONResponse({
+                'success': False,
+                'message': f'Lỗi khi gọi external endpoint: {str(e)}'
+            }, status_code=500)
+
+    except PackingError as e:
+        return JSONResponse({'success': False, 'message': e.message}, status_code=e.status_code)
+    except Exception as e:
+        logging.error(f"Step-by-step packing error: {str(e)}")
+        return JSONResponse({
+            'success': False,
+            'message': f'Server error: {str(e)}'
+        }, status_code=500)
+
+
+def recorded(handler):
+    """Hoàn tất traffic recording của request (nếu có) với response cuối cùng của handler"""
+    async def endpoint(request):
+        response = await handler(request)
+        recording = getattr(request.state, 'recording', None)
+        if recording is not None:
+            recording.finish(response.status_code, json.loads(response.body))
+        return response
+    return endpoint
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await close_async_client()
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Function to register all async routes; mọi route khác chuyển sang Flask app
+def create_asgi_app(wsgi_app=flask_app):
+    return Starlette(
+        routes=[
+            Route('/check_endpoint', check_packing_endpoint, methods=['POST']),
+            Route('/pack', aprofiled(recorded(pack_items), '/pack'), methods=['POST']),
+            Route('/pack_step_by_step', aprofiled(recorded(pack_items_step_by_step), '/pack_step_by_step'), methods=['POST']),
+            Mount('/', app=WSGIMiddleware(wsgi_app)),
+        ],
+        lifespan=lifespan
+    )
+
+app = create_asgi_app()
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi:app', host='0.0.0.0', port=5000)
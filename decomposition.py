@@ -0,0 +1,265 @@
+"""
+Spatial decomposition cho manifest rất lớn.
+
+Bin được chia thành các zone liên tiếp theo chiều dài, chiều dài mỗi zone tỉ lệ với
+thể tích items được chia cho zone đó (nhưng không ngắn hơn item dài nhất của zone). Mỗi loại item được chia đều cho các zone nên
+zone nào cũng có tỉ lệ các loại giống manifest gốc. Các zone được giải song song
+(mỗi zone một lời gọi solver), kết quả được ghép lại với offset theo x, sau đó
+bước boundary repair đặt lại các leftover vào không gian trống của bin đã ghép
+(qua được ranh giới giữa các zone).
+
+Request /pack:
+    {
+        ...,
+        "decomposition": {
+            "zones": 4,        # hoặc bỏ trống để tự chọn theo số items
+            "compare": true    # giải thêm bản monolithic để báo cáo speedup / utilization loss
+        }
+    }
+
+Có thể bật tự động cho manifest lớn bằng DECOMPOSE_MIN_ITEMS.
+"""
+import logging
+import math
+import os
+import time
+
+from packing import (
+    PackingError, build_packing_request, build_pack_payload, calculate_utilization,
+    expand_packed_groups
+)
+from pipeline import PackPlan
+from placement import (
+    EPS, BinSpace, allowed_rotations, boxes_from_items, leftover_units, place_units, unit_to_leftover
+)
+
+# Tự bật decomposition khi manifest có từ chừng này items trở lên (0 = chỉ khi request yêu cầu)
+DECOMPOSE_MIN_ITEMS = int(os.environ.get('DECOMPOSE_MIN_ITEMS', 0))
+# Số items mục tiêu mỗi zone khi tự chọn số zone
+DECOMPOSE_ZONE_ITEMS = int(os.environ.get('DECOMPOSE_ZONE_ITEMS', 2500))
+DECOMPOSE_MAX_ZONES = int(os.environ.get('DECOMPOSE_MAX_ZONES', 8))
+# Số leftover tối đa được đặt lại trong bước boundary repair
+REPAIR_MAX_ITEMS = int(os.environ.get('DECOMPOSE_REPAIR_MAX_ITEMS', 2000))
+
+
+def item_count(data):
+    return sum(int(item.get('quantity', 1)) if 'L' in item else 1 for item in data.get('items', []))
+
+def wants_decomposition(data):
+    if data.get('decomposition'):
+        return True
+    return DECOMPOSE_MIN_ITEMS > 0 and item_count(data) >= DECOMPOSE_MIN_ITEMS
+
+def min_length(item):
+    """Chiều dài nhỏ nhất item chiếm theo trục x với các phép xoay hợp lệ"""
+    return min(rotation[0] for rotation in allowed_rotations(item['L'], item['W'], item['H'], item.get('num_axis', 2)))
+
+def split_items(api_items, zones):
+    """
+    Chia quantity của từng loại item cho các zone; phần dư cho zone đang có ít thể tích nhất.
+
+    Returns:
+    - list (mỗi zone) các dict {chỉ số item trong manifest: quantity}
+    """
+    shares = [{} for _ in range(zones)]
+    volumes = [0.0] * zones
+    order = sorted(range(len(api_items)), key=lambda i: -api_items[i]['L'] * api_items[i]['W'] * api_items[i]['H'])
+    for index in order:
+        item = api_items[index]
+        volume = item['L'] * item['W'] * item['H']
+        quantity = int(item.get('quantity', 1))
+        base, extra = divmod(quantity, zones)
+        counts = [base] * zones
+        for zone in sorted(range(zones), key=lambda z: volumes[z])[:extra]:
+            counts[zone] += 1
+        for zone, count in enumerate(counts):
+            if count:
+                shares[zone][index] = count
+                volumes[zone] += count * volume
+    return shares, volumes
+
+def zone_bounds(length, volumes, min_lengths=None):
+    """
+    Ranh giới các zone theo chiều dài (số nguyên), tỉ lệ với thể tích của từng zone.
+    Zone ngắn hơn min_lengths của nó (làm tròn lên) được giữ đúng bằng min_lengths, phần
+    chiều dài còn lại chia lại cho các zone khác theo thể tích.
+    """
+    zones = len(volumes)
+    minimums = [math.ceil(value - EPS) for value in (min_lengths or [0] * zones)]
+    fixed = {}
+    while True:
+        free = [zone for zone in range(zones) if zone not in fixed]
+        rest = length - sum(fixed.values())
+        lengths = dict(fixed)
+        if not free:
+            lengths[zones - 1] += rest
+            break
+        total = sum(volumes[zone] for zone in free)
+        running = 0.0
+        edge = 0
+        for position, zone in enumerate(free, start=1):
+            running += volumes[zone]
+            next_edge = int(round(rest * (running / total if total > 0 else position / len(free))))
+            lengths[zone] = next_edge - edge
+            edge = next_edge
+        short = [zone for zone in free if lengths[zone] < minimums[zone]]
+        if not short:
+            break
+        for zone in short:
+            fixed[zone] = minimums[zone]
+
+    bounds = [0]
+    for zone in range(zones):
+        bounds.append(bounds[-1] + lengths[zone])
+    return bounds
+
+def zone_request(packing_request, share, zone_dims, custom_stack_rule=True):
+    """
+    packing_request của một zone; lifo_order được cắt theo các item của zone, stack_rule chỉ
+    được cắt khi request có stack_rule riêng (nếu không zone dùng stack_rule mặc định)
+    """
+    indices = sorted(share)
+    parameters = packing_request['parameters']
+    if custom_stack_rule:
+        stack_rule = parameters['stack_rule']
+        zone_stack_rule = [[stack_rule[i][j] for j in indices] for i in indices]
+    else:
+        zone_stack_rule = [[3] * len(indices) for _ in indices]
+    return {
+        'items': [{**packing_request['items'][i], 'quantity': share[i]} for i in indices],
+        'bin_size': {'L': zone_dims[0], 'W': zone_dims[1], 'H': zone_dims[2]},
+        'parameters': {
+            **parameters,
+            'stack_rule': zone_stack_rule,
+            'lifo_order': [parameters['lifo_order'][i] for i in indices]
+        }
+    }
+
+def choose_zone_count(spec, units, bin_length, api_items):
+    if spec.get('zones'):
+        zones = int(spec['zones'])
+    else:
+        zones = min(DECOMPOSE_MAX_ZONES, math.ceil(units / DECOMPOSE_ZONE_ITEMS))
+    # Mỗi zone phải đủ dài (số nguyên) cho item lớn nhất
+    longest = math.ceil(max(min_length(item) for item in api_items) - EPS)
+    zones = min(zones, int(bin_length // max(longest, 1)), units)
+    return max(zones, 1)
+
+def merge_zones(state, results):
+    packed_items = []
+    leftovers = []
+    zones = []
+    for zone, result in zip(state['zones'], results):
+        zone_items = expand_packed_groups(result.get('packed_items', []))
+        for item in zone_items:
+            item['x'] += zone['x']
+        zone_leftovers = leftover_units(result, state['num_axis_by_id'])
+        zones.append({
+            **zone,
+            'packed': len(zone_items),
+            'leftover': len(zone_leftovers),
+            'utilization': calculate_utilization(zone_items, zone['length'], state['bin_dims'][1], state['bin_dims'][2])
+        })
+        packed_items.extend(zone_items)
+        leftovers.extend(zone_leftovers)
+    return packed_items, leftovers, zones
+
+def finish_decomposed(state, results, packing_time):
+    finish_started = time.time()
+    packed_items, leftovers, zones = merge_zones(state, results)
+
+    # Boundary repair: đặt lại leftover vào không gian trống của cả bin đã ghép
+    repair_started = time.time()
+    repaired = []
+    if leftovers:
+        space = BinSpace(state['bin_dims'], boxes_from_items(packed_items))
+        repaired, failed = place_units(space, leftovers[:REPAIR_MAX_ITEMS])
+        leftovers = failed + leftovers[REPAIR_MAX_ITEMS:]
+        packed_items.extend(repaired)
+    repair_time = time.time() - repair_started
+
+    for order, item in enumerate(packed_items, start=1):
+        item['pack_order'] = order
+
+    decomposed_time = packing_time + (time.time() - finish_started)
+    payload = build_pack_payload(
+        packed_items, [unit_to_leftover(unit) for unit in leftovers], state['bin_dims'], decomposed_time,
+        {'zones': [result.get('metadata', {}) for result in results]}
+    )
+    payload['decomposition'] = {
+        'zones': zones,
+        'repaired': len(repaired),
+        'repair_time': repair_time,
+        'decomposed_time': decomposed_time
+    }
+    logging.info(f"Decomposition: {len(zones)} zones, repaired {len(repaired)}, "
+                 f"utilization {payload['utilization']:.2%} in {decomposed_time:.2f}s")
+
+    if not state['compare']:
+        return payload
+
+    # Giải monolithic ở một vòng riêng (không tranh tài nguyên solver với các zone) để so sánh
+    state['payload'] = payload
+    state['compare_started'] = packing_time + (time.time() - finish_started)
+    return PackPlan(state['endpoint'], None, [state['monolithic_request']], finish_comparison, state, mode='decomposed')
+
+def finish_comparison(state, results, packing_time):
+    payload = state['payload']
+    monolithic_time = packing_time - state['compare_started']
+    bin_dims = state['bin_dims']
+    monolithic_items = expand_packed_groups(results[0].get('packed_items', []))
+    monolithic_utilization = calculate_utilization(monolithic_items, *bin_dims)
+
+    decomposed_time = payload['decomposition']['decomposed_time']
+    payload['decomposition']['comparison'] = {
+        'monolithic_time': monolithic_time,
+        'monolithic_packed': len(monolithic_items),
+        'monolithic_utilization': monolithic_utilization,
+        'speedup': monolithic_time / decomposed_time if decomposed_time > 0 else None,
+        'utilization_loss': monolithic_utilization - payload['utilization']
+    }
+    logging.info(f"Decomposition vs monolithic: speedup {payload['decomposition']['comparison']['speedup']:.2f}x, "
+                 f"utilization loss {payload['decomposition']['comparison']['utilization_loss']:.2%}")
+    return payload
+
+def plan_decomposed(data):
+    spec = data.get('decomposition')
+    spec = spec if isinstance(spec, dict) else {}
+
+    packing_endpoint, packing_request, bin_dims = build_packing_request(data)
+    api_items = packing_request['items']
+    units = sum(int(item.get('quantity', 1)) for item in api_items)
+
+    zones = choose_zone_count(spec, units, bin_dims[0], api_items)
+    if zones < 2:
+        raise PackingError('Bin quá ngắn hoặc quá ít items để chia zone')
+
+    shares, volumes = split_items(api_items, zones)
+    min_lengths = [max(min_length(api_items[i]) for i in share) if share else 0 for share in shares]
+    bounds = zone_bounds(bin_dims[0], volumes, min_lengths)
+    logging.info(f"Decomposition: {units} items into {zones} zones, bounds {bounds}")
+
+    # stack_rule sai kích thước đã được build_packing_request thay bằng mặc định
+    custom_stack_rule = len((data.get('parameters') or {}).get('stack_rule') or []) == len(api_items)
+
+    calls = []
+    zone_info = []
+    for index, share in enumerate(shares):
+        length = bounds[index + 1] - bounds[index]
+        calls.append(zone_request(packing_request, share, (length, bin_dims[1], bin_dims[2]), custom_stack_rule))
+        zone_info.append({
+            'index': index,
+            'x': bounds[index],
+            'length': length,
+            'items': sum(share.values())
+        })
+
+    state = {
+        'endpoint': packing_endpoint,
+        'bin_dims': bin_dims,
+        'zones': zone_info,
+        'num_axis_by_id': {item['id']: item.get('num_axis', 2) for item in api_items},
+        'compare': bool(spec.get('compare')),
+        'monolithic_request': packing_request if spec.get('compare') else None
+    }
+    return PackPlan(packing_endpoint, packing_request, calls, finish_decomposed, state, mode='decomposed')
@@ -0,0 +1,156 @@
+"""
+Export kết quả và manifest đã lưu trên server (run store) dưới dạng stream.
+
+Thay vì browser gửi lại toàn bộ packed_items / items để server định dạng, client chỉ
+cần run_id (hoặc manifest_hash): server đọc run, sinh từng dòng từ các nhóm đã nén và
+stream ra theo từng khối EXPORT_CHUNK_ROWS dòng, nên bộ nhớ không tăng theo số items.
+
+Formats:
+- json:   cùng cấu trúc với export_data của /export_results và /export_items
+- ndjson: dòng đầu {"section": "header", ...}, sau đó mỗi dòng một item có "section"
+- csv:    cột "section" + các cột của item (packed / leftover / item)
+"""
+import csv
+import io
+import json
+import os
+
+import numpy as np
+
+from run_store import iter_leftover_items, iter_packed_items, unpack_blob
+
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 1000))
+
+EXPORT_FORMATS = {
+    'json': ('application/json', 'json'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv')
+}
+
+RESULT_COLUMNS = [
+    'container_index', 'id', 'request_id', 'length', 'width', 'height',
+    'original_length', 'original_width', 'original_height', 'rotation_id', 'x', 'y', 'z', 'pack_order'
+]
+ITEM_COLUMNS = ['id', 'L', 'W', 'H', 'num_axis', 'quantity']
+
+
+def group_by_dimensions(dims, quantities=None):
+    """
+    Gom các dòng cùng kích thước (L, W, H).
+
+    Returns:
+    - (chỉ số dòng đầu tiên của mỗi nhóm theo thứ tự xuất hiện, tổng quantity của nhóm)
+    """
+    dims = np.asarray(dims, dtype=float).reshape(-1, 3)
+    if len(dims) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0)
+    _, first, inverse = np.unique(dims, axis=0, return_index=True, return_inverse=True)
+    totals = np.bincount(inverse.ravel(), weights=quantities, minlength=len(first))
+    order = np.argsort(first)
+    return first[order], totals[order]
+
+def chunked(rows, size=None):
+    size = size or EXPORT_CHUNK_ROWS
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def dumps(value):
+    return json.dumps(value, separators=(',', ':'))
+
+def stream_json(header, sections):
+    """{header..., "<section>": [rows...], ...} - các list được ghi theo từng khối"""
+    yield '{' + ','.join(f'{dumps(key)}:{dumps(value)}' for key, value in header.items())
+    for index, (name, rows) in enumerate(sections):
+        yield f'{"," if header or index else ""}{dumps(name)}:['
+        first = True
+        for chunk in chunked(rows):
+            yield ('' if first else ',') + ','.join(dumps(row) for row in chunk)
+            first = False
+        yield ']'
+    yield '}'
+
+def stream_ndjson(header, sections):
+    yield dumps({'section': 'header', **header}) + '\n'
+    for name, rows in sections:
+        for chunk in chunked(rows):
+            yield ''.join(dumps({'section': name, **row}) + '\n' for row in chunk)
+
+def stream_csv(columns, sections):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=['section'] + columns, restval='', extrasaction='ignore')
+    writer.writeheader()
+    for name, rows in sections:
+        for chunk in chunked(rows):
+            for row in chunk:
+                writer.writerow({'section': name, **row})
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def stream_export(fmt, header, sections, columns):
+    if fmt == 'ndjson':
+        return stream_ndjson(header, sections)
+    if fmt == 'csv':
+        return stream_csv(columns, sections)
+    return stream_json(header, sections)
+
+
+def run_packed_rows(result):
+    """Packed items của run; kết quả multi-container có thêm container_index"""
+    if 'containers' not in result:
+        yield from iter_packed_items(result['packed'])
+        return
+    for container in result['containers']:
+        for item in iter_packed_items(container['packed']):
+            item['container_index'] = container['container_index']
+            yield item
+
+def export_leftover_rows(result):
+    for item in iter_leftover_items(result['leftover']):
+        yield {'id': item['id'], 'length': item['length'], 'width': item['width'], 'height': item['height'], 'quantity': 1}
+
+def export_run_results(run, fmt):
+    """(chunks, filename) cho kết quả của run - cùng nội dung với /export_results"""
+    result = unpack_blob(run.result_blob)
+    header = {
+        'run_id': run.id,
+        'bin_size': {'length': run.bin_length, 'width': run.bin_width, 'height': run.bin_height},
+        'utilization': run.utilization,
+        'packing_time': run.packing_time
+    }
+    sections = [('packed_items', run_packed_rows(result)), ('leftover_items', export_leftover_rows(result))]
+    filename = f'packing_results_run{run.id}.{EXPORT_FORMATS[fmt][1]}'
+    return stream_export(fmt, header, sections, RESULT_COLUMNS), filename
+
+def export_run_items(run, fmt):
+    """(chunks, filename) cho manifest của run, gom theo kích thước - cùng nội dung với /export_items"""
+    items = unpack_blob(run.manifest_blob)['items']
+    first, totals = group_by_dimensions(
+        [(item['L'], item['W'], item['H']) for item in items],
+        [item.get('quantity', 1) for item in items]
+    )
+    grouped = (
+        {
+            'id': items[index]['id'],
+            'L': items[index]['L'],
+            'W': items[index]['W'],
+            'H': items[index]['H'],
+            'num_axis': items[index].get('num_axis', 2),
+            'quantity': int(total)
+        }
+        for index, total in zip(first.tolist(), totals.tolist())
+    )
+    header = {
+        'run_id': run.id,
+        'manifest_hash': run.manifest_hash,
+        'bin_size': {'L': run.bin_length, 'W': run.bin_width, 'H': run.bin_height}
+    }
+    filename = f'items_list_run{run.id}.{EXPORT_FORMATS[fmt][1]}'
+    return stream_export(fmt, header, [('items', grouped)], ITEM_COLUMNS), filename
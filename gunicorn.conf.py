@@ -0,0 +1,24 @@
+"""
+Cấu hình gunicorn mặc định (gunicorn tự đọc file này từ thư mục hiện tại):
+    gunicorn app:app
+
+Worker gthread: mỗi worker xử lý nhiều request cùng lúc, nên admission control
+(ADMISSION_MAX_CONCURRENT) xếp hàng được các lời gọi solver trong một process.
+Với worker đồng bộ (--worker-class sync --threads 1) mỗi worker chỉ chạy một request,
+admission không có gì để xếp hàng - on_starting cảnh báo ngay lúc khởi động.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+
+def on_starting(server):
+    from admission import ADMISSION_MAX_CONCURRENT
+
+    if ADMISSION_MAX_CONCURRENT > 0 and server.cfg.worker_class_str == 'sync' and server.cfg.threads <= 1:
+        server.log.warning(
+            'ADMISSION_MAX_CONCURRENT is set but workers are sync with one thread: '
+            'admission control only queues requests with --threads > 1 or the ASGI mode (uvicorn asgi:app)'
+        )
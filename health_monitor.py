@@ -0,0 +1,301 @@
+"""
+Background health monitor cho các external packing endpoint.
+
+Giữ trạng thái gần nhất của từng endpoint: còn hoạt động không, latency, tỉ lệ
+available trong HEALTH_WINDOW lần probe gần nhất, lỗi gần nhất. Các endpoint gồm:
+- SOLVER_ENDPOINTS: danh sách solver của deployment (phân cách bởi dấu phẩy), coi như
+  các bản sao tương đương nhau; một thread nền probe health URL của chúng mỗi
+  HEALTH_INTERVAL giây (song song);
+- các endpoint được dùng trong /pack hoặc được kiểm tra qua /check_endpoint: chỉ được
+  probe khi /check_endpoint cần, bị bỏ sau HEALTH_ENDPOINT_TTL giây không được dùng
+  (tối đa HEALTH_MAX_ENDPOINTS, endpoint lâu không dùng bị bỏ trước).
+
+/health và /check_endpoint trả về trạng thái đã cache ngay lập tức; /check_endpoint chỉ
+probe trực tiếp khi endpoint chưa có trạng thái hoặc trạng thái đã cũ. /health chỉ liệt
+kê các endpoint trong SOLVER_ENDPOINTS (endpoint do client khác nhập không bị lộ). /pack
+dùng trạng thái này để tránh solver đang down (xem route_endpoint) và ghi lại kết quả các
+lời gọi thật của nó (record_call): lỗi kết nối, timeout và 5xx được tính như health check lỗi.
+
+HEALTH_INTERVAL=0 tắt thread nền: mỗi lần /check_endpoint lại probe trực tiếp như trước.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from packing import PackingError
+from solver_client import aprobe_solver, probe_solver, SolverUnavailable, SolverTimeout
+
+HEALTH_INTERVAL = float(os.environ.get('HEALTH_INTERVAL', 15))
+# Trạng thái cũ hơn chừng này (giây) không được dùng để trả lời hay định tuyến
+HEALTH_STALE_AFTER = float(os.environ.get('HEALTH_STALE_AFTER', 3 * HEALTH_INTERVAL))
+# Số lần liên tiếp không kết nối được / timeout / lỗi 5xx để coi endpoint là down
+HEALTH_DOWN_AFTER = int(os.environ.get('HEALTH_DOWN_AFTER', 2))
+HEALTH_WINDOW = int(os.environ.get('HEALTH_WINDOW', 60))
+HEALTH_MAX_ENDPOINTS = int(os.environ.get('HEALTH_MAX_ENDPOINTS', 32))
+# Endpoint không nằm trong SOLVER_ENDPOINTS bị bỏ sau chừng này giây kể từ lần dùng cuối
+HEALTH_ENDPOINT_TTL = float(os.environ.get('HEALTH_ENDPOINT_TTL', 600))
+SOLVER_ENDPOINTS = [
+    endpoint.strip() for endpoint in os.environ.get('SOLVER_ENDPOINTS', '').split(',') if endpoint.strip()
+]
+
+
+class EndpointHealth:
+    """Trạng thái health của một endpoint"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.available = None
+        self.status_code = None
+        self.error = None          # 'unavailable' | 'timeout' | 'status' | 'error'
+        self.message = None
+        self.endpoint_info = None
+        self.latency = None
+        self.checked_at = None
+        self.used_at = time.time()
+        self.consecutive_failures = 0
+        self.outcomes = deque(maxlen=HEALTH_WINDOW)
+        self.latencies = deque(maxlen=HEALTH_WINDOW)
+
+    def record(self, latency, response=None, error=None, message=None):
+        self.checked_at = time.time()
+        self.latency = latency
+        if response is not None and response.status_code == 200:
+            self.available = True
+            self.error = None
+            self.message = None
+            self.endpoint_info = response.body
+            self.consecutive_failures = 0
+            self.latencies.append(latency)
+        else:
+            self.available = False
+            self.error = error or 'status'
+            self.message = message
+            # Health URL trả 4xx (ví dụ solver không có /health) vẫn là server đang chạy
+            if response is None or response.status_code >= 500:
+                self.consecutive_failures += 1
+            else:
+                self.consecutive_failures = 0
+        self.status_code = response.status_code if response is not None else None
+        self.outcomes.append(self.available)
+
+    def record_call(self, status_code=None, error=None):
+        """
+        Kết quả một lời gọi /pack thật tới endpoint. Lỗi kết nối, timeout, 5xx được tính như
+        health check lỗi; solver trả lời được thì không còn bị coi là down (endpoint_info,
+        latency của health check giữ nguyên).
+        """
+        if error is None and status_code < 500:
+            self.consecutive_failures = 0
+            if self.available is False:
+                self.available = True
+                self.error = None
+                self.message = None
+                self.status_code = status_code
+            self.outcomes.append(True)
+            return
+        self.checked_at = time.time()
+        self.available = False
+        self.error = error or 'status'
+        self.message = None
+        self.status_code = status_code
+        self.consecutive_failures += 1
+        self.outcomes.append(False)
+
+    def fresh(self):
+        return self.checked_at is not None and time.time() - self.checked_at <= HEALTH_STALE_AFTER
+
+    def down(self):
+        return self.fresh() and self.consecutive_failures >= HEALTH_DOWN_AFTER
+
+    def to_dict(self):
+        return {
+            'endpoint': self.endpoint,
+            'available': self.available,
+            'down': self.down(),
+            'status_code': self.status_code,
+            'error': self.error,
+            'message': self.message,
+            'latency': self.latency,
+            'latency_avg': sum(self.latencies) / len(self.latencies) if self.latencies else None,
+            'availability': sum(self.outcomes) / len(self.outcomes) if self.outcomes else None,
+            'consecutive_failures': self.consecutive_failures,
+            'checked_at': self.checked_at,
+            'age': time.time() - self.checked_at if self.checked_at is not None else None
+        }
+
+
+class HealthMonitor:
+    def __init__(self, endpoints=(), interval=HEALTH_INTERVAL):
+        self.interval = interval
+        self.configured = list(endpoints)
+        self.health = OrderedDict((endpoint, EndpointHealth(endpoint)) for endpoint in self.configured)
+        self.lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def watch(self, endpoint):
+        """Ghi nhận một lần dùng endpoint (thêm vào danh sách nếu chưa có), trả về EndpointHealth của nó"""
+        with self.lock:
+            self._expire()
+            health = self.health.get(endpoint)
+            if health is None:
+                health = self.health[endpoint] = EndpointHealth(endpoint)
+                # Bỏ endpoint không cấu hình sẵn và lâu không dùng nhất
+                extra = [key for key in self.health if key not in self.configured]
+                while len(self.health) > HEALTH_MAX_ENDPOINTS and extra:
+                    del self.health[extra.pop(0)]
+            else:
+                health.used_at = time.time()
+                self.health.move_to_end(endpoint)
+            return health
+
+    def _expire(self):
+        """Bỏ các endpoint không cấu hình sẵn đã quá HEALTH_ENDPOINT_TTL kể từ lần dùng cuối (cần giữ lock)"""
+        cutoff = time.time() - HEALTH_ENDPOINT_TTL
+        expired = [key for key, health in self.health.items() if key not in self.configured and health.used_at < cutoff]
+        for key in expired:
+            del self.health[key]
+
+    def get(self, endpoint):
+        with self.lock:
+            return self.health.get(endpoint)
+
+    def probe(self, endpoint):
+        """
+        Probe endpoint ngay (blocking) và cập nhật trạng thái. Không tính là một lần dùng:
+        endpoint chưa được theo dõi (hoặc vừa bị bỏ) không được thêm lại vào danh sách.
+        """
+        health = self.get(endpoint) or EndpointHealth(endpoint)
+        started = time.perf_counter()
+        try:
+            response = probe_solver(endpoint)
+            health.record(time.perf_counter() - started, response=response)
+        except SolverUnavailable:
+            health.record(time.perf_counter() - started, error='unavailable')
+        except SolverTimeout:
+            health.record(time.perf_counter() - started, error='timeout')
+        except Exception as e:
+            health.record(time.perf_counter() - started, error='error', message=str(e))
+        return health
+
+    async def aprobe(self, endpoint):
+        """Như probe nhưng qua async client dùng chung (ASGI mode), không chiếm thread nào"""
+        health = self.get(endpoint) or EndpointHealth(endpoint)
+        started = time.perf_counter()
+        try:
+            response = await aprobe_solver(endpoint)
+            health.record(time.perf_counter() - started, response=response)
+        except SolverUnavailable:
+            health.record(time.perf_counter() - started, error='unavailable')
+        except SolverTimeout:
+            health.record(time.perf_counter() - started, error='timeout')
+        except Exception as e:
+            health.record(time.perf_counter() - started, error='error', message=str(e))
+        return health
+
+    def probe_all(self):
+        """Probe các endpoint trong SOLVER_ENDPOINTS (vòng lặp nền)"""
+        with self.lock:
+            self._expire()
+            endpoints = list(self.configured)
+        if not endpoints:
+            return
+        with ThreadPoolExecutor(max_workers=min(8, len(endpoints))) as executor:
+            list(executor.map(self.probe, endpoints))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.probe_all()
+            except Exception as e:
+                logging.error(f"Health monitor error: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='solver-health-monitor', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self, configured_only=False):
+        with self.lock:
+            return [
+                health.to_dict() for endpoint, health in self.health.items()
+                if not configured_only or endpoint in self.configured
+            ]
+
+    def is_down(self, endpoint):
+        health = self.get(endpoint)
+        return health is not None and health.down()
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+def get_monitor():
+    """HealthMonitor dùng chung của process, thread nền được khởi động ở lần dùng đầu tiên"""
+    global _monitor
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                _monitor = HealthMonitor(SOLVER_ENDPOINTS)
+                _monitor.start()
+    return _monitor
+
+def cached_health(endpoint):
+    """Trạng thái của endpoint cho /check_endpoint: dùng cache nếu còn mới, nếu không thì probe"""
+    monitor = get_monitor()
+    health = monitor.watch(endpoint)
+    if not health.fresh():
+        health = monitor.probe(endpoint)
+    return health
+
+async def acached_health(endpoint):
+    """cached_health cho ASGI mode: probe (nếu cần) trên event loop qua async client"""
+    monitor = get_monitor()
+    health = monitor.watch(endpoint)
+    if not health.fresh():
+        health = await monitor.aprobe(endpoint)
+    return health
+
+def record_call(endpoint, responses=(), error=None):
+    """
+    Ghi kết quả một vòng gọi solver của /pack vào trạng thái của endpoint đã gọi.
+    error: SolverUnavailable / SolverTimeout nếu lời gọi không có response.
+    """
+    health = get_monitor().get(endpoint)
+    if health is None:
+        return
+    if isinstance(error, SolverUnavailable):
+        health.record_call(error='unavailable')
+    elif isinstance(error, SolverTimeout):
+        health.record_call(error='timeout')
+    elif responses:
+        health.record_call(status_code=max(response.status_code for response in responses))
+
+def route_endpoint(endpoint):
+    """
+    Endpoint dùng để gọi solver cho /pack.
+
+    Nếu endpoint được biết là down: chuyển sang một solver khác còn hoạt động trong
+    SOLVER_ENDPOINTS (khi endpoint thuộc danh sách đó), nếu không có thì báo lỗi ngay
+    thay vì chờ connect timeout.
+    """
+    monitor = get_monitor()
+    health = monitor.watch(endpoint)
+    if not health.down():
+        return endpoint
+    if endpoint in monitor.configured:
+        for alternative in monitor.configured:
+            alternative_health = monitor.get(alternative)
+            if alternative != endpoint and alternative_health is not None and alternative_health.fresh() and alternative_health.available:
+                logging.warning(f"Solver {endpoint} is down, routing to {alternative}")
+                return alternative
+    raise PackingError(
+        f'Packing endpoint đang không hoạt động ({health.consecutive_failures} lần health check lỗi liên tiếp)', 503
+    )
@@ -0,0 +1,252 @@
+"""
+Incremental repack: thêm / bớt items trên một kết quả packing có sẵn.
+
+Các box đã đặt được giữ cố định; chỉ phần thay đổi (items thêm mới, cùng các box
+mất chỗ đỡ sau khi bớt items) được đặt vào không gian trống bằng BinSpace. Chỉ
+khi có item không đặt được mới quay về full solve với toàn bộ manifest.
+
+BinSpace không biết stack_rule / lifo_order: request có ràng buộc riêng luôn được full
+solve với items của manifest trước (sau khi bớt) theo sau là added_items - stack_rule /
+lifo_order đánh chỉ số theo danh sách đó. removed_items có id không còn trong kết quả
+trước (hoặc nhiều hơn số lượng đang có) -> lỗi 400.
+
+Request /pack:
+    {
+        "packing_endpoint": "...",
+        "incremental": {
+            "run_id": 12,                  # hoặc "previous_result": {...} (response /pack trước đó)
+                                           #   kèm "previous_manifest": {"items": [...]} (items đã gửi)
+            "added_items": [...],          # cùng format với "items"
+            "removed_items": [5, {"id": 7, "quantity": 2}],
+            "allow_full_solve": true
+        }
+    }
+"""
+import logging
+
+import numpy as np
+
+from packing import PackingError, convert_item, build_pack_payload, shape_pack_result
+from pipeline import PackPlan, plan_single
+from layer_patterns import has_custom_constraints
+from placement import BinSpace, boxes_from_items, expand_units, place_units, unit_to_leftover
+
+
+def packed_to_unit(item, num_axis_by_id):
+    return {
+        'id': item['id'],
+        'request_id': item.get('request_id', item['id']),
+        'L': item.get('original_length', item['length']),
+        'W': item.get('original_width', item['width']),
+        'H': item.get('original_height', item['height']),
+        'num_axis': item.get('num_axis', num_axis_by_id.get(item['id'], 2)),
+        'quantity': 1
+    }
+
+def leftover_to_unit(item, num_axis_by_id):
+    return {
+        'id': item['id'],
+        'request_id': item.get('request_id', item['id']),
+        'L': item['length'],
+        'W': item['width'],
+        'H': item['height'],
+        'num_axis': num_axis_by_id.get(item['id'], 2),
+        'quantity': 1
+    }
+
+def removal_counts(removed_items):
+    """{id: số lượng cần bớt}; phần tử là id hoặc {"id", "quantity"}"""
+    counts = {}
+    for entry in removed_items or []:
+        if isinstance(entry, dict):
+            counts[entry['id']] = counts.get(entry['id'], 0) + int(entry.get('quantity', 1))
+        else:
+            counts[entry] = counts.get(entry, 0) + 1
+    return counts
+
+def remove_items(packed_items, leftover_items, counts):
+    """
+    Bớt items theo counts: ưu tiên leftover, sau đó các box cao nhất (ít box đè lên nhất).
+
+    Returns:
+    - (mask các packed items còn giữ, leftover items còn lại, số item đã bớt,
+       {id: số lượng không tìm thấy để bớt})
+    """
+    counts = dict(counts)
+    removed = 0
+
+    remaining_leftover = []
+    for item in leftover_items:
+        if counts.get(item['id'], 0) > 0:
+            counts[item['id']] -= 1
+            removed += 1
+        else:
+            remaining_leftover.append(item)
+
+    keep = np.ones(len(packed_items), dtype=bool)
+    for index in sorted(range(len(packed_items)), key=lambda i: -packed_items[i]['z']):
+        item_id = packed_items[index]['id']
+        if counts.get(item_id, 0) > 0:
+            counts[item_id] -= 1
+            keep[index] = False
+            removed += 1
+
+    missing = {item_id: count for item_id, count in counts.items() if count > 0}
+    return keep, remaining_leftover, removed, missing
+
+def remove_from_manifest(manifest_items, counts):
+    """Items (format packing API) của manifest sau khi bớt counts, bỏ các dòng hết số lượng"""
+    counts = dict(counts)
+    remaining = []
+    for item in manifest_items:
+        removed = min(counts.get(item['id'], 0), int(item.get('quantity', 1)))
+        if removed:
+            counts[item['id']] -= removed
+        if int(item.get('quantity', 1)) > removed:
+            remaining.append({**item, 'quantity': int(item.get('quantity', 1)) - removed})
+    return remaining
+
+def lift_unsupported(space, keep):
+    """Bỏ khỏi keep các box mất chỗ đỡ (lan truyền lên trên), trả về chỉ số các box bị nhấc ra"""
+    lifted = []
+    frontier = space.boxes[~keep]
+    while len(frontier):
+        lost = space.unsupported_above(frontier, keep)
+        if len(lost) == 0:
+            break
+        keep[lost] = False
+        lifted.extend(lost.tolist())
+        frontier = space.boxes[lost]
+    return lifted
+
+def finish_incremental(state, results, packing_time):
+    payload = build_pack_payload(
+        state['packed_items'], state['leftover_items'], state['bin_dims'],
+        packing_time, state['external_result']
+    )
+    payload['incremental'] = state['info']
+    return payload
+
+def finish_incremental_full_solve(state, results, packing_time):
+    payload = shape_pack_result(results[0], state['bin_dims'], packing_time)
+    payload['incremental'] = state['info']
+    return payload
+
+def plan_constrained_full_solve(data, spec, bin_size, previous_manifest, counts, added_units, removed_count):
+    """Full solve cho request có stack_rule / lifo_order riêng (BinSpace không xét các ràng buộc này)"""
+    full_data = {key: value for key, value in data.items() if key != 'incremental'}
+    full_data['bin_size'] = bin_size
+    full_data['items'] = remove_from_manifest(previous_manifest['items'], counts) + spec.get('added_items', [])
+    plan = plan_single(full_data)
+    plan.finish = finish_incremental_full_solve
+    plan.state['info'] = {
+        'base_run_id': spec.get('run_id'),
+        'added': len(added_units),
+        'removed': removed_count,
+        'relocated': 0,
+        'placed': 0,
+        'mode': 'full_solve',
+        'fallback_reason': 'custom stack_rule / lifo_order'
+    }
+    plan.mode = 'incremental'
+    logging.info("Incremental repack: custom stack_rule / lifo_order, chuyển sang full solve")
+    return plan
+
+def plan_incremental(data):
+    """Plan cho /pack với data["incremental"]; trả về PackPlan không gọi solver nếu delta đặt được hết"""
+    spec = data['incremental']
+    base = spec.get('previous_result')
+    if not base or 'packed_items' not in base:
+        raise PackingError('Incremental repack cần run_id hoặc previous_result')
+    if base.get('containers') is not None:
+        raise PackingError('Incremental repack chưa hỗ trợ kết quả multi-container')
+
+    bin_size = base.get('bin_size', data.get('bin_size', {}))
+    bin_dims = (bin_size['length'], bin_size['width'], bin_size['height'])
+
+    # Response /pack không có num_axis; thiếu manifest thì các item xoay tự do sẽ bị khóa trục
+    previous_manifest = spec.get('previous_manifest')
+    if not previous_manifest or 'items' not in previous_manifest:
+        raise PackingError('Incremental repack với previous_result cần previous_manifest (items của lần pack trước)')
+    num_axis_by_id = {item['id']: item.get('num_axis', 2) for item in previous_manifest['items']}
+
+    added_units = []
+    for item in spec.get('added_items', []):
+        api_item = convert_item(item)
+        if api_item is None:
+            logging.error(f"Invalid item format: {item}")
+            continue
+        added_units.extend(expand_units([api_item]))
+
+    packed_items = base['packed_items']
+    counts = removal_counts(spec.get('removed_items'))
+    keep, leftover_items, removed_count, missing = remove_items(packed_items, base.get('leftover_items', []), counts)
+    if missing:
+        listed = ', '.join(f'{item_id} (x{count})' for item_id, count in missing.items())
+        raise PackingError(f'removed_items không có trong kết quả trước: id {listed}')
+
+    if has_custom_constraints(data.get('parameters') or {}):
+        return plan_constrained_full_solve(data, spec, bin_size, previous_manifest, counts, added_units, removed_count)
+
+    # Các box mất chỗ đỡ được nhấc ra và đặt lại cùng với items mới
+    space = BinSpace(bin_dims, boxes_from_items(packed_items))
+    lifted = lift_unsupported(space, keep) if removed_count else []
+    lifted_units = [packed_to_unit(packed_items[i], num_axis_by_id) for i in lifted]
+    leftover_units = [leftover_to_unit(item, num_axis_by_id) for item in leftover_items]
+
+    kept_items = [item for item, k in zip(packed_items, keep) if k]
+    space = BinSpace(bin_dims, space.boxes[keep])
+
+    new_items, failed = place_units(space, lifted_units + added_units)
+
+    info = {
+        'base_run_id': spec.get('run_id'),
+        'added': len(added_units),
+        'removed': removed_count,
+        'relocated': len(lifted_units),
+        'placed': len(new_items),
+        'mode': 'incremental'
+    }
+
+    manifest_units = [packed_to_unit(item, num_axis_by_id) for item in kept_items] + lifted_units + added_units + leftover_units
+    packing_endpoint = data.get('packing_endpoint', '')
+
+    if failed and spec.get('allow_full_solve', True):
+        # Không đặt được toàn bộ delta vào không gian trống -> full solve
+        logging.info(f"Incremental repack: {len(failed)} items không đặt được, chuyển sang full solve")
+        info['mode'] = 'full_solve'
+        info['fallback_reason'] = f'{len(failed)} items did not fit into the remaining free space'
+        full_data = {key: value for key, value in data.items() if key != 'incremental'}
+        full_data['bin_size'] = bin_size
+        full_data['items'] = manifest_units
+        plan = plan_single(full_data)
+        plan.finish = finish_incremental_full_solve
+        plan.state['info'] = info
+        plan.mode = 'incremental'
+        return plan
+
+    # Khi đã bớt items, thử đặt lại cả các leftover items trước đó vào chỗ trống
+    still_leftover = leftover_units
+    if removed_count and leftover_units:
+        retried, still_leftover = place_units(space, leftover_units)
+        new_items.extend(retried)
+        info['placed'] += len(retried)
+
+    result_items = kept_items + new_items
+    for order, item in enumerate(result_items, start=1):
+        item['pack_order'] = order
+
+    manifest = {
+        'items': manifest_units,
+        'bin_size': {'L': bin_dims[0], 'W': bin_dims[1], 'H': bin_dims[2]},
+        'parameters': data.get('parameters', {})
+    }
+    state = {
+        'packed_items': result_items,
+        'leftover_items': [unit_to_leftover(unit) for unit in failed + still_leftover],
+        'bin_dims': bin_dims,
+        'external_result': base.get('external_result', {}),
+        'info': info
+    }
+    logging.info(f"Incremental repack: +{len(added_units)} -{removed_count}, relocated {len(lifted_units)}, no solver call")
+    return PackPlan(packing_endpoint, manifest, [], finish_incremental, state, mode='incremental')
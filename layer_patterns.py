@@ -0,0 +1,379 @@
+"""
+Fast path cho manifest đồng nhất (một hoặc vài SKU số lượng lớn).
+
+Các item có cùng kích thước (kể cả khác id) được gom thành một nhóm. Với mỗi nhóm
+đủ lớn, tìm pattern 2D tốt nhất cho một lớp (guillotine pattern trên raster points,
+dùng cả hai chiều đặt của footprint theo các phép xoay hợp lệ từ get_rotation_by_id)
+rồi xếp chồng các lớp theo chiều cao: lấp đầy cả bin theo lớp nếu nhóm đủ lớn, hoặc
+thành một bức tường ở đầu bin. Các khối được tính giải tích trong vài ms; chỉ phần
+còn lại (các SKU khác, phần dư của nhóm) được gửi tới solver, trong hộp trống còn
+lại sau các khối.
+
+Tắt cho một request bằng "layer_patterns": false. Fast path cũng bị bỏ qua khi
+request có stack_rule / lifo_order riêng vì các lớp không xét các ràng buộc này.
+"""
+import logging
+import os
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from packing import (
+    build_packing_request, build_pack_payload, expand_packed_groups, expand_leftover_items
+)
+from pipeline import PackPlan
+from placement import (
+    EPS, allowed_rotations, expand_units, placed_item, unit_fits, unit_to_leftover, unit_volume
+)
+
+# Mật độ tối thiểu (diện tích các box / diện tích đáy bin) của một lớp để dùng fast path
+LAYER_MIN_DENSITY = float(os.environ.get('LAYER_MIN_DENSITY', 0.85))
+# Tỉ lệ thể tích tối thiểu của khối (box / hộp mà khối chiếm, kể cả phần trống phía trên)
+LAYER_MIN_FILL = float(os.environ.get('LAYER_MIN_FILL', 0.7))
+# Số lượng tối thiểu của một nhóm đồng nhất
+LAYER_MIN_QUANTITY = int(os.environ.get('LAYER_MIN_QUANTITY', 8))
+# Giới hạn số ô raster cho guillotine DP; lớn hơn thì dùng block pattern 2 vùng
+MAX_RASTER_CELLS = 40000
+
+
+def raster_points(size, a, b):
+    """Các tổ hợp n*a + m*b <= size (normal patterns), tăng dần"""
+    points = np.add.outer(np.arange(int(size // a) + 1) * a, np.arange(int(size // b) + 1) * b).ravel()
+    return np.unique(points[points <= size + EPS])
+
+def block_counts(length, width, a, b):
+    """Số box của pattern 2 vùng (mỗi vùng một chiều đặt) với mọi vị trí cắt theo chiều dài"""
+    cuts = np.arange(int((length + EPS) // a) + 1) * a
+    counts = (cuts // a) * ((width + EPS) // b) + ((length - cuts + EPS) // b) * ((width + EPS) // a)
+    return cuts, counts
+
+def block_pattern(L, W, a, b):
+    """Pattern 2 vùng: cắt đáy theo chiều dài (hoặc rộng), mỗi vùng dùng một chiều đặt"""
+    best_count, best = -1, None
+    for flip in (False, True):
+        length, width = (W, L) if flip else (L, W)
+        cuts, counts = block_counts(length, width, a, b)
+        k = int(np.argmax(counts))
+        if counts[k] > best_count:
+            best_count, best = counts[k], (flip, cuts[k])
+
+    flip, cut = best
+    length, width = (W, L) if flip else (L, W)
+    rects = []
+    for x in np.arange(int((cut + EPS) // a)) * a:
+        for y in np.arange(int((width + EPS) // b)) * b:
+            rects.append((float(x), float(y), a, b))
+    for x in cut + np.arange(int((length - cut + EPS) // b)) * b:
+        for y in np.arange(int((width + EPS) // a)) * a:
+            rects.append((float(x), float(y), b, a))
+    if flip:
+        rects = [(y, x, w, l) for x, y, l, w in rects]
+    return rects
+
+
+class LayerTable:
+    """
+    Pattern tối ưu của một lớp box footprint a x b (được xoay 90 độ) trên đáy X[i] x W,
+    cho mọi chiều dài tiền tố X[i] <= L (guillotine DP trên raster points).
+    """
+
+    def __init__(self, L, W, a, b):
+        self.W, self.a, self.b = W, a, b
+        X = raster_points(L, a, b)
+        Y = raster_points(W, a, b)
+        if len(X) * len(Y) > MAX_RASTER_CELLS:
+            # Box rất nhỏ so với bin: DP quá lớn, dùng pattern 2 vùng
+            self.X = np.unique(np.concatenate([np.arange(int(L // a) + 1) * a, np.arange(int(L // b) + 1) * b]))
+            self.Y = None
+            self.counts = np.array([
+                max(block_counts(x, W, a, b)[1].max(), block_counts(W, x, a, b)[1].max()) for x in self.X
+            ])
+            return
+
+        # Giá trị khởi tạo: khối đồng nhất một chiều đặt
+        plain = np.floor((X[:, None] + EPS) / a) * np.floor((Y[None, :] + EPS) / b)
+        turned = np.floor((X[:, None] + EPS) / b) * np.floor((Y[None, :] + EPS) / a)
+        value = np.maximum(plain, turned)
+        # kind: 0 = khối đồng nhất, 1 = cắt dọc tại X[cut], 2 = cắt ngang tại Y[cut]
+        kind = np.zeros(value.shape, dtype=int)
+        cut = np.zeros(value.shape, dtype=int)
+
+        # Các vết cắt ngang cho mỗi j giống nhau ở mọi hàng nên tính trước
+        y_cuts = []
+        for j in range(len(Y)):
+            k = np.arange(1, j + 1)
+            k = k[Y[k] <= Y[j] / 2 + EPS]
+            y_cuts.append((k, self._floor_index(Y, Y[j] - Y[k])))
+
+        for i in range(len(X)):
+            k = np.arange(1, i + 1)
+            k = k[X[k] <= X[i] / 2 + EPS]
+            if len(k):
+                r = self._floor_index(X, X[i] - X[k])
+                candidates = value[k, :] + value[r, :]
+                best = np.argmax(candidates, axis=0)
+                best_value = candidates[best, np.arange(len(Y))]
+                better = best_value > value[i, :]
+                value[i, better] = best_value[better]
+                kind[i, better] = 1
+                cut[i, better] = k[best[better]]
+            for j in range(len(Y)):
+                k, r = y_cuts[j]
+                if len(k) == 0:
+                    continue
+                candidates = value[i, k] + value[i, r]
+                best = int(np.argmax(candidates))
+                if candidates[best] > value[i, j]:
+                    value[i, j] = candidates[best]
+                    kind[i, j] = 2
+                    cut[i, j] = k[best]
+
+        self.X, self.Y = X, Y
+        self.counts = value[:, -1].astype(int)
+        self._plain, self._turned, self._kind, self._cut = plain, turned, kind, cut
+
+    @staticmethod
+    def _floor_index(points, value):
+        return np.searchsorted(points, value + EPS, side='right') - 1
+
+    def pattern(self, i):
+        """Các (x, y, l, w) của một lớp trên đáy X[i] x W"""
+        a, b = self.a, self.b
+        if self.Y is None:
+            return block_pattern(self.X[i], self.W, a, b)
+
+        X, Y = self.X, self.Y
+        rects = []
+        stack = [(i, len(Y) - 1, 0.0, 0.0)]
+        while stack:
+            i, j, x0, y0 = stack.pop()
+            k = self._cut[i, j]
+            if self._kind[i, j] == 1:
+                stack.append((k, j, x0, y0))
+                stack.append((self._floor_index(X, X[i] - X[k]), j, x0 + X[k], y0))
+            elif self._kind[i, j] == 2:
+                stack.append((i, k, x0, y0))
+                stack.append((i, self._floor_index(Y, Y[j] - Y[k]), x0, y0 + Y[k]))
+            else:
+                l, w = (a, b) if self._plain[i, j] >= self._turned[i, j] else (b, a)
+                for x in np.arange(int((X[i] + EPS) // l)) * l:
+                    for y in np.arange(int((Y[j] + EPS) // w)) * w:
+                        rects.append((float(x0 + x), float(y0 + y), l, w))
+        return sorted(rects, key=lambda r: (r[0], r[1]))
+
+
+@lru_cache(maxsize=128)
+def layer_table(L, W, a, b):
+    return LayerTable(L, W, a, b)
+
+def group_key(unit):
+    """Các item có cùng tập kích thước sau khi xoay thuộc cùng một nhóm"""
+    if unit.get('num_axis', 2) == 2:
+        return (tuple(sorted((unit['L'], unit['W']))), unit['H'], 2)
+    return (tuple(sorted((unit['L'], unit['W'], unit['H']))), 6)
+
+def best_block(unit, count, box):
+    """
+    Khối các lớp tốt nhất cho một nhóm count items trong hộp trống box = (L, W, H).
+
+    Nếu nhóm đủ lấp đầy hộp, khối gồm các lớp đầy đủ trên toàn bộ đáy (phần trống
+    còn lại ở phía trên). Ngược lại khối là một "bức tường" cao hết hộp, chỉ chiếm
+    đoạn đầu ngắn nhất của chiều dài đủ chứa cả nhóm (phần trống còn lại ở phía sau).
+
+    Returns:
+    - dict (height, pattern, layers, count, density, box tiêu tốn) hoặc None nếu không đủ tốt
+    """
+    L, W, H = box
+    rotations = allowed_rotations(unit['L'], unit['W'], unit['H'], unit.get('num_axis', 2))
+    best = None
+    for h in sorted({rotation[2] for rotation in rotations}):
+        max_layers = int((H + EPS) // h)
+        if max_layers == 0:
+            continue
+        a, b = next((l, w) for l, w, rh, _ in rotations if rh == h)
+        table = layer_table(float(L), float(W), float(a), float(b))
+        if table.counts[-1] == 0:
+            continue
+
+        if count >= table.counts[-1] * max_layers:
+            # Lấp đầy hộp theo các lớp đầy đủ
+            index = len(table.X) - 1
+            placed = int(table.counts[-1]) * max_layers
+            length, height = L, max_layers * h
+        else:
+            # Bức tường: đoạn đầu ngắn nhất của chiều dài chứa đủ count items
+            index = int(np.argmax(table.counts * max_layers >= count))
+            placed = count
+            length, height = table.X[index], H
+
+        per_layer = int(table.counts[index])
+        density = float(per_layer * a * b / (table.X[index] * W))
+        if density < LAYER_MIN_DENSITY - EPS:
+            continue
+        efficiency = float(placed * a * b * h / (length * W * height))
+        if efficiency < LAYER_MIN_FILL - EPS:
+            continue
+        if best is None or (efficiency, placed) > (best['efficiency'], best['count']):
+            best = {
+                'height': h,
+                'index': index,
+                'table': table,
+                'per_layer': per_layer,
+                'layers': -(-placed // per_layer),
+                'count': placed,
+                'density': density,
+                'efficiency': efficiency,
+                'length': float(length)
+            }
+    return best
+
+def rotation_for(unit, l, w, h):
+    for rl, rw, rh, rotation_id in allowed_rotations(unit['L'], unit['W'], unit['H'], unit.get('num_axis', 2)):
+        if abs(rl - l) < EPS and abs(rw - w) < EPS and abs(rh - h) < EPS:
+            return rotation_id
+    return 0
+
+def fill_block(units, block, origin):
+    """Đặt units vào các lớp của block, từng lớp từ dưới lên, bắt đầu tại origin = (x0, z0)"""
+    x0, z0 = origin
+    h = block['height']
+    pattern = block['table'].pattern(block['index'])
+    slots = [(x0 + x, y, z0 + n * h, l, w) for n in range(block['layers']) for x, y, l, w in pattern]
+
+    placed = []
+    for unit, (x, y, z, l, w) in zip(units, slots):
+        placed.append(placed_item(unit, (x, y, z, l, w, h, rotation_for(unit, l, w, h))))
+
+    # Đánh số position_index theo id để run store gom nhóm được
+    counters = {}
+    for item in placed:
+        counters[item['id']] = counters.get(item['id'], 0) + 1
+        item['position_index'] = counters[item['id']]
+    for item in placed:
+        item['total_positions'] = counters[item['id']]
+    return placed
+
+def collapse_units(units):
+    """Gom các unit liên tiếp giống nhau lại thành API items có quantity"""
+    items = []
+    last_key = None
+    for unit in units:
+        key = (unit['id'], unit['request_id'], unit['L'], unit['W'], unit['H'], unit.get('num_axis', 2))
+        if key != last_key:
+            items.append({**unit, 'quantity': 0})
+            last_key = key
+        items[-1]['quantity'] += 1
+    return items
+
+def finish_layered(state, results, packing_time):
+    packed_items = list(state['layer_items'])
+    if results:
+        result = results[0]
+        x0, z0 = state['offset']
+        for item in expand_packed_groups(result.get('packed_items', [])):
+            item['x'] += x0
+            item['z'] += z0
+            packed_items.append(item)
+        leftover_items = expand_leftover_items(result) + state['leftover_items']
+        external_result = result.get('metadata', {})
+    else:
+        leftover_items = state['leftover_items']
+        external_result = {}
+
+    for order, item in enumerate(packed_items, start=1):
+        item['pack_order'] = order
+
+    payload = build_pack_payload(packed_items, leftover_items, state['bin_dims'], packing_time, external_result)
+    payload['layer_patterns'] = state['info']
+    return payload
+
+def has_custom_constraints(parameters):
+    """stack_rule / lifo_order khác mặc định (mọi cặp stack được, không LIFO)"""
+    stack_rule = parameters.get('stack_rule') or []
+    return any(value != 3 for row in stack_rule for value in row) or any(parameters.get('lifo_order') or [])
+
+def plan_layered(data):
+    """
+    Plan cho /pack với fast path theo lớp.
+
+    Returns:
+    - PackPlan (0 hoặc 1 lời gọi solver), hoặc None nếu manifest không có nhóm đồng nhất phù hợp
+    """
+    if has_custom_constraints(data.get('parameters') or {}):
+        return None
+
+    started = time.time()
+    packing_endpoint, packing_request, bin_dims = build_packing_request(data)
+
+    units = expand_units(packing_request['items'])
+    groups = {}
+    for unit in units:
+        groups.setdefault(group_key(unit), []).append(unit)
+
+    # Hộp trống còn lại: [x0, L] x [0, W] x [z0, H]
+    x0, z0 = 0.0, 0.0
+    layer_items = []
+    blocks = []
+    remainder = []
+    for group in sorted(groups.values(), key=lambda g: -len(g) * unit_volume(g[0])):
+        box = (bin_dims[0] - x0, bin_dims[1], bin_dims[2] - z0)
+        block = best_block(group[0], len(group), box) if len(group) >= LAYER_MIN_QUANTITY else None
+        if block is None:
+            remainder.extend(group)
+            continue
+
+        layer_items.extend(fill_block(group[:block['count']], block, (x0, z0)))
+        remainder.extend(group[block['count']:])
+        blocks.append({
+            'item_ids': sorted({unit['id'] for unit in group[:block['count']]}),
+            'origin': {'x': x0, 'y': 0.0, 'z': z0},
+            'length': block['length'],
+            'layer_height': block['height'],
+            'layers': block['layers'],
+            'per_layer': block['per_layer'],
+            'count': block['count'],
+            'density': block['density']
+        })
+        if block['length'] < box[0] - EPS:
+            x0 += block['length']
+        else:
+            z0 += block['layers'] * block['height']
+
+    if not layer_items:
+        return None
+
+    info = {
+        'blocks': blocks,
+        'analytic_items': len(layer_items),
+        'solver_items': len(remainder),
+        'analysis_time': time.time() - started
+    }
+    logging.info(f"Layer patterns: {len(layer_items)} items in {len(blocks)} blocks, "
+                 f"{len(remainder)} items left for solver ({info['analysis_time'] * 1000:.1f} ms)")
+
+    state = {
+        'layer_items': layer_items,
+        'leftover_items': [],
+        'bin_dims': bin_dims,
+        'offset': (x0, z0),
+        'info': info
+    }
+
+    # Phần còn lại được giải trong hộp trống sau các khối
+    # (bin_size của request luôn được làm tròn xuống số nguyên)
+    rest_dims = (int(bin_dims[0] - x0 + EPS), bin_dims[1], int(bin_dims[2] - z0 + EPS))
+    # Items không còn vừa hộp trống được trả về thẳng là leftover
+    fitting = [unit for unit in remainder if unit_fits(unit, rest_dims)]
+    state['leftover_items'] = [unit_to_leftover(unit) for unit in remainder if not unit_fits(unit, rest_dims)]
+    calls = []
+    if fitting:
+        sub_data = {
+            **data,
+            'bin_size': {'length': rest_dims[0], 'width': rest_dims[1], 'height': rest_dims[2]},
+            'items': collapse_units(fitting)
+        }
+        _, sub_request, _ = build_packing_request(sub_data)
+        calls.append(sub_request)
+
+    return PackPlan(packing_endpoint, packing_request, calls, finish_layered, state, mode='layered')
@@ -0,0 +1,219 @@
+"""
+Level-of-detail cho visualization của kết quả lớn.
+
+Thay vì gửi và vẽ từng box, server gom các packed items thành lưới occupancy:
+- voxels: các ô gần lập phương, cạnh = cạnh dài nhất của bin / resolution
+- slabs:  resolution lớp theo chiều cao, mỗi lớp phủ cả mặt đáy bin
+Mỗi ô chứa tỉ lệ thể tích bị chiếm (chính xác theo phần giao box - ô) và số items có
+tâm nằm trong ô; chỉ các ô khác rỗng được gửi đi. Payload và chi phí vẽ phụ thuộc vào
+resolution, không phụ thuộc số items.
+
+Khi người dùng zoom hoặc chọn một vùng, client gửi "region": nếu vùng có không quá
+LOD_MAX_DETAIL_ITEMS items thì trả về đầy đủ các items đó, nếu không thì trả về lưới
+mịn hơn của riêng vùng đó.
+
+"max_pack_order" giới hạn ở các items có pack_order không quá giá trị này, để playback
+step-by-step của kết quả lớn cũng đi qua lưới occupancy.
+"""
+import os
+from itertools import compress
+
+import numpy as np
+
+from packing import PackingError
+from run_store import get_run, iter_packed_items, unpack_blob
+
+LOD_DEFAULT_RESOLUTION = int(os.environ.get('LOD_DEFAULT_RESOLUTION', 24))
+LOD_MAX_RESOLUTION = int(os.environ.get('LOD_MAX_RESOLUTION', 64))
+LOD_MAX_DETAIL_ITEMS = int(os.environ.get('LOD_MAX_DETAIL_ITEMS', 2000))
+LOD_MODES = ('voxels', 'slabs')
+
+EPS = 1e-9
+
+
+def item_boxes(items):
+    """Mảng (n, 6) x, y, z, length, width, height của packed items theo format /pack"""
+    boxes = np.array(
+        [(item['x'], item['y'], item['z'], item['length'], item['width'], item['height']) for item in items],
+        dtype=float
+    )
+    return boxes.reshape(-1, 6)
+
+def group_boxes(groups):
+    """Như item_boxes nhưng đọc thẳng từ các nhóm đã nén của run store (không tạo dict từng item)"""
+    parts = [
+        np.hstack([np.asarray(group['positions'], dtype=float).reshape(-1, 3), np.tile(group['dims'], (len(group['positions']), 1))])
+        for group in groups
+    ]
+    return np.vstack(parts) if parts else np.zeros((0, 6))
+
+def grid_shape(extent, resolution, mode):
+    """(số ô theo từng trục, kích thước ô) của lưới phủ extent"""
+    extent = np.asarray(extent, dtype=float)
+    if mode == 'slabs':
+        shape = np.array([1, 1, resolution])
+        return shape, extent / shape
+    cell = extent.max() / resolution
+    shape = np.maximum(np.ceil(extent / cell - 1e-6), 1).astype(int)
+    return shape, np.full(3, cell)
+
+def occupancy(boxes, origin, extent, shape, cell):
+    """
+    Tỉ lệ thể tích bị chiếm và số items (theo tâm) của từng ô.
+
+    Mỗi box được trải ra các ô mà nó giao; phần giao theo từng trục nhân lại cho thể
+    tích chính xác. Các box không chồng nhau nên tổng số cặp (box, ô) bị chặn bởi số
+    box và số ô, không phải tích của chúng.
+    """
+    size = int(shape.prod())
+    lo = (boxes[:, :3] - origin) / cell
+    hi = (boxes[:, :3] + boxes[:, 3:] - origin) / cell
+    bound = extent / cell
+    lo, hi = np.clip(lo, 0, bound), np.clip(hi, 0, bound)
+    inside = (hi - lo > EPS).all(axis=1)
+    lo, hi = lo[inside], hi[inside]
+
+    first = np.minimum(np.floor(lo + EPS).astype(int), shape - 1)
+    span = np.maximum(np.ceil(hi - EPS).astype(int) - first, 1)
+    total = span.prod(axis=1)
+    owner = np.repeat(np.arange(len(lo)), total)
+    offset = np.arange(int(total.sum())) - np.repeat(np.cumsum(total) - total, total)
+    span_y, span_z = span[owner, 1], span[owner, 2]
+    cells = first[owner] + np.stack([offset // (span_y * span_z), (offset // span_z) % span_y, offset % span_z], axis=1)
+    overlap = (np.minimum(hi[owner], cells + 1) - np.maximum(lo[owner], cells)).clip(min=0).prod(axis=1)
+    occupied = np.bincount(np.ravel_multi_index(cells.T, shape), weights=overlap, minlength=size)
+
+    # Ô cuối mỗi trục có thể nằm một phần ngoài vùng: tỉ lệ theo phần bên trong
+    capacity = np.ones(1)
+    for axis in range(3):
+        capacity = np.multiply.outer(capacity, np.minimum(bound[axis] - np.arange(shape[axis]), 1.0))
+    fill = occupied / np.maximum(capacity.ravel(), EPS)
+
+    centers = np.floor((boxes[:, :3] + boxes[:, 3:] / 2 - origin) / cell).astype(int)
+    centered = ((centers >= 0) & (centers < shape)).all(axis=1)
+    counts = np.bincount(np.ravel_multi_index(centers[centered].T, shape), minlength=size)
+    return fill, counts
+
+def lod_summary(boxes, origin, extent, resolution, mode):
+    shape, cell = grid_shape(extent, resolution, mode)
+    fill, counts = occupancy(boxes, np.asarray(origin, dtype=float), np.asarray(extent, dtype=float), shape, cell)
+    nonempty = np.flatnonzero((fill > 1e-6) | (counts > 0))
+    i, j, k = np.unravel_index(nonempty, shape)
+    return {
+        'mode': mode,
+        'resolution': resolution,
+        'origin': [float(value) for value in origin],
+        'extent': [float(value) for value in extent],
+        'shape': shape.tolist(),
+        'cell_size': cell.tolist(),
+        'cells': {
+            'i': i.tolist(),
+            'j': j.tolist(),
+            'k': k.tolist(),
+            'fill': np.round(np.minimum(fill[nonempty], 1.0), 3).tolist(),
+            'count': counts[nonempty].tolist()
+        }
+    }
+
+def region_mask(boxes, low, high):
+    """Các box giao với vùng [low, high]"""
+    return (
+        (np.minimum(boxes[:, :3] + boxes[:, 3:], high) - np.maximum(boxes[:, :3], low) > EPS).all(axis=1)
+    )
+
+
+def max_pack_order(data):
+    if data.get('max_pack_order') is None:
+        return None
+    try:
+        return int(data['max_pack_order'])
+    except (TypeError, ValueError):
+        raise PackingError('max_pack_order phải là số nguyên')
+
+def load_packed(data):
+    """
+    (boxes, hàm lấy items theo mask, (L, W, H)) từ run đã lưu (run_id) hoặc packed_items của request.
+    """
+    options = data.get('lod') or {}
+    limit = max_pack_order(data)
+    if data.get('run_id') is not None:
+        try:
+            run_id = int(data['run_id'])
+        except (TypeError, ValueError):
+            raise PackingError('run_id phải là số nguyên')
+        run = get_run(run_id)
+        if run is None:
+            raise PackingError(f"Run {run_id} not found", 404)
+        result = unpack_blob(run.result_blob)
+        groups = result['packed']
+        bin_dims = (run.bin_length, run.bin_width, run.bin_height)
+        if 'containers' in result:
+            index = int(options.get('container_index', 0))
+            if not 0 <= index < len(result['containers']):
+                raise PackingError(f'Run {run.id} không có container {index}')
+            container = result['containers'][index]
+            groups = container['packed']
+            bin_dims = (container['bin_size']['length'], container['bin_size']['width'], container['bin_size']['height'])
+        boxes = group_boxes(groups)
+        if limit is not None:
+            # pack_order của run đã lưu là thứ tự trong các nhóm; compress dừng ở cuối mask
+            boxes = boxes[:max(limit, 0)]
+        return boxes, lambda mask: list(compress(iter_packed_items(groups), mask)), bin_dims
+
+    packed_items = data.get('packed_items') or []
+    if limit is not None:
+        packed_items = [item for item in packed_items if item.get('pack_order', 0) <= limit]
+    bin_size = data.get('bin_size', {})
+    bin_dims = (
+        float(bin_size.get('length', 10)),
+        float(bin_size.get('width', 10)),
+        float(bin_size.get('height', 10))
+    )
+    return item_boxes(packed_items), lambda mask: list(compress(packed_items, mask)), bin_dims
+
+def lod_view(data):
+    """
+    Response của /visualize ở LOD mode.
+
+    Request:
+    - run_id (kết quả đã lưu trên server) hoặc packed_items + bin_size
+    - max_pack_order (tuỳ chọn): chỉ các items có pack_order không quá giá trị này
+    - lod: {mode: "voxels" | "slabs", resolution, region: {min: [x, y, z], max: [x, y, z]}, container_index}
+    """
+    options = data.get('lod') or {}
+    mode = options.get('mode', 'voxels')
+    if mode not in LOD_MODES:
+        raise PackingError(f"lod.mode phải là một trong: {', '.join(LOD_MODES)}")
+    try:
+        resolution = int(options.get('resolution', LOD_DEFAULT_RESOLUTION))
+    except (TypeError, ValueError):
+        raise PackingError('lod.resolution phải là số nguyên')
+    resolution = min(max(resolution, 1), LOD_MAX_RESOLUTION)
+
+    boxes, select, bin_dims = load_packed(data)
+    payload = {
+        'success': True,
+        'bin_size': {'length': bin_dims[0], 'width': bin_dims[1], 'height': bin_dims[2]},
+        'item_count': len(boxes)
+    }
+
+    region = options.get('region')
+    if region is None:
+        payload['lod'] = lod_summary(boxes, (0.0, 0.0, 0.0), bin_dims, resolution, mode)
+        return payload
+
+    try:
+        low = np.asarray(region['min'], dtype=float).reshape(3)
+        high = np.asarray(region['max'], dtype=float).reshape(3)
+    except (KeyError, TypeError, ValueError):
+        raise PackingError('lod.region phải có dạng {"min": [x, y, z], "max": [x, y, z]}')
+    if (high - low <= EPS).any():
+        raise PackingError('lod.region rỗng')
+
+    mask = region_mask(boxes, low, high)
+    payload['region'] = {'min': low.tolist(), 'max': high.tolist(), 'item_count': int(mask.sum())}
+    if mask.sum() <= LOD_MAX_DETAIL_ITEMS:
+        payload['packed_items'] = select(mask.tolist())
+    else:
+        payload['lod'] = lod_summary(boxes[mask], low, high - low, resolution, mode)
+    return payload
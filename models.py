@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+
+from sqlalchemy.orm import deferred
+
+from app import db
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+class PackingRun(db.Model):
+    """Một lần chạy packing: manifest, parameters và kết quả ở dạng nén"""
+    __tablename__ = 'packing_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False, default=utcnow, index=True)
+    mode = db.Column(db.String(32), nullable=False, default='pack')
+
+    # Manifest
+    manifest_hash = db.Column(db.String(64), nullable=False, index=True)
+    bin_length = db.Column(db.Float, nullable=False)
+    bin_width = db.Column(db.Float, nullable=False)
+    bin_height = db.Column(db.Float, nullable=False)
+    item_count = db.Column(db.Integer, nullable=False)
+
+    # Solver và timings
+    solver_endpoint = db.Column(db.String(512))
+    solver_time = db.Column(db.Float)
+    packing_time = db.Column(db.Float)
+
+    # Kết quả
+    packed_count = db.Column(db.Integer, nullable=False, default=0)
+    leftover_count = db.Column(db.Integer, nullable=False, default=0)
+    utilization = db.Column(db.Float, nullable=False, default=0.0, index=True)
+    training_score = db.Column(db.Float)
+
+    # Blobs (zlib-compressed JSON) - deferred để query danh sách không load chúng
+    manifest_blob = deferred(db.Column(db.LargeBinary, nullable=False))
+    parameters_blob = deferred(db.Column(db.LargeBinary))
+    result_blob = deferred(db.Column(db.LargeBinary, nullable=False))
+
+    def summary(self, include_endpoint=False):
+        """Tóm tắt run; solver_endpoint (URL nội bộ) chỉ có khi include_endpoint"""
+        summary = {
+            'run_id': self.id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'mode': self.mode,
+            'manifest_hash': self.manifest_hash,
+            'bin_size': {
+                'length': self.bin_length,
+                'width': self.bin_width,
+                'height': self.bin_height
+            },
+            'item_count': self.item_count,
+            'packed_count': self.packed_count,
+            'leftover_count': self.leftover_count,
+            'utilization': self.utilization,
+            'training_score': self.training_score,
+            'solver_time': self.solver_time,
+            'packing_time': self.packing_time
+        }
+        if include_endpoint:
+            summary['solver_endpoint'] = self.solver_endpoint
+        return summary
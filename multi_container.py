@@ -0,0 +1,286 @@
+"""
+Multi-container packing.
+
+Items được chia cho các container theo first-fit-decreasing (volume giảm dần,
+mỗi container nhận tới FILL_TARGET thể tích của nó), mỗi container được giải
+bằng một lời gọi solver riêng và các lời gọi chạy song song. Leftover của một
+container trước hết được đặt vào chỗ trống của các container đã dùng (BinSpace,
+không gọi solver), phần còn lại tràn sang các container chưa dùng ở vòng sau.
+
+Request /pack:
+    {
+        "packing_endpoint": "...",
+        "containers": [
+            {"name": "40ft", "length": 12000, "width": 2330, "height": 2390, "count": 2},
+            {"name": "20ft", "L": 5890, "W": 2330, "H": 2390, "count": 1}
+        ],
+        "items": [...]
+    }
+
+stack_rule / lifo_order riêng (đánh chỉ số theo items của request) được cắt theo các
+đơn vị item của từng container: mỗi đơn vị mang chỉ số dòng manifest của nó ("row"),
+nên các dòng trùng id vẫn lấy đúng hàng / cột. Khi có các ràng buộc này leftover không
+được đặt vào chỗ trống bằng BinSpace (không xét stack_rule / lifo_order) mà chỉ tràn
+sang container chưa dùng qua solver.
+"""
+import logging
+
+from packing import (
+    PackingError, convert_item, build_packing_request, build_pack_payload,
+    expand_leftover_items, expand_packed_groups, require_endpoint_and_items
+)
+from pipeline import PackPlan
+from layer_patterns import has_custom_constraints
+from placement import (
+    BinSpace, boxes_from_items, expand_units, place_units, unit_fits, unit_to_leftover, unit_volume
+)
+
+# Tỉ lệ thể tích container được phân bổ ở bước first-fit-decreasing
+FILL_TARGET = 0.9
+
+
+def parse_containers(containers):
+    """Expand danh sách loại container theo count thành các container instance"""
+    instances = []
+    for type_index, container in enumerate(containers):
+        try:
+            # Kích thước được làm tròn xuống như bin_size (parse_bin_size)
+            if 'L' in container and 'W' in container and 'H' in container:
+                dims = (int(float(container['L'])), int(float(container['W'])), int(float(container['H'])))
+            else:
+                dims = (int(float(container['length'])), int(float(container['width'])), int(float(container['height'])))
+            count = int(container.get('count', 1))
+        except (KeyError, ValueError, TypeError):
+            raise PackingError(f'Container {type_index} must contain (L, W, H) or (length, width, height) and a valid count')
+
+        for _ in range(count):
+            instances.append({
+                'index': len(instances),
+                'type_index': type_index,
+                'name': container.get('name', f'container_{type_index}'),
+                'dims': dims
+            })
+    if not instances:
+        raise PackingError('No containers provided')
+    return instances
+
+def assign_ffd(units, instances):
+    """
+    First-fit-decreasing theo volume.
+
+    Returns:
+    - ({instance index: [units]}, units không vừa container nào)
+    """
+    remaining = {inst['index']: inst['dims'][0] * inst['dims'][1] * inst['dims'][2] * FILL_TARGET for inst in instances}
+    assignment = {}
+    unassigned = []
+    for unit in sorted(units, key=lambda u: -unit_volume(u)):
+        volume = unit_volume(unit)
+        for inst in instances:
+            if remaining[inst['index']] >= volume and unit_fits(unit, inst['dims']):
+                remaining[inst['index']] -= volume
+                assignment.setdefault(inst['index'], []).append(unit)
+                break
+        else:
+            unassigned.append(unit)
+    return assignment, unassigned
+
+def container_parameters(parameters, item_count, indices):
+    """
+    parameters của một container: stack_rule / lifo_order của request (item_count items)
+    cắt theo indices - chỉ số dòng manifest ("row") của từng đơn vị trong container.
+    Giá trị không đúng kích thước bị bỏ để solver request dùng mặc định (như build_packing_request).
+    """
+    parameters = dict(parameters or {})
+    stack_rule = parameters.pop('stack_rule', None)
+    lifo_order = parameters.pop('lifo_order', None)
+    if stack_rule and len(stack_rule) == item_count:
+        parameters['stack_rule'] = [[stack_rule[i][j] for j in indices] for i in indices]
+    if lifo_order and len(lifo_order) == item_count:
+        parameters['lifo_order'] = [lifo_order[i] for i in indices]
+    return parameters
+
+def container_calls(base_data, instances, assignment, item_count):
+    """Một packing_request cho mỗi container đã được gán items"""
+    calls = []
+    call_instances = []
+    for index in sorted(assignment):
+        dims = instances[index]['dims']
+        sub_data = {
+            **base_data,
+            'bin_size': {'length': dims[0], 'width': dims[1], 'height': dims[2]},
+            'items': assignment[index]
+        }
+        if 'parameters' in base_data:
+            indices = [unit['row'] for unit in assignment[index]]
+            sub_data['parameters'] = container_parameters(base_data['parameters'], item_count, indices)
+        _, packing_request, _ = build_packing_request(sub_data)
+        calls.append(packing_request)
+        call_instances.append(index)
+    return calls, call_instances
+
+def assigned_leftovers(result, units):
+    """
+    Leftover của solver cho một container dưới dạng các unit đã gán cho container đó (giữ
+    "row" và num_axis): ghép theo id, request_id và kích thước, nếu không khớp thì theo id.
+    """
+    exact, by_id = {}, {}
+    for unit in units:
+        exact.setdefault((unit['id'], unit['request_id'], unit['L'], unit['W'], unit['H']), []).append(unit)
+        by_id.setdefault(unit['id'], []).append(unit)
+    used = set()
+
+    def take(candidates):
+        while candidates:
+            unit = candidates.pop(0)
+            if id(unit) not in used:
+                used.add(id(unit))
+                return unit
+        return None
+
+    spilled = []
+    for item in expand_leftover_items(result):
+        unit = take(exact.get((item['id'], item['request_id'], item['length'], item['width'], item['height']), []))
+        unit = unit or take(by_id.get(item['id'], []))
+        if unit is None:
+            raise PackingError(f"Solver trả về leftover item {item['id']} không có trong request của container")
+        spilled.append(unit)
+    return spilled
+
+def finish_multi_container(state, results, packing_time):
+    instances = state['instances']
+
+    spill = []
+    for index, result in zip(state['call_instances'], results):
+        state['packed'][index] = expand_packed_groups(result.get('packed_items', []))
+        state['external'][index] = result.get('metadata', {})
+        spill.extend(assigned_leftovers(result, state['assigned'][index]))
+
+    # Spill-over 1: đặt leftover vào chỗ trống của các container đã dùng (không gọi solver);
+    # bỏ qua khi có stack_rule / lifo_order riêng vì BinSpace không xét các ràng buộc này
+    for index in sorted(state['packed']):
+        if not spill or state['custom_constraints']:
+            break
+        space = BinSpace(instances[index]['dims'], boxes_from_items(state['packed'][index]))
+        placed, spill = place_units(space, spill)
+        state['packed'][index].extend(placed)
+
+    # Spill-over 2: phần còn lại sang các container chưa dùng - thêm một vòng gọi solver
+    unused = [instances[i] for i in state['unused']]
+    if spill and unused:
+        assignment, unassigned = assign_ffd(spill, unused)
+        if assignment:
+            calls, call_instances = container_calls(state['base_data'], instances, assignment, state['item_count'])
+            state['call_instances'] = call_instances
+            state['assigned'].update(assignment)
+            state['unused'] = [i for i in state['unused'] if i not in assignment]
+            state['unassigned'].extend(unassigned)
+            logging.info(f"Multi-container: {len(spill)} leftover items spill over to {len(calls)} more containers")
+            return PackPlan(state['endpoint'], None, calls, finish_multi_container, state, mode='multi_container')
+
+    leftover = state['unassigned'] + spill
+    return build_fleet_payload(state, [unit_to_leftover(unit) for unit in leftover], packing_time)
+
+def build_fleet_payload(state, leftover_items, packing_time):
+    instances = state['instances']
+    containers = []
+    packed_volume = 0.0
+    used_volume = 0.0
+
+    for index in sorted(state['packed']):
+        packed_items = state['packed'][index]
+        for order, item in enumerate(packed_items, start=1):
+            item['pack_order'] = order
+
+        dims = instances[index]['dims']
+        container = build_pack_payload(packed_items, [], dims, packing_time, state['external'][index])
+        for key in ('success', 'leftover_items', 'packing_time'):
+            container.pop(key)
+        containers.append({
+            'container_index': index,
+            'type_index': instances[index]['type_index'],
+            'name': instances[index]['name'],
+            **container
+        })
+
+        packed_volume += sum(item['length'] * item['width'] * item['height'] for item in packed_items)
+        used_volume += dims[0] * dims[1] * dims[2]
+
+    fleet_utilization = packed_volume / used_volume if used_volume > 0 else 0
+
+    logging.info(f"Multi-container: {len(containers)}/{len(instances)} containers used, "
+                 f"leftover {len(leftover_items)}, fleet utilization {fleet_utilization:.2%}")
+
+    # Container đầu tiên được đưa lên top-level để visualizer một bin hiện tại vẫn hiển thị được
+    first = containers[0] if containers else {
+        'packed_items': [],
+        'bin_size': dict(zip(('length', 'width', 'height'), instances[0]['dims'])),
+        'utilization': 0,
+        'training_score': 0.0,
+        'external_result': {},
+        'packing_steps': []
+    }
+    return {
+        'success': True,
+        'packed_items': first['packed_items'],
+        'leftover_items': leftover_items,
+        'bin_size': first['bin_size'],
+        'utilization': first['utilization'],
+        'training_score': first['training_score'],
+        'packing_time': packing_time,
+        'external_result': first['external_result'],
+        'packing_steps': first['packing_steps'],
+        'containers': containers,
+        'fleet': {
+            'containers_used': len(containers),
+            'containers_available': len(instances),
+            'packed_count': sum(len(c['packed_items']) for c in containers),
+            'leftover_count': len(leftover_items),
+            'packed_volume': packed_volume,
+            'used_volume': used_volume,
+            'utilization': fleet_utilization
+        }
+    }
+
+def plan_multi_container(data):
+    packing_endpoint = require_endpoint_and_items(data)
+    instances = parse_containers(data['containers'])
+
+    api_items = []
+    for item in data.get('items', []):
+        api_item = convert_item(item)
+        if api_item is None:
+            logging.error(f"Invalid item format: {item}")
+            continue
+        api_items.append(api_item)
+    if not api_items:
+        raise PackingError('No items to pack')
+
+    units = expand_units(api_items, rows=True)
+    logging.info(f"Multi-container: {len(units)} items, {len(instances)} containers")
+
+    assignment, unassigned = assign_ffd(units, instances)
+    base_data = {key: value for key, value in data.items() if key not in ('items', 'containers', 'bin_size')}
+    calls, call_instances = container_calls(base_data, instances, assignment, len(api_items))
+
+    first_dims = instances[0]['dims']
+    manifest = {
+        'items': api_items,
+        'bin_size': {'L': first_dims[0], 'W': first_dims[1], 'H': first_dims[2]},
+        'parameters': data.get('parameters', {}),
+        'containers': data['containers']
+    }
+    state = {
+        'endpoint': packing_endpoint,
+        'instances': instances,
+        'base_data': base_data,
+        'item_count': len(api_items),
+        'custom_constraints': has_custom_constraints(data.get('parameters') or {}),
+        'assigned': assignment,
+        'call_instances': call_instances,
+        'unused': [inst['index'] for inst in instances if inst['index'] not in assignment],
+        'unassigned': unassigned,
+        'packed': {},
+        'external': {}
+    }
+    return PackPlan(packing_endpoint, manifest, calls, finish_multi_container, state, mode='multi_container')
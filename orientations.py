@@ -0,0 +1,74 @@
+"""
+Orientation catalog: các phép xoay hợp lệ của từng loại item được tính sẵn thành bảng.
+
+rotation_id được tra theo chỉ số trong bảng hoán vị thay vì chuỗi if/elif. Bảng của
+mỗi bộ kích thước (l0, w0, h0) được cache giữa các request; catalog của một request
+gom các bảng đó thành mảng NumPy cùng diện tích đáy, thể tích và cờ vừa bin.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+EPS = 1e-6
+
+# Hoán vị (chỉ số trong (l0, w0, h0)) theo rotation_id - cùng quy ước với get_rotation_by_id
+LOCK_AXIS_PERMUTATIONS = np.array([[0, 1, 2], [1, 0, 2]])
+FREE_PERMUTATIONS = np.array([[1, 0, 2], [1, 2, 0], [0, 1, 2], [0, 2, 1], [2, 1, 0], [2, 0, 1]])
+
+
+@lru_cache(maxsize=4096)
+def rotation_table(l0, w0, h0, lock_axis):
+    """Tuple các (l, w, h) theo rotation_id cho một bộ kích thước"""
+    dims = (l0, w0, h0)
+    permutations = LOCK_AXIS_PERMUTATIONS if lock_axis else FREE_PERMUTATIONS
+    return tuple(tuple(dims[i] for i in permutation) for permutation in permutations)
+
+def rotate_many(original, rotation_ids, lock_axis):
+    """
+    Kích thước sau khi xoay cho nhiều item cùng lúc.
+
+    Parameters:
+    - original: mảng (n, 3) kích thước gốc
+    - rotation_ids: mảng (n,) rotation_id; id không hợp lệ cho kết quả (-1, -1, -1)
+    """
+    permutations = LOCK_AXIS_PERMUTATIONS if lock_axis else FREE_PERMUTATIONS
+    rotation_ids = np.asarray(rotation_ids, dtype=int)
+    valid = (rotation_ids >= 0) & (rotation_ids < len(permutations))
+    rotated = np.take_along_axis(np.asarray(original, dtype=float), permutations[np.where(valid, rotation_ids, 0)], axis=1)
+    rotated[~valid] = -1
+    return rotated
+
+
+class OrientationCatalog:
+    """Bảng orientation của các loại item trong một request, theo thứ tự xuất hiện"""
+
+    def __init__(self, api_items, bin_dims):
+        self.index = {}
+        for item in api_items:
+            self.index.setdefault((item['L'], item['W'], item['H']), len(self.index))
+        keys = list(self.index)
+
+        self.dims = np.array(keys, dtype=float).reshape(-1, 3)
+        self.lock_rotations = np.array([rotation_table(*key, True) for key in keys], dtype=float).reshape(-1, 2, 3)
+        self.free_rotations = np.array([rotation_table(*key, False) for key in keys], dtype=float).reshape(-1, 6, 3)
+        self.lock_footprints = self.lock_rotations[:, :, 0] * self.lock_rotations[:, :, 1]
+        self.free_footprints = self.free_rotations[:, :, 0] * self.free_rotations[:, :, 1]
+        self.volumes = self.dims.prod(axis=1)
+
+        bin_dims = np.asarray(bin_dims, dtype=float)
+        self.lock_fits = (self.lock_rotations <= bin_dims + EPS).all(axis=2)
+        self.free_fits = (self.free_rotations <= bin_dims + EPS).all(axis=2)
+
+    def type_index(self, item):
+        return self.index[(item['L'], item['W'], item['H'])]
+
+    def rotations(self, item):
+        """Mảng (k, 3) các orientation hợp lệ của item theo num_axis"""
+        i = self.type_index(item)
+        return self.lock_rotations[i] if item.get('num_axis', 2) == 2 else self.free_rotations[i]
+
+    def fits(self, item):
+        """Item có vừa bin với ít nhất một orientation hợp lệ không"""
+        i = self.type_index(item)
+        fits = self.lock_fits[i] if item.get('num_axis', 2) == 2 else self.free_fits[i]
+        return bool(fits.any())
@@ -0,0 +1,543 @@
+import json
+import logging
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+from orientations import rotate_many, rotation_table
+from step_codec import encode_steps
+
+
+class PackingError(Exception):
+    """Lỗi dữ liệu đầu vào / kết quả, được chuyển thành JSON response bởi route"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def f(x, bin_size):
+    """Exponential decay function for area scoring"""
+    return 4 * x * (2 ** (-(x/bin_size)))
+
+def area_score_by_l(px, py, pz, l, w, h, bin_l, bin_w, bin_h):
+    """Calculate area score based on length dimension"""
+    return (f(px + l, bin_l) - f(px, bin_l)) * w * h
+
+def area_score_by_w(px, py, pz, l, w, h, bin_l, bin_w, bin_h):
+    """Calculate area score based on width dimension"""
+    return (f(py + w, bin_w) - f(py, bin_w)) * l * h
+
+def same_h_scores(tops):
+    """Same height score của mọi item: tỉ lệ các item khác có cùng cao độ mặt trên"""
+    n = len(tops)
+    if n <= 1:
+        return np.zeros(n)
+    ordered = np.sort(tops)
+    lo = np.searchsorted(ordered, tops - 0.001, side='right')
+    hi = np.searchsorted(ordered, tops + 0.001, side='left')
+    return (hi - lo - 1) / (n - 1)
+
+def calculate_algorithm_training_score(packed_items, bin_l, bin_w, bin_h, lock_axis=True):
+    """Calculate training score using complex algorithm formula"""
+    if not packed_items or bin_l <= 0 or bin_w <= 0 or bin_h <= 0:
+        return 0.0
+
+    original = np.array([
+        [item['original_length'], item['original_width'], item['original_height']] for item in packed_items
+    ], dtype=float)
+    rotation_ids = np.array([item.get('rotation_id', 0) for item in packed_items], dtype=int)
+    px, py, pz = np.array([[item['x'], item['y'], item['z']] for item in packed_items], dtype=float).T
+
+    # Get rotated dimensions - tra bảng theo rotation_id cho tất cả items
+    l, w, h = rotate_many(original, rotation_ids, lock_axis).T
+
+    # Calculate area scores
+    area_score_l = area_score_by_l(px, py, pz, l, w, h, bin_l, bin_w, bin_h)
+    area_score_w = area_score_by_w(px, py, pz, l, w, h, bin_l, bin_w, bin_h)
+    area_score = (area_score_l + area_score_w) / 2.0  # Mean of area scores
+
+    # Calculate same height score (luôn theo lock_axis)
+    same_height_score = same_h_scores(pz + rotate_many(original, rotation_ids, True)[:, 2])
+
+    # Normalize by bin volume
+    return float((area_score + same_height_score).sum() / (bin_l * bin_w * bin_h))
+
+def get_rotation_by_id(l0, w0, h0, rotation_id, lock_axis):
+    """
+    Trả về (l, w, h) đã xoay tương ứng với rotation_id.
+
+    Parameters:
+    - l0, w0, h0: Kích thước gốc
+    - rotation_id: ID phép xoay
+    - lock_axis: True nếu chỉ xoay đáy (l, w), False nếu xoay cả 3 trục
+
+    Returns:
+    - (l, w, h): kích thước sau khi xoay, (-1, -1, -1) nếu rotation_id không hợp lệ
+    """
+    table = rotation_table(l0, w0, h0, bool(lock_axis))
+    if rotation_id in range(len(table)):
+        return table[int(rotation_id)]
+    return -1, -1, -1
+
+
+def parse_bin_size(data):
+    """Đọc bin_size (length/width/height) từ request của webapp"""
+    bin_size = data.get('bin_size', {})
+    return (
+        int(bin_size.get('length', 10)),
+        int(bin_size.get('width', 10)),
+        int(bin_size.get('height', 10))
+    )
+
+def convert_item(item):
+    """Chuyển 1 item từ format webapp (length/width/height hoặc L/W/H) sang format packing API"""
+    # Kiểm tra format - ưu tiên format cũ (length/width/height) vì đó là format từ webapp
+    if 'length' in item and 'width' in item and 'height' in item:
+        # Format từ webapp với length/width/height
+        return {
+            "id": item.get('id', 0),
+            "request_id": item.get('request_id', item.get('id', 0)),
+            "L": float(item['length']),
+            "W": float(item['width']),
+            "H": float(item['height']),
+            "num_axis": item.get('number_axis', item.get('num_axis', 2)),
+            "quantity": 1  # Mỗi item đã được expand sẵn
+        }
+    elif 'L' in item and 'W' in item and 'H' in item:
+        # Format JSON upload với L/W/H
+        return {
+            "id": item.get('id', 0),
+            "request_id": item.get('request_id', item.get('id', 0)),
+            "L": float(item['L']),
+            "W": float(item['W']),
+            "H": float(item['H']),
+            "num_axis": item.get('num_axis', 2),
+            "quantity": item.get('quantity', 1)
+        }
+    return None
+
+def require_endpoint_and_items(data):
+    """Kiểm tra các trường bắt buộc chung của /pack và /pack_step_by_step"""
+    if not data:
+        raise PackingError('No data provided')
+
+    # Lấy endpoint URL từ request
+    packing_endpoint = data.get('packing_endpoint', '')
+    if not packing_endpoint:
+        raise PackingError('Vui lòng cung cấp packing_endpoint URL')
+
+    return packing_endpoint
+
+def build_packing_request(data):
+    """
+    Chuẩn bị request gửi tới external packing endpoint cho /pack.
+
+    Returns:
+    - (packing_endpoint, packing_request, (bin_length, bin_width, bin_height))
+    """
+    packing_endpoint = require_endpoint_and_items(data)
+
+    # Get bin size
+    bin_length, bin_width, bin_height = parse_bin_size(data)
+
+    # Get items
+    items = data.get('items', [])
+
+    logging.info(f"Received {len(items)} items to pack in bin {bin_length}x{bin_width}x{bin_height}")
+    logging.info(f"Using external endpoint: {packing_endpoint}")
+
+    if not items:
+        raise PackingError('No items to pack')
+
+    # Tạo default parameters dựa trên số items
+    num_unique_items = len(set(item.get('id', 0) for item in items))
+
+    # Default stack rule - tất cả items có thể stack trên nhau
+    default_stack_rule = []
+    for i in range(num_unique_items):
+        row = [3] * num_unique_items  # 3 = unlimited stacking
+        default_stack_rule.append(row)
+
+    # Default lifo order - không có ràng buộc LIFO
+    default_lifo_order = [0] * num_unique_items
+
+    # Extract parameters from input data
+    input_parameters = data.get('parameters', {})
+
+    # Handle weights parameter - pass through original format to let algorithm decide
+    weights_param = input_parameters.get('weights')
+    if weights_param is not None:
+        # Pass weights in original format (object or array)
+        weights_value = weights_param
+        logging.info(f"Passing weights in original format: {type(weights_param).__name__} with {len(weights_param) if hasattr(weights_param, '__len__') else 'N/A'} items")
+    else:
+        # Default weights object for new format
+        weights_value = {
+            "W_lifo": 10.0,
+            "W_sim_l": -1.0,
+            "W_sim_w": -1.0,
+            "W_sim_h": 0.0,
+            "W_leftover_l_ratio": -5.0,
+            "W_leftover_w_ratio": -5.0,
+            "W_packable_l": -0.5,
+            "W_packable_w": -0.5
+        }
+        logging.info(f"Using default weights object: {weights_value}")
+
+    packing_request = {
+        "items": [],
+        "bin_size": {
+            "L": bin_length,
+            "W": bin_width,
+            "H": bin_height
+        },
+        "parameters": {
+            "stack_rule": input_parameters.get('stack_rule', default_stack_rule),
+            "lifo_order": input_parameters.get('lifo_order', default_lifo_order),
+            "weights": weights_value
+        }
+    }
+
+    # Chuyển đổi items sang format API
+    for item in items:
+        api_item = convert_item(item)
+        if api_item is None:
+            logging.error(f"Invalid item format: {item}")
+            continue
+        packing_request["items"].append(api_item)
+
+    # Validate dữ liệu trước khi gửi
+    if not packing_request["items"]:
+        raise PackingError('Không có items hợp lệ để pack')
+
+    # Ensure stack_rule is properly sized
+    actual_num_items = len(packing_request["items"])
+    if len(packing_request["parameters"]["stack_rule"]) != actual_num_items:
+        # Recreate stack_rule with correct size
+        packing_request["parameters"]["stack_rule"] = [[3] * actual_num_items for _ in range(actual_num_items)]
+
+    if len(packing_request["parameters"]["lifo_order"]) != actual_num_items:
+        # Recreate lifo_order with correct size
+        packing_request["parameters"]["lifo_order"] = [0] * actual_num_items
+
+    logging.info(f"Final item count: {len(packing_request['items'])}")
+    logging.info(f"Stack rule size: {len(packing_request['parameters']['stack_rule'])}x{len(packing_request['parameters']['stack_rule'][0]) if packing_request['parameters']['stack_rule'] else 0}")
+    logging.info(f"LIFO order size: {len(packing_request['parameters']['lifo_order'])}")
+
+    return packing_endpoint, packing_request, (bin_length, bin_width, bin_height)
+
+def build_step_request(data):
+    """
+    Chuẩn bị request step-by-step gửi tới external packing endpoint.
+
+    Returns:
+    - (packing_endpoint, packing_request, (bin_length, bin_width, bin_height))
+    """
+    packing_endpoint = require_endpoint_and_items(data)
+
+    # Get bin size
+    bin_length, bin_width, bin_height = parse_bin_size(data)
+
+    # Get items
+    items = data.get('items', [])
+
+    logging.info(f"Received {len(items)} items for step-by-step packing")
+
+    if not items:
+        raise PackingError('No items to pack')
+
+    # Chuẩn bị data để gửi tới external endpoint
+    packing_request = {
+        "items": [],
+        "bin_size": {
+            "L": bin_length,
+            "W": bin_width,
+            "H": bin_height
+        },
+        "parameters": {
+            "return_steps": True,  # Yêu cầu trả về steps
+            "step_by_step": True   # Chỉ định step-by-step mode
+        }
+    }
+
+    # Chuyển đổi items sang format API
+    for item in items:
+        api_item = convert_item(item)
+        if api_item is not None:
+            packing_request["items"].append(api_item)
+
+    return packing_endpoint, packing_request, (bin_length, bin_width, bin_height)
+
+def log_packing_request(packing_request):
+    """Log toàn bộ request gửi tới solver (chỉ khi bật DEBUG vì payload có thể rất lớn)"""
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f"Request data: {json.dumps(packing_request, indent=2)}")
+
+def expand_leftover_items(result):
+    """Expand leftover item groups của solver thành danh sách item theo quantity"""
+    leftover_items = []
+    for item_group in result.get('leftover_items', []):
+        for _ in range(item_group.get('quantity', 1)):
+            leftover_items.append({
+                'id': item_group['id'],
+                'request_id': item_group.get('request_id', item_group['id']),
+                'length': item_group['L'],
+                'width': item_group['W'],
+                'height': item_group['H']
+            })
+    return leftover_items
+
+def calculate_utilization(packed_items, bin_length, bin_width, bin_height):
+    """Utilization = volume used / total bin volume"""
+    bin_volume = bin_length * bin_width * bin_height
+    packed_volume = sum(item['length'] * item['width'] * item['height'] for item in packed_items)
+    return packed_volume / bin_volume if bin_volume > 0 else 0
+
+def build_packing_steps(packed_items):
+    """Tạo packing steps từ packed_items theo thứ tự pack_order"""
+    packing_steps = []
+    for item in sorted(packed_items, key=lambda x: x['pack_order']):
+        rotation_info = f" (Rotation: {item['rotation_id']})" if 'rotation_id' in item else ""
+        size_info = f"{item['length']}×{item['width']}×{item['height']}"
+        orig_size_info = ""
+        if 'original_length' in item:
+            orig_size_info = f" [Original: {item['original_length']}×{item['original_width']}×{item['original_height']}]"
+
+        packing_steps.append({
+            'item_id': item['id'],
+            'position': {
+                'x': item['x'],
+                'y': item['y'],
+                'z': item['z']
+            },
+            'dimensions': {
+                'length': item['length'],
+                'width': item['width'],
+                'height': item['height']
+            },
+            'original_dimensions': {
+                'length': item.get('original_length', item['length']),
+                'width': item.get('original_width', item['width']),
+                'height': item.get('original_height', item['height'])
+            },
+            'rotation_id': item.get('rotation_id', 0),
+            'step': item['pack_order'],
+            'description': f"Packed item {item['id']} (#{item['pack_order']}) at ({item['x']}, {item['y']}, {item['z']}) - Size: {size_info}{orig_size_info}{rotation_info}"
+        })
+    return packing_steps
+
+def expand_packed_groups(groups):
+    """Expand packed item groups của solver (positions) thành danh sách packed items theo format webapp"""
+    packed_items = []
+
+    # Xử lý packed items - đọc theo thứ tự trong output để có pack_order
+    pack_order = 1  # Thứ tự pack bắt đầu từ 1
+    for item_group in groups:
+        positions = item_group.get('positions', [])
+        # rotation_id giờ là một số duy nhất, không phải array
+        rotation_id = item_group.get('rotation_id', 0)
+
+        # Tính kích thước thực tế sau khi xoay
+        l0, w0, h0 = item_group['L'], item_group['W'], item_group['H']
+        num_axis = item_group.get('num_axis', 2)
+        lock_axis = (num_axis == 2)
+
+        # Áp dụng rotation
+        actual_l, actual_w, actual_h = get_rotation_by_id(l0, w0, h0, rotation_id, lock_axis)
+
+        # Mỗi position tương ứng với 1 item đã pack
+        for i, pos in enumerate(positions):
+            packed_items.append({
+                'id': item_group['id'],
+                'request_id': item_group.get('request_id', item_group['id']),
+                'length': actual_l,  # Kích thước sau khi xoay
+                'width': actual_w,   # Kích thước sau khi xoay
+                'height': actual_h,  # Kích thước sau khi xoay
+                'original_length': l0,  # Kích thước gốc
+                'original_width': w0,   # Kích thước gốc
+                'original_height': h0,  # Kích thước gốc
+                'rotation_id': rotation_id,
+                'x': pos['x'],
+                'y': pos['y'],
+                'z': pos['z'],
+                'pack_order': pack_order,  # Thứ tự pack theo output
+                'position_index': i + 1,  # Vị trí thứ i của item này
+                'total_positions': len(positions),  # Tổng số vị trí của item này
+                'item_type_id': item_group['id']  # ID loại item
+            })
+            pack_order += 1
+
+    return packed_items
+
+def build_pack_payload(packed_items, leftover_items, bin_dims, packing_time, external_result=None):
+    """Tạo response của /pack từ danh sách packed / leftover items đã chuyển về format webapp"""
+    bin_length, bin_width, bin_height = bin_dims
+
+    # Tính utilization dựa trên volume, không phải số lượng items
+    utilization = calculate_utilization(packed_items, bin_length, bin_width, bin_height)
+
+    # Tính training score theo công thức algorithm phức tạp
+    training_score = 0.0
+    if packed_items:
+        training_score = calculate_algorithm_training_score(packed_items, bin_length, bin_width, bin_height)
+
+    logging.info(f"Packing completed in {packing_time:.2f} seconds")
+    logging.info(f"Packed: {len(packed_items)}, Leftover: {len(leftover_items)}, Utilization: {utilization:.2%}")
+
+    return {
+        'success': True,
+        'packed_items': packed_items,
+        'leftover_items': leftover_items,
+        'bin_size': {
+            'length': bin_length,
+            'width': bin_width,
+            'height': bin_height
+        },
+        'utilization': utilization,
+        'training_score': training_score,
+        'packing_time': packing_time,
+        'external_result': external_result or {},
+        'packing_steps': build_packing_steps(packed_items)  # Thêm packing steps cho step-by-step visualization
+    }
+
+def shape_pack_result(result, bin_dims, packing_time):
+    """Chuyển đổi kết quả của external endpoint về format webapp cho /pack"""
+    return build_pack_payload(
+        expand_packed_groups(result.get('packed_items', [])),
+        expand_leftover_items(result),
+        bin_dims,
+        packing_time,
+        result.get('metadata', {})
+    )
+
+def shape_step_result(result, bin_dims, packing_time, step_encoding='delta'):
+    """
+    Chuyển đổi kết quả step-by-step của external endpoint về format webapp.
+
+    step_encoding='delta' lưu algorithm steps dạng keyframes + deltas (step_codec),
+    'full' giữ nguyên data của từng step.
+    """
+    bin_length, bin_width, bin_height = bin_dims
+
+    # Xử lý kết quả step-by-step
+    algorithm_steps = result.get('algorithm_steps', [])
+    final_result = result.get('final_result', {})
+
+    # Chuyển đổi algorithm steps sang format webapp
+    webapp_steps = []
+    for i, step in enumerate(algorithm_steps):
+        webapp_step = {
+            'step_number': i + 1,
+            'step_type': step.get('type', 'unknown'),
+            'description': step.get('description', f'Algorithm step {i + 1}'),
+            'data': step.get('data', {}),
+            'timestamp': step.get('timestamp', time.time())
+        }
+        webapp_steps.append(webapp_step)
+
+    encoding_info = {'format': 'full'}
+    if step_encoding == 'delta':
+        webapp_steps, encoding_info = encode_steps(webapp_steps)
+
+    # Xử lý final result như bình thường
+    packed_items = []
+    pack_order = 1
+
+    for item_group in final_result.get('packed_items', []):
+        positions = item_group.get('positions', [])
+        rotation_id = item_group.get('rotation_id', 0)
+
+        l0, w0, h0 = item_group['L'], item_group['W'], item_group['H']
+        num_axis = item_group.get('num_axis', 2)
+        lock_axis = (num_axis == 2)
+        actual_l, actual_w, actual_h = get_rotation_by_id(l0, w0, h0, rotation_id, lock_axis)
+
+        for i, pos in enumerate(positions):
+            packed_items.append({
+                'id': item_group['id'],
+                'request_id': item_group.get('request_id', item_group['id']),
+                'length': actual_l,
+                'width': actual_w,
+                'height': actual_h,
+                'original_length': l0,
+                'original_width': w0,
+                'original_height': h0,
+                'rotation_id': rotation_id,
+                'x': pos['x'],
+                'y': pos['y'],
+                'z': pos['z'],
+                'pack_order': pack_order
+            })
+            pack_order += 1
+
+    leftover_items = expand_leftover_items(final_result)
+
+    # Tính utilization
+    utilization = calculate_utilization(packed_items, bin_length, bin_width, bin_height)
+
+    return {
+        'success': True,
+        'algorithm_steps': webapp_steps,
+        'packed_items': packed_items,
+        'leftover_items': leftover_items,
+        'bin_size': {
+            'length': bin_length,
+            'width': bin_width,
+            'height': bin_height
+        },
+        'utilization': utilization,
+        'packing_time': packing_time,
+        'total_steps': len(webapp_steps),
+        'step_encoding': encoding_info
+    }
+
+def solver_error_message(status_code, body, text):
+    """Tạo thông báo lỗi từ response không thành công của external endpoint"""
+    error_msg = f"External endpoint returned status {status_code}"
+    if isinstance(body, dict):
+        error_msg += f": {body.get('message', body.get('error', 'Unknown error'))}"
+    else:
+        error_msg += f": {text}"
+    return error_msg
+
+def validate_endpoint_url(data):
+    """Kiểm tra endpoint_url của /check_endpoint, trả về URL hợp lệ"""
+    endpoint_url = data.get('endpoint_url', '')
+
+    if not endpoint_url:
+        raise PackingError('Vui lòng nhập endpoint URL')
+
+    # Validate URL format
+    try:
+        parsed = urlparse(endpoint_url)
+    except Exception:
+        raise PackingError('URL không hợp lệ')
+    if not all([parsed.scheme, parsed.netloc]):
+        raise PackingError('URL không hợp lệ. Vui lòng nhập URL đầy đủ (ví dụ: http://localhost:3001/pack)')
+
+    return endpoint_url
+
+def shape_health_status(health):
+    """Chuyển trạng thái health (đã cache) của external endpoint thành (payload, status_code) cho /check_endpoint"""
+    if health.available:
+        payload, status_code = {
+            'success': True,
+            'message': 'Endpoint hoạt động bình thường',
+            'endpoint_info': health.endpoint_info
+        }, 200
+    elif health.error == 'unavailable':
+        payload, status_code = {
+            'success': False,
+            'message': 'Không thể kết nối tới endpoint. Kiểm tra URL và server có đang chạy không.'
+        }, 400
+    elif health.error == 'timeout':
+        payload, status_code = {'success': False, 'message': 'Timeout khi kết nối tới endpoint'}, 400
+    elif health.error == 'error':
+        payload, status_code = {'success': False, 'message': f'Lỗi khi kiểm tra endpoint: {health.message}'}, 400
+    else:
+        payload, status_code = {'success': False, 'message': f'Endpoint trả về status code: {health.status_code}'}, 400
+    payload['health'] = health.to_dict()
+    return payload, status_code
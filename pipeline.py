@@ -0,0 +1,84 @@
+"""
+Pipeline chung của /pack cho cả Flask (sync) và ASGI (async) serving mode.
+
+Một request /pack được chia thành 3 bước:
+1. plan_pack(data): validate, chuyển đổi items và quyết định cần gọi solver
+   những request nào (có thể 0 request nếu kết quả tính được ngay).
+2. Serving layer gọi solver cho từng request trong plan.calls (blocking hoặc async).
+3. finish_pack(plan, results, packing_time): ghép kết quả thành response của /pack,
+   hoặc trả về một PackPlan tiếp theo nếu cần thêm một vòng gọi solver.
+
+Bước 1 và 3 là CPU thuần, không phụ thuộc Flask nên chạy được trong executor.
+"""
+import logging
+
+from packing import PackingError, build_packing_request, shape_pack_result, solver_error_message
+
+
+class PackPlan:
+    """Các solver request cần gọi và cách ghép kết quả của chúng"""
+
+    def __init__(self, endpoint, manifest, calls, finish, state, mode='pack'):
+        self.endpoint = endpoint  # External packing endpoint
+        self.manifest = manifest  # packing_request đầy đủ (dùng cho run store)
+        self.calls = calls        # Danh sách packing_request gửi tới solver (gọi song song)
+        self.finish = finish      # finish(state, results, packing_time) -> payload hoặc PackPlan
+        self.state = state
+        self.mode = mode
+
+
+def finish_single(state, results, packing_time):
+    return shape_pack_result(results[0], state['bin_dims'], packing_time)
+
+def plan_single(data):
+    """Plan mặc định: 1 lời gọi solver với toàn bộ items"""
+    packing_endpoint, packing_request, bin_dims = build_packing_request(data)
+    return PackPlan(
+        packing_endpoint, packing_request, [packing_request],
+        finish_single, {'bin_dims': bin_dims}
+    )
+
+def plan_pack(data):
+    if data and data.get('incremental'):
+        from incremental import plan_incremental
+        return plan_incremental(data)
+    if data and data.get('containers'):
+        from multi_container import plan_multi_container
+        return plan_multi_container(data)
+    if data:
+        from presolve import wants_presolve, presolve, plan_empty, with_presolve
+        if wants_presolve(data):
+            trimmed, report = presolve(data)
+            if report is not None:
+                plan = plan_empty(trimmed) if not trimmed['items'] else plan_solver(trimmed)
+                # Run store lưu manifest của request gốc, không phải phần còn lại sau presolve
+                _, manifest, _ = build_packing_request(data)
+                return with_presolve(plan, report, manifest)
+    return plan_solver(data)
+
+def plan_solver(data):
+    """Chọn cách gọi solver cho manifest: decomposition, layer patterns hoặc 1 lời gọi"""
+    if data:
+        from decomposition import wants_decomposition, plan_decomposed
+        if wants_decomposition(data):
+            return plan_decomposed(data)
+    if data and data.get('layer_patterns', True) is not False:
+        from layer_patterns import plan_layered
+        plan = plan_layered(data)
+        if plan is not None:
+            return plan
+    return plan_single(data)
+
+def solver_results(responses):
+    """Lấy body của các solver response; response lỗi đầu tiên được chuyển thành PackingError"""
+    results = []
+    for response in responses:
+        if response.status_code != 200:
+            error_msg = solver_error_message(response.status_code, response.body, response.text)
+            logging.error(f"External endpoint error: {error_msg}")
+            raise PackingError(error_msg)
+        results.append(response.body)
+    return results
+
+def finish_pack(plan, results, packing_time):
+    return plan.finish(plan.state, results, packing_time)
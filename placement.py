@@ -0,0 +1,301 @@
+"""
+Đặt thêm box vào không gian trống của một bin đã có sẵn các box cố định.
+
+Dùng heuristic extreme points: các điểm ứng viên là góc của các box đã đặt,
+mỗi box mới được đặt tại điểm thấp nhất (z, rồi x, rồi y) mà không chồng lấn
+box nào, nằm trong bin và được đỡ đủ diện tích đáy. Kiểm tra chồng lấn và diện
+tích đỡ được vector hóa bằng NumPy theo từng nhóm điểm ứng viên, nên chi phí
+mỗi box mới xấp xỉ O(số box trong bin).
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from orientations import rotation_table
+from packing import expand_leftover_items
+
+# Tỉ lệ diện tích đáy tối thiểu phải được đỡ (bởi sàn hoặc mặt trên của box khác)
+MIN_SUPPORT_RATIO = 0.75
+# Số điểm ứng viên kiểm tra mỗi lần (vector hóa)
+CANDIDATE_CHUNK = 64
+SUPPORT_CHUNK = 16
+EPS = 1e-6
+
+
+@lru_cache(maxsize=4096)
+def allowed_rotations(l0, w0, h0, num_axis=2):
+    """Các phép xoay hợp lệ (l, w, h, rotation_id), bỏ các phép xoay trùng kích thước"""
+    rotations = []
+    seen = set()
+    for rotation_id, dims in enumerate(rotation_table(l0, w0, h0, num_axis == 2)):
+        if dims not in seen:
+            seen.add(dims)
+            rotations.append((*dims, rotation_id))
+    return tuple(rotations)
+
+def boxes_from_items(packed_items):
+    """Mảng (n, 6) [x, y, z, l, w, h] từ packed items theo format webapp"""
+    if not packed_items:
+        return np.zeros((0, 6))
+    return np.array([
+        [item['x'], item['y'], item['z'], item['length'], item['width'], item['height']]
+        for item in packed_items
+    ], dtype=float)
+
+
+class BinSpace:
+    """Trạng thái một bin: các box đã đặt và các điểm ứng viên extreme point"""
+
+    def __init__(self, bin_dims, boxes=None, min_support_ratio=MIN_SUPPORT_RATIO):
+        self.bin = np.asarray(bin_dims, dtype=float)
+        self.min_support_ratio = min_support_ratio
+        boxes = np.zeros((0, 6)) if boxes is None else np.asarray(boxes, dtype=float).reshape(-1, 6)
+        self.boxes = boxes
+        points = np.vstack([np.zeros((1, 3)), self._extreme_points(boxes)])
+        self.points = points[~self._blocked(points)]
+
+    @staticmethod
+    def _extreme_points(boxes):
+        x, y, z, l, w, h = boxes.T
+        return np.vstack([
+            np.column_stack([x + l, y, z]),
+            np.column_stack([x, y + w, z]),
+            np.column_stack([x, y, z + h]),
+        ])
+
+    def _blocked(self, points):
+        """
+        Mask các điểm nằm trong một box đã đặt - đặt box mới tại đó chắc chắn chồng lấn.
+
+        Box và điểm được sắp theo x nên mỗi nhóm điểm chỉ so với các box có x gần đó.
+        """
+        blocked = np.zeros(len(points), dtype=bool)
+        if len(self.boxes) == 0 or len(points) == 0:
+            return blocked
+        b = self.boxes[np.argsort(self.boxes[:, 0], kind='stable')]
+        max_length = b[:, 3].max()
+        order = np.argsort(points[:, 0], kind='stable')
+        for start in range(0, len(order), CANDIDATE_CHUNK):
+            index = order[start:start + CANDIDATE_CHUNK]
+            p = points[index]
+            lo = np.searchsorted(b[:, 0], p[0, 0] - max_length, side='left')
+            hi = np.searchsorted(b[:, 0], p[-1, 0] + EPS, side='right')
+            near = b[lo:hi]
+            blocked[index] = (
+                (near[:, 0] <= p[:, 0:1] + EPS) & (p[:, 0:1] < near[:, 0] + near[:, 3] - EPS) &
+                (near[:, 1] <= p[:, 1:2] + EPS) & (p[:, 1:2] < near[:, 1] + near[:, 4] - EPS) &
+                (near[:, 2] <= p[:, 2:3] + EPS) & (p[:, 2:3] < near[:, 2] + near[:, 5] - EPS)
+            ).any(axis=1)
+        return blocked
+
+    def _near(self, points, l, w, h):
+        """Các box giao với hộp bao của mọi vị trí (points, l x w x h) - lọc trước khi so từng cặp"""
+        b = self.boxes
+        lo = points.min(axis=0)
+        hi = points.max(axis=0) + (l, w, h)
+        return b[
+            (b[:, 0] < hi[0]) & (b[:, 0] + b[:, 3] > lo[0]) &
+            (b[:, 1] < hi[1]) & (b[:, 1] + b[:, 4] > lo[1]) &
+            (b[:, 2] < hi[2]) & (b[:, 2] + b[:, 5] > lo[2])
+        ]
+
+    def _overlaps(self, points, l, w, h):
+        """Ma trận (m, n): điểm i đặt box (l, w, h) có chồng lấn box j (trong các box gần đó) không"""
+        b = self._near(points, l, w, h)
+        px, py, pz = points[:, 0:1], points[:, 1:2], points[:, 2:3]
+        return (
+            (px < b[:, 0] + b[:, 3] - EPS) & (px + l > b[:, 0] + EPS) &
+            (py < b[:, 1] + b[:, 4] - EPS) & (py + w > b[:, 1] + EPS) &
+            (pz < b[:, 2] + b[:, 5] - EPS) & (pz + h > b[:, 2] + EPS)
+        )
+
+    def support_ratios(self, points, l, w):
+        """Tỉ lệ diện tích đáy (l x w) tại mỗi điểm được đỡ bởi sàn hoặc mặt trên các box"""
+        ratios = np.ones(len(points))
+        raised = points[:, 2] > EPS
+        if not raised.any() or len(self.boxes) == 0:
+            ratios[raised] = 0.0
+            return ratios
+        p = points[raised]
+        # Chỉ các box có mặt trên nằm trong khoảng cao độ của các điểm
+        b = self._near(p - (0, 0, EPS), l, w, 0)
+        tops = b[:, 2] + b[:, 5]
+        touching = np.abs(tops - p[:, 2:3]) < EPS
+        dx = np.minimum(p[:, 0:1] + l, b[:, 0] + b[:, 3]) - np.maximum(p[:, 0:1], b[:, 0])
+        dy = np.minimum(p[:, 1:2] + w, b[:, 1] + b[:, 4]) - np.maximum(p[:, 1:2], b[:, 1])
+        area = np.where(touching, np.clip(dx, 0, None) * np.clip(dy, 0, None), 0.0)
+        ratios[raised] = area.sum(axis=1) / (l * w)
+        return ratios
+
+    def find_position(self, l, w, h):
+        """Điểm thấp nhất (z, x, y) đặt được box (l, w, h), hoặc None"""
+        points = self.points
+        inside = (
+            (points[:, 0] + l <= self.bin[0] + EPS) &
+            (points[:, 1] + w <= self.bin[1] + EPS) &
+            (points[:, 2] + h <= self.bin[2] + EPS)
+        )
+        candidates = points[inside]
+        if len(candidates) == 0:
+            return None
+        candidates = candidates[np.lexsort((candidates[:, 1], candidates[:, 0], candidates[:, 2]))]
+
+        for start in range(0, len(candidates), CANDIDATE_CHUNK):
+            chunk = candidates[start:start + CANDIDATE_CHUNK]
+            if len(self.boxes):
+                chunk = chunk[~self._overlaps(chunk, l, w, h).any(axis=1)]
+            # Điểm đầu tiên không chồng lấn thường đã được đỡ đủ nên kiểm tra từng nhóm nhỏ
+            for sub in range(0, len(chunk), SUPPORT_CHUNK):
+                points_sub = chunk[sub:sub + SUPPORT_CHUNK]
+                supported = self.support_ratios(points_sub, l, w) >= self.min_support_ratio - EPS
+                if supported.any():
+                    return tuple(points_sub[np.argmax(supported)])
+        return None
+
+    def place(self, rotations):
+        """
+        Đặt một box với phép xoay tốt nhất trong rotations [(l, w, h, rotation_id)].
+
+        Returns:
+        - (x, y, z, l, w, h, rotation_id) hoặc None nếu không đặt được
+        """
+        best = None
+        for l, w, h, rotation_id in rotations:
+            position = self.find_position(l, w, h)
+            if position is None:
+                continue
+            x, y, z = position
+            if best is None or (z, x, y) < (best[2], best[0], best[1]):
+                best = (x, y, z, l, w, h, rotation_id)
+        if best is not None:
+            self.add(best[:6])
+        return best
+
+    def add(self, box):
+        box = np.asarray(box, dtype=float).reshape(1, 6)
+        x, y, z, l, w, h = box[0]
+        p = self.points
+        covered = (
+            (x <= p[:, 0] + EPS) & (p[:, 0] < x + l - EPS) &
+            (y <= p[:, 1] + EPS) & (p[:, 1] < y + w - EPS) &
+            (z <= p[:, 2] + EPS) & (p[:, 2] < z + h - EPS)
+        )
+        self.boxes = np.vstack([self.boxes, box])
+        new_points = self._extreme_points(box)
+        self.points = np.vstack([p[~covered], new_points[~self._blocked(new_points)]])
+
+    def unsupported_above(self, removed, keep):
+        """
+        Chỉ số các box (trong keep) nằm ngay trên các box removed và không còn được đỡ đủ.
+
+        Parameters:
+        - removed: mảng (k, 6) các box vừa bỏ đi
+        - keep: mask bool (n,) các box còn lại trong self.boxes
+        """
+        b = self.boxes
+        tops = removed[:, 2] + removed[:, 5]
+        resting = (
+            (np.abs(b[:, 2] - tops[:, None]) < EPS) &
+            (b[:, 0] < removed[:, 0:1] + removed[:, 3:4]) & (b[:, 0] + b[:, 3] > removed[:, 0:1]) &
+            (b[:, 1] < removed[:, 1:2] + removed[:, 4:5]) & (b[:, 1] + b[:, 4] > removed[:, 1:2])
+        ).any(axis=0) & keep
+        candidates = np.flatnonzero(resting)
+        if len(candidates) == 0:
+            return candidates
+
+        kept = BinSpace(self.bin, b[keep], self.min_support_ratio)
+        lost = []
+        for index in candidates:
+            x, y, z, l, w, h = b[index]
+            ratio = kept.support_ratios(np.array([[x, y, z]]), l, w)[0]
+            if ratio < self.min_support_ratio - EPS:
+                lost.append(index)
+        return np.array(lost, dtype=int)
+
+
+def expand_units(api_items, rows=False):
+    """
+    Expand API items theo quantity thành từng đơn vị.
+    rows=True: mỗi unit mang "row" - chỉ số item gốc trong api_items (các item có thể trùng id).
+    """
+    units = []
+    for row, item in enumerate(api_items):
+        for _ in range(int(item.get('quantity', 1))):
+            unit = {**item, 'quantity': 1}
+            if rows:
+                unit['row'] = row
+            units.append(unit)
+    return units
+
+def unit_volume(unit):
+    return unit['L'] * unit['W'] * unit['H']
+
+def unit_fits(unit, bin_dims):
+    """Unit có vừa bin (rỗng) với ít nhất một phép xoay hợp lệ không"""
+    return any(
+        l <= bin_dims[0] + EPS and w <= bin_dims[1] + EPS and h <= bin_dims[2] + EPS
+        for l, w, h, _ in allowed_rotations(unit['L'], unit['W'], unit['H'], unit.get('num_axis', 2))
+    )
+
+def unit_to_leftover(unit):
+    return {
+        'id': unit['id'],
+        'request_id': unit['request_id'],
+        'length': unit['L'],
+        'width': unit['W'],
+        'height': unit['H']
+    }
+
+def leftover_units(result, num_axis_by_id):
+    """Leftover items trong kết quả của solver thành units (num_axis lấy theo id)"""
+    return [
+        {
+            'id': item['id'],
+            'request_id': item['request_id'],
+            'L': item['length'],
+            'W': item['width'],
+            'H': item['height'],
+            'num_axis': num_axis_by_id.get(item['id'], 2),
+            'quantity': 1
+        }
+        for item in expand_leftover_items(result)
+    ]
+
+def placed_item(unit, placement):
+    """Packed item theo format webapp cho một unit vừa được BinSpace đặt"""
+    x, y, z, l, w, h, rotation_id = placement
+    return {
+        'id': unit['id'],
+        'request_id': unit['request_id'],
+        'length': l,
+        'width': w,
+        'height': h,
+        'original_length': unit['L'],
+        'original_width': unit['W'],
+        'original_height': unit['H'],
+        'rotation_id': rotation_id,
+        'x': float(x),
+        'y': float(y),
+        'z': float(z),
+        'position_index': 1,
+        'total_positions': 1,
+        'item_type_id': unit['id']
+    }
+
+def place_units(space, units):
+    """Đặt units (lớn trước) vào space; trả về (packed items mới, units không đặt được)"""
+    placed = []
+    failed = []
+    # Không gian trống chỉ giảm dần nên unit cùng kích thước với một unit đã thất bại cũng sẽ thất bại
+    no_fit = set()
+    for unit in sorted(units, key=lambda u: -unit_volume(u)):
+        key = (unit['L'], unit['W'], unit['H'], unit.get('num_axis', 2))
+        placement = None
+        if key not in no_fit:
+            placement = space.place(allowed_rotations(*key))
+        if placement is None:
+            no_fit.add(key)
+            failed.append(unit)
+        else:
+            placed.append(placed_item(unit, placement))
+    return placed, failed
@@ -0,0 +1,223 @@
+"""
+Pre-solve stage của /pack: cận dưới và kiểm tra khả thi trước khi gọi solver.
+
+Trên bảng orientation của các loại item (OrientationCatalog), tính vector hóa:
+- volume:    ceil(tổng thể tích items / thể tích bin)
+- l1, l2:    cận dưới L1 / L2 (Martello-Toth) của bin packing 1D trên từng trục; chỉ xét
+             các item lớn hơn nửa bin theo cả hai trục còn lại với mọi orientation vừa bin
+             (không thể đặt cạnh nhau nên phải xếp nối tiếp theo trục đó)
+- footprint: các item lớn hơn nửa bin theo một trục không chồng được lên nhau theo trục
+             đó, nên tổng diện tích chiếu lên hai trục còn lại không vượt mặt bin
+bins_needed là cận lớn nhất; > 1 nghĩa là chắc chắn không pack hết được vào một bin.
+Kết quả trả về trong "bounds" của response.
+
+Trước khi gọi solver:
+- items không vừa bin với bất kỳ orientation hợp lệ nào bị bỏ (thay vì lỗi 400) và
+  trả về trong leftover_items
+- "volume_budget": k (mặc định PRESOLVE_VOLUME_BUDGET, 0 = tắt) giữ items theo thứ tự ưu
+  tiên (trường "priority" của item, lớn trước; cùng priority theo thứ tự request) tới khi
+  tổng thể tích đạt k lần thể tích bin, phần còn lại vào leftover_items mà không gửi solver
+
+Tắt cho một request bằng "presolve": false. Khi request có stack_rule / lifo_order riêng
+(đánh chỉ số theo item) chỉ tính bounds, không bỏ / cắt items.
+"""
+import logging
+import math
+import os
+import time
+
+import numpy as np
+
+from orientations import EPS, OrientationCatalog
+from packing import build_pack_payload, convert_item, parse_bin_size
+from pipeline import PackPlan
+
+PRESOLVE_ENABLED = os.environ.get('PRESOLVE_ENABLED', '1') != '0'
+PRESOLVE_VOLUME_BUDGET = float(os.environ.get('PRESOLVE_VOLUME_BUDGET', 0))
+
+
+def type_arrays(catalog, api_items):
+    """
+    Orientation vừa bin của từng item dưới dạng mảng.
+
+    Returns:
+    - rotations: (n, 6, 3) các orientation (bản lock axis được lặp lại cho đủ 6)
+    - usable: (n, 6) orientation hợp lệ theo num_axis và vừa bin
+    """
+    index = np.array([catalog.type_index(item) for item in api_items], dtype=int)
+    lock = np.array([item.get('num_axis', 2) == 2 for item in api_items], dtype=bool)
+    lock_rotations = np.concatenate([catalog.lock_rotations] * 3, axis=1)[index]
+    lock_fits = np.concatenate([catalog.lock_fits, np.zeros_like(catalog.free_fits[:, 2:])], axis=1)[index]
+    rotations = np.where(lock[:, None, None], lock_rotations, catalog.free_rotations[index])
+    usable = np.where(lock[:, None], lock_fits, catalog.free_fits[index])
+    return rotations, usable
+
+def l2_bound(sizes, counts, capacity):
+    """Cận dưới L2 (Martello-Toth) của bin packing 1D, items có multiplicity"""
+    if len(sizes) == 0:
+        return 0
+    half = capacity / 2
+    alphas = np.concatenate([[0.0], np.unique(sizes[sizes <= half + EPS])])[:, None]
+    big = sizes > capacity - alphas + EPS
+    medium = ~big & (sizes > half + EPS)
+    small = ~big & ~medium & (sizes >= alphas - EPS)
+    n1 = (big * counts).sum(axis=1)
+    n2 = (medium * counts).sum(axis=1)
+    spare = n2 * capacity - (medium * counts * sizes).sum(axis=1)
+    rest = np.ceil(((small * counts * sizes).sum(axis=1) - spare) / capacity - EPS)
+    return int((n1 + n2 + np.maximum(rest, 0)).max())
+
+def packing_bounds(rotations, usable, quantities, bin_dims):
+    """Các cận dưới số bin cần dùng cho items (mọi item đều có orientation vừa bin)"""
+    bin_dims = np.asarray(bin_dims, dtype=float)
+    bin_volume = float(bin_dims.prod())
+    quantities = np.asarray(quantities, dtype=float)
+    volumes = rotations[:, 0].prod(axis=1)
+    item_volume = float((volumes * quantities).sum())
+
+    l1 = l2 = footprint = 0
+    for axis in range(3):
+        others = [a for a in range(3) if a != axis]
+        # Orientation không dùng được không làm item "nhỏ" đi
+        large = (rotations[:, :, others] > bin_dims[others] / 2 + EPS).all(axis=2) | ~usable
+        length = np.where(usable, rotations[:, :, axis], np.inf).min(axis=1)
+        chained = large.all(axis=1)
+        if chained.any():
+            l1 = max(l1, math.ceil((length[chained] * quantities[chained]).sum() / bin_dims[axis] - EPS))
+            l2 = max(l2, l2_bound(length[chained], quantities[chained], bin_dims[axis]))
+
+        tall = ((rotations[:, :, axis] > bin_dims[axis] / 2 + EPS) | ~usable).all(axis=1)
+        if tall.any():
+            area = np.where(usable, rotations[:, :, others[0]] * rotations[:, :, others[1]], np.inf).min(axis=1)
+            face = bin_dims[others[0]] * bin_dims[others[1]]
+            footprint = max(footprint, math.ceil((area[tall] * quantities[tall]).sum() / face - EPS))
+
+    volume = math.ceil(item_volume / bin_volume - EPS) if bin_volume > 0 else 0
+    lower_bounds = {'volume': volume, 'l1': l1, 'l2': l2, 'footprint': footprint}
+    bins_needed = max(lower_bounds.values())
+    return {
+        'item_count': int(quantities.sum()),
+        'item_volume': item_volume,
+        'bin_volume': bin_volume,
+        'volume_ratio': item_volume / bin_volume if bin_volume > 0 else 0,
+        # Utilization lớn nhất có thể đạt được trong một bin
+        'max_utilization': min(item_volume / bin_volume, 1.0) if bin_volume > 0 else 0,
+        'lower_bounds': lower_bounds,
+        'bins_needed': bins_needed,
+        'single_bin_possible': bins_needed <= 1
+    }
+
+def trim_quantities(volumes, quantities, priorities, budget):
+    """Quantity giữ lại của từng item khi giữ theo thứ tự ưu tiên tới hết budget thể tích"""
+    order = np.lexsort((np.arange(len(volumes)), -priorities))
+    ordered_volumes = volumes[order]
+    before = np.cumsum(ordered_volumes * quantities[order]) - ordered_volumes * quantities[order]
+    fit = np.floor((budget - before) / np.maximum(ordered_volumes, EPS) + EPS)
+    kept = np.empty_like(quantities)
+    kept[order] = np.clip(fit, 0, quantities[order])
+    return kept
+
+def leftover_units(api_item, quantity):
+    return [
+        {
+            'id': api_item['id'],
+            'request_id': api_item['request_id'],
+            'length': api_item['L'],
+            'width': api_item['W'],
+            'height': api_item['H']
+        }
+        for _ in range(int(quantity))
+    ]
+
+def with_quantity(raw_item, quantity):
+    if quantity == raw_item.get('quantity', 1):
+        return raw_item
+    return {**raw_item, 'quantity': int(quantity)}
+
+
+def presolve(data):
+    """
+    Tính bounds, bỏ items không bao giờ vừa bin và cắt theo volume budget.
+
+    Returns:
+    - (data chỉ còn các items gửi đi, report) - report là None nếu không có items hợp lệ
+      để tính (để validate của bước sau báo lỗi như cũ)
+    """
+    from layer_patterns import has_custom_constraints
+
+    started = time.time()
+    bin_dims = parse_bin_size(data)
+    raw_items, api_items = [], []
+    for item in data.get('items') or []:
+        api_item = convert_item(item)
+        if api_item is not None:
+            raw_items.append(item)
+            api_items.append(api_item)
+    if not api_items:
+        return data, None
+
+    catalog = OrientationCatalog(api_items, bin_dims)
+    rotations, usable = type_arrays(catalog, api_items)
+    fits = usable.any(axis=1)
+    quantities = np.array([float(item['quantity']) for item in api_items])
+    volumes = rotations[:, 0].prod(axis=1)
+
+    bounds = packing_bounds(rotations[fits], usable[fits], quantities[fits], bin_dims)
+    report = {'bounds': bounds, 'leftover_items': []}
+    if has_custom_constraints(data.get('parameters') or {}):
+        return data, report
+
+    kept = np.where(fits, quantities, 0)
+    bounds['dropped'] = [
+        {'id': api_items[i]['id'], 'quantity': int(quantities[i])} for i in np.flatnonzero(~fits)
+    ]
+    budget = float(data.get('volume_budget', PRESOLVE_VOLUME_BUDGET) or 0)
+    if budget > 0:
+        priorities = np.array([float(item.get('priority', 0)) for item in raw_items])
+        kept = trim_quantities(volumes, kept, priorities, budget * bounds['bin_volume'])
+        bounds['volume_budget'] = budget
+        bounds['trimmed'] = int((np.where(fits, quantities, 0) - kept).sum())
+
+    for i in np.flatnonzero(kept < quantities):
+        report['leftover_items'].extend(leftover_units(api_items[i], quantities[i] - kept[i]))
+    logging.info(
+        f"Presolve in {time.time() - started:.3f}s: lower bound {bounds['bins_needed']} bins, "
+        f"{len(report['leftover_items'])} items moved to leftover"
+    )
+
+    data = {
+        **data,
+        'items': [with_quantity(raw_items[i], kept[i]) for i in np.flatnonzero(kept > 0)]
+    }
+    return data, report
+
+def finish_empty(state, results, packing_time):
+    return build_pack_payload([], [], state['bin_dims'], packing_time)
+
+def plan_empty(data):
+    """Plan không gọi solver khi presolve không còn item nào để pack (manifest do with_presolve gắn)"""
+    bin_dims = parse_bin_size(data)
+    return PackPlan(data.get('packing_endpoint', ''), None, [], finish_empty, {'bin_dims': bin_dims})
+
+def finish_presolved(state, results, packing_time):
+    outcome = state['finish'](state['state'], results, packing_time)
+    if isinstance(outcome, PackPlan):
+        return with_presolve(outcome, state['report'])
+    report = state['report']
+    outcome['leftover_items'] = outcome.get('leftover_items', []) + report['leftover_items']
+    outcome['bounds'] = report['bounds']
+    return outcome
+
+def with_presolve(plan, report, manifest=None):
+    """
+    Gắn bounds và các items bị bỏ / cắt vào response cuối cùng của plan.
+    manifest: packing_request của request gốc (trước presolve) để lưu vào run store.
+    """
+    if manifest is not None:
+        plan.manifest = manifest
+    plan.state = {'finish': plan.finish, 'state': plan.state, 'report': report}
+    plan.finish = finish_presolved
+    return plan
+
+def wants_presolve(data):
+    return PRESOLVE_ENABLED and data.get('presolve', True) is not False
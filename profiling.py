@@ -0,0 +1,253 @@
+"""
+Profiling theo từng request (opt-in) bằng sampling profiler.
+
+Một request được profile khi có header X-Profile-Token khớp PROFILE_ADMIN_TOKEN, hoặc
+được chọn ngẫu nhiên theo PROFILE_SAMPLE_RATE. Trong lúc route chạy, một thread nền
+lấy mẫu stack của thread xử lý request mỗi PROFILE_INTERVAL giây; kết quả được lưu
+theo profile id ở dạng folded stacks ("frame;frame;frame count" mỗi dòng) - đọc được
+bằng flamegraph.pl, speedscope, inferno:
+    <PROFILE_DIR>/<profile id>.folded
+    <PROFILE_DIR>/<profile id>.json     # route, thời gian, số mẫu, status, request_id
+Profile id luôn được sinh ở server (client không ghi đè được profile có sẵn) và trả lại
+trong header X-Profile-Id; header X-Request-Id (nếu có) chỉ được lưu trong metadata.
+
+/profiles chỉ mở khi đặt PROFILE_ADMIN_TOKEN và request gửi đúng X-Profile-Token.
+
+Khi không đặt PROFILE_ADMIN_TOKEN và PROFILE_SAMPLE_RATE = 0, profiled() / aprofiled()
+trả về nguyên view function - không có chi phí nào trên đường xử lý request.
+
+ASGI mode (aprofiled): thread được lấy mẫu là thread của event loop, nên profile có thể
+lẫn stack của các request khác đang chạy đồng thời trên cùng loop. Các bước CPU được
+đẩy sang executor (asgi.run_cpu, kể cả process pool) được lấy mẫu ngay trong worker bằng
+sampled_call và gộp vào profile của request.
+"""
+import asyncio
+import contextvars
+import functools
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN') or None
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+# Số profile giữ lại trên đĩa, profile cũ nhất bị xóa trước
+PROFILE_MAX_STORED = int(os.environ.get('PROFILE_MAX_STORED', 200))
+PROFILING_ENABLED = PROFILE_ADMIN_TOKEN is not None or PROFILE_SAMPLE_RATE > 0
+
+PROFILE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+# Sampler của request đang được profile trong task hiện tại (ASGI mode)
+_active_sampler = contextvars.ContextVar('active_sampler', default=None)
+
+
+def frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Lấy mẫu stack của một thread theo chu kỳ, đếm theo folded stack"""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def add(self, counts, samples):
+        """Gộp các mẫu lấy ở thread / process khác (sampled_call) vào profile"""
+        self.counts.update(counts)
+        self.samples += samples
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.counts.most_common())
+
+
+def sampled_call(func, *args):
+    """
+    Chạy func(*args) trong lúc lấy mẫu stack của thread hiện tại - dùng trong CPU worker
+    của ASGI mode. Returns: (kết quả, counts, số mẫu).
+    """
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+    try:
+        result = func(*args)
+    finally:
+        sampler.stop()
+    return result, sampler.counts, sampler.samples
+
+def active_sampler():
+    """StackSampler của request đang được profile (ASGI mode), hoặc None"""
+    return _active_sampler.get()
+
+
+def token_ok(headers):
+    """X-Profile-Token khớp PROFILE_ADMIN_TOKEN; luôn False khi không đặt token"""
+    if PROFILE_ADMIN_TOKEN is None:
+        return False
+    return hmac.compare_digest(headers.get('X-Profile-Token', '').encode(), PROFILE_ADMIN_TOKEN.encode())
+
+def should_profile(headers):
+    if token_ok(headers):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def new_profile_id():
+    return uuid.uuid4().hex[:16]
+
+def client_request_id(headers):
+    """X-Request-Id của client để tra cứu profile, hoặc None nếu không hợp lệ"""
+    request_id = headers.get('X-Request-Id', '')
+    return request_id if PROFILE_ID_PATTERN.match(request_id) else None
+
+def profile_path(profile_id, extension):
+    return os.path.join(PROFILE_DIR, f'{profile_id}.{extension}')
+
+def save_profile(profile_id, sampler, meta):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(profile_path(profile_id, 'folded'), 'w') as f:
+        f.write(sampler.folded())
+    with open(profile_path(profile_id, 'json'), 'w') as f:
+        json.dump({**meta, 'id': profile_id, 'samples': sampler.samples, 'interval': sampler.interval}, f)
+    prune_profiles()
+
+def prune_profiles():
+    metas = sorted(
+        (name for name in os.listdir(PROFILE_DIR) if name.endswith('.json')),
+        key=lambda name: os.path.getmtime(os.path.join(PROFILE_DIR, name))
+    )
+    for name in metas[:max(len(metas) - PROFILE_MAX_STORED, 0)]:
+        for extension in ('json', 'folded'):
+            path = profile_path(name[:-len('.json')], extension)
+            if os.path.exists(path):
+                os.remove(path)
+
+def list_profiles(limit=50):
+    """Metadata của các profile đã lưu, mới nhất trước"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith('.json'):
+            try:
+                with open(os.path.join(PROFILE_DIR, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    profiles.sort(key=lambda meta: meta.get('started_at', 0), reverse=True)
+    return profiles[:limit]
+
+def read_profile(profile_id):
+    """Nội dung folded của profile, hoặc None nếu không có"""
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    try:
+        with open(profile_path(profile_id, 'folded')) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def profiled(view, route):
+    """Bọc Flask view bằng sampling profiler; trả về nguyên view nếu profiling tắt"""
+    if not PROFILING_ENABLED:
+        return view
+
+    from flask import current_app, request
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not should_profile(request.headers):
+            return view(*args, **kwargs)
+
+        profile_id = new_profile_id()
+        sampler = StackSampler(threading.get_ident())
+        started_at = time.time()
+        sampler.start()
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        finally:
+            sampler.stop()
+
+        try:
+            save_profile(profile_id, sampler, {
+                'route': route,
+                'request_id': client_request_id(request.headers),
+                'started_at': started_at,
+                'duration': time.time() - started_at,
+                'status_code': response.status_code
+            })
+            response.headers['X-Profile-Id'] = profile_id
+            logging.info(f"Profiled {route} as {profile_id}: {sampler.samples} samples")
+        except OSError as e:
+            logging.error(f"Save profile error: {str(e)}")
+        return response
+
+    return wrapper
+
+
+def aprofiled(handler, route):
+    """Bọc async handler (ASGI mode) bằng sampling profiler; trả về nguyên handler nếu profiling tắt"""
+    if not PROFILING_ENABLED:
+        return handler
+
+    @functools.wraps(handler)
+    async def wrapper(request):
+        if not should_profile(request.headers):
+            return await handler(request)
+
+        profile_id = new_profile_id()
+        sampler = StackSampler(threading.get_ident())
+        token = _active_sampler.set(sampler)
+        started_at = time.time()
+        sampler.start()
+        try:
+            response = await handler(request)
+        finally:
+            sampler.stop()
+            _active_sampler.reset(token)
+
+        try:
+            await asyncio.to_thread(save_profile, profile_id, sampler, {
+                'route': route,
+                'request_id': client_request_id(request.headers),
+                'started_at': started_at,
+                'duration': time.time() - started_at,
+                'status_code': response.status_code
+            })
+            response.headers['X-Profile-Id'] = profile_id
+            logging.info(f"Profiled {route} as {profile_id}: {sampler.samples} samples")
+        except OSError as e:
+            logging.error(f"Save profile error: {str(e)}")
+        return response
+
+    return wrapper
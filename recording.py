@@ -0,0 +1,200 @@
+"""
+Recording mode cho traffic tới external packing endpoint.
+
+Khi đặt SOLVER_RECORD_DIR, mỗi request /pack và /pack_step_by_step (theo tỉ lệ
+SOLVER_RECORD_RATE) được ghi ra đĩa thành một file JSON nén gzip:
+    <SOLVER_RECORD_DIR>/<YYYY-MM-DD>/<HHMMSS>-<uuid>.json.gz
+gồm body request đã ẩn danh, từng cặp request/response với solver cùng latency, thời
+gian xử lý của route và tóm tắt response. replay.py dùng các file này để phát lại
+solver với đúng latency gốc và chạy lại một ngày traffic qua Flask app.
+
+Ẩn danh hóa:
+- id / request_id / item_id / run_id được thay bằng số thứ tự xuất hiện (1, 2, ...);
+  mỗi lời gọi solver có bảng thay thế riêng để replay server so khớp được request
+  mà không phụ thuộc id thật.
+- host của packing_endpoint được thay bằng hash, chỉ giữ path.
+- Các trường văn bản tự do (SOLVER_RECORD_REDACT_KEYS) bị xóa nội dung.
+- Response không phải JSON của solver (thường là trang lỗi, có thể lặp lại id khách hàng)
+  không được ghi nguyên văn mà thay bằng REDACTED_TEXT, kể cả trong message của route.
+
+Khi không đặt SOLVER_RECORD_DIR, start_recording trả về None và route không làm gì thêm.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+
+RECORD_DIR = os.environ.get('SOLVER_RECORD_DIR') or None
+RECORD_RATE = float(os.environ.get('SOLVER_RECORD_RATE', 1.0))
+REDACT_KEYS = frozenset(
+    key.strip() for key in os.environ.get(
+        'SOLVER_RECORD_REDACT_KEYS', 'name,description,customer,label,sku,note,notes,address'
+    ).split(',') if key.strip()
+)
+ID_KEYS = frozenset(('id', 'request_id', 'item_id', 'run_id'))
+REDACTED_TEXT = '[redacted]'
+
+# Ghi file ở thread riêng để nén / ghi đĩa không nằm trên đường trả response
+_writer = None
+
+
+def anonymize(value, ids):
+    """
+    Bản sao ẩn danh của value (dict / list JSON).
+
+    Parameters:
+    - ids: bảng {id gốc: id thay thế}, được bổ sung theo thứ tự xuất hiện
+    """
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if key in ID_KEYS and not isinstance(item, (dict, list)) and item is not None:
+                result[key] = ids.setdefault(item, len(ids) + 1)
+            elif key in REDACT_KEYS and isinstance(item, str):
+                result[key] = ''
+            elif key == 'packing_endpoint' and isinstance(item, str):
+                result[key] = urlparse(item).path or '/'
+            else:
+                result[key] = anonymize(item, ids)
+        return result
+    if isinstance(value, list):
+        return [anonymize(item, ids) for item in value]
+    return value
+
+def restore_ids(value, originals):
+    """Ngược lại với anonymize cho các trường id; originals = {id thay thế: id gốc}"""
+    if isinstance(value, dict):
+        return {
+            key: originals.get(item, item) if key in ID_KEYS and not isinstance(item, (dict, list)) else restore_ids(item, originals)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [restore_ids(item, originals) for item in value]
+    return value
+
+def request_key(anonymized_request):
+    """Khóa so khớp của một solver request đã ẩn danh"""
+    canonical = json.dumps(anonymized_request, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+def request_shape(solver_request):
+    """Khóa so khớp gần đúng khi request không trùng hẳn (số loại item, tổng quantity, bin)"""
+    items = solver_request.get('items', [])
+    bin_size = solver_request.get('bin_size', {})
+    return [
+        len(items),
+        sum(int(item.get('quantity', 1)) for item in items),
+        [bin_size.get('L'), bin_size.get('W'), bin_size.get('H')]
+    ]
+
+def endpoint_id(endpoint):
+    return hashlib.sha1(urlparse(endpoint or '').netloc.encode()).hexdigest()[:12]
+
+def summarize_response(status_code, payload):
+    """Tóm tắt response của route để replay driver so sánh kết quả"""
+    summary = {'status_code': status_code}
+    if not isinstance(payload, dict):
+        return summary
+    summary['success'] = payload.get('success')
+    if 'utilization' in payload:
+        summary['utilization'] = payload['utilization']
+    for key in ('packed_items', 'leftover_items', 'algorithm_steps'):
+        if isinstance(payload.get(key), list):
+            summary[key] = len(payload[key])
+    if not payload.get('success') and 'message' in payload:
+        summary['message'] = payload['message']
+    return summary
+
+
+class TrafficRecording:
+    """Một request được ghi lại: body, các lời gọi solver và kết quả"""
+
+    def __init__(self, route, data, start_time):
+        self.start_time = start_time
+        self.record = {
+            'route': route,
+            'recorded_at': start_time,
+            'endpoint_id': endpoint_id((data or {}).get('packing_endpoint')),
+            'request': anonymize(data, {}),
+            'calls': [],
+            'solver_time': 0.0
+        }
+        # Text gốc của solver, để xóa khỏi message của route khi finish
+        self.texts = set()
+
+    def add_calls(self, solver_requests, responses, round_time):
+        """Ghi các lời gọi solver của một vòng (cùng thứ tự với responses, round_time = thời gian cả vòng)"""
+        self.record['solver_time'] += round_time
+        for solver_request, response in zip(solver_requests, responses):
+            ids = {}
+            anonymized = anonymize(solver_request, ids)
+            # Body JSON đã đủ cho replay; text chỉ cần khi body không phải JSON
+            text = None
+            if response.body is None and response.text:
+                self.texts.add(response.text)
+                text = REDACTED_TEXT
+            self.record['calls'].append({
+                'key': request_key(anonymized),
+                'shape': request_shape(solver_request),
+                'request': anonymized,
+                'status_code': response.status_code,
+                'latency': response.elapsed,
+                'content_type': response.content_type,
+                'response': anonymize(response.body, ids) if response.body is not None else None,
+                'text': text
+            })
+
+    def finish(self, status_code, payload):
+        self.record['duration'] = time.time() - self.start_time
+        summary = summarize_response(status_code, payload)
+        if isinstance(summary.get('message'), str):
+            for text in self.texts:
+                summary['message'] = summary['message'].replace(text, REDACTED_TEXT)
+        self.record['response'] = summary
+        get_writer().submit(write_record, RECORD_DIR, self.record)
+
+
+def start_recording(route, data, start_time):
+    """TrafficRecording cho request hiện tại, hoặc None nếu recording tắt / không được chọn mẫu"""
+    if RECORD_DIR is None or (RECORD_RATE < 1 and random.random() >= RECORD_RATE):
+        return None
+    try:
+        return TrafficRecording(route, data, start_time)
+    except Exception as e:
+        logging.error(f"Traffic recording error: {str(e)}")
+        return None
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        _writer = ThreadPoolExecutor(max_workers=1)
+    return _writer
+
+def write_record(record_dir, record):
+    try:
+        recorded_at = datetime.fromtimestamp(record['recorded_at'])
+        day_dir = os.path.join(record_dir, recorded_at.strftime('%Y-%m-%d'))
+        os.makedirs(day_dir, exist_ok=True)
+        path = os.path.join(day_dir, f"{recorded_at.strftime('%H%M%S')}-{uuid.uuid4().hex[:8]}.json.gz")
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump(record, f, separators=(',', ':'))
+    except Exception as e:
+        logging.error(f"Traffic recording write error: {str(e)}")
+
+def load_day(record_dir, day):
+    """Các record của một ngày (YYYY-MM-DD), theo thứ tự thời gian"""
+    day_dir = os.path.join(record_dir, day)
+    records = []
+    for name in sorted(os.listdir(day_dir)):
+        if name.endswith('.json.gz'):
+            with gzip.open(os.path.join(day_dir, name), 'rt', encoding='utf-8') as f:
+                records.append(json.load(f))
+    records.sort(key=lambda record: record['recorded_at'])
+    return records
@@ -0,0 +1,260 @@
+"""
+Replay harness cho traffic đã ghi bằng recording mode (recording.py).
+
+Replay server - đóng vai external packing endpoint, trả lại response đã ghi với
+đúng latency gốc của từng lời gọi:
+    python replay.py serve --dir recordings --day 2026-10-19 --port 3002
+
+Replay driver - chạy lại traffic của một ngày qua Flask app (in-process, hoặc app
+đang chạy qua --app-url) với replay server nhúng sẵn, rồi báo cáo thời gian xử lý
+phía app (tổng thời gian trừ thời gian chờ solver) so với lúc ghi và các request có
+kết quả khác đi:
+    python replay.py run --dir recordings --day 2026-10-19 --speed 0 --concurrency 4
+
+Solver request được so khớp theo nội dung đã ẩn danh; nếu thay đổi trong app làm
+request khác đi, replay server dùng lời gọi đã ghi có cùng số loại item, tổng
+quantity và kích thước bin.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from flask import Flask, Response, jsonify, request
+
+from recording import anonymize, load_day, request_key, request_shape, restore_ids, summarize_response
+
+UTILIZATION_TOLERANCE = 1e-6
+
+
+class SolverReplay:
+    """Các lời gọi solver đã ghi, tra theo request"""
+
+    def __init__(self, records, latency_scale=1.0):
+        self.latency_scale = latency_scale
+        self.by_key = defaultdict(list)
+        self.by_shape = defaultdict(list)
+        for record in records:
+            for call in record['calls']:
+                self.by_key[call['key']].append(call)
+                self.by_shape[json.dumps(call['shape'])].append(call)
+        # Cùng một request được ghi nhiều lần -> phát lại lần lượt
+        self.cursor = Counter()
+        self.matches = Counter()
+        self.lock = threading.Lock()
+
+    def _next(self, index, key):
+        calls = index.get(key)
+        if not calls:
+            return None
+        with self.lock:
+            call = calls[self.cursor[key] % len(calls)]
+            self.cursor[key] += 1
+        return call
+
+    def lookup(self, solver_request):
+        """(call đã ghi, bảng id của request) - call là None nếu không có lời gọi nào khớp"""
+        ids = {}
+        key = request_key(anonymize(solver_request, ids))
+        call = self._next(self.by_key, key)
+        match = 'exact'
+        if call is None:
+            call = self._next(self.by_shape, json.dumps(request_shape(solver_request)))
+            match = 'shape' if call is not None else 'missing'
+        with self.lock:
+            self.matches[match] += 1
+        return call, ids
+
+    def respond(self, solver_request):
+        """(status_code, body, text, content_type) của lời gọi đã ghi, sau khi chờ đúng latency"""
+        call, ids = self.lookup(solver_request)
+        if call is None:
+            return 404, {'success': False, 'message': 'No recorded solver call matches this request'}, None, 'application/json'
+        time.sleep((call['latency'] or 0) * self.latency_scale)
+        originals = {pseudonym: original for original, pseudonym in ids.items()}
+        body = restore_ids(call['response'], originals) if call['response'] is not None else None
+        return call['status_code'], body, call['text'], call['content_type']
+
+
+def create_replay_app(replay):
+    """Flask app đóng vai external packing endpoint: POST mọi path -> response đã ghi, GET -> health"""
+    app = Flask(__name__)
+
+    @app.route('/', defaults={'path': ''}, methods=['GET', 'POST'])
+    @app.route('/<path:path>', methods=['GET', 'POST'])
+    def solve(path):
+        if request.method == 'GET':
+            return jsonify({'status': 'ok', 'mode': 'replay', 'matches': dict(replay.matches)})
+        status_code, body, text, content_type = replay.respond(request.get_json(silent=True) or {})
+        if body is not None:
+            return Response(json.dumps(body), status=status_code, content_type='application/json')
+        return Response(text or '', status=status_code, content_type=content_type or 'text/plain')
+
+    return app
+
+def start_replay_server(replay, host='127.0.0.1', port=0):
+    """Chạy replay server trong background thread, trả về (server, base URL)"""
+    from werkzeug.serving import make_server
+    server = make_server(host, port, create_replay_app(replay), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_port}'
+
+
+def in_process_poster():
+    """POST tới Flask app trong cùng process (không ghi run store / traffic recording)"""
+    os.environ['RUN_STORE_ENABLED'] = '0'
+    import recording
+    recording.RECORD_DIR = None
+    from app import app
+    app.config['RUN_STORE_ENABLED'] = False
+
+    def post(route, data):
+        response = app.test_client().post(route, json=data)
+        return response.status_code, response.get_json(silent=True)
+    return post
+
+def http_poster(app_url):
+    import requests
+    session = requests.Session()
+
+    def post(route, data):
+        response = session.post(app_url.rstrip('/') + route, json=data)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+    return post
+
+def result_changed(recorded, replayed):
+    for key in ('status_code', 'success', 'packed_items', 'leftover_items', 'algorithm_steps'):
+        if recorded.get(key) != replayed.get(key):
+            return True
+    return abs((recorded.get('utilization') or 0) - (replayed.get('utilization') or 0)) > UTILIZATION_TOLERANCE
+
+def replay_record(post, record, solver_url):
+    data = dict(record['request'] or {})
+    data['packing_endpoint'] = solver_url + (data.get('packing_endpoint') or '/pack')
+
+    started = time.perf_counter()
+    status_code, payload = post(record['route'], data)
+    duration = time.perf_counter() - started
+
+    summary = summarize_response(status_code, payload)
+    return {
+        'route': record['route'],
+        'recorded_at': record['recorded_at'],
+        'items': len(data.get('items', [])),
+        'solver_calls': len(record['calls']),
+        'recorded_duration': record['duration'],
+        'duration': duration,
+        # Thời gian xử lý phía app: latency solver được replay server tái tạo nên trừ đi giống nhau
+        'recorded_overhead': record['duration'] - record['solver_time'],
+        'overhead': duration - record['solver_time'],
+        'recorded_response': record['response'],
+        'response': summary,
+        'changed': result_changed(record['response'], summary)
+    }
+
+def percentiles(values):
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': float(max(values)), 'total': float(sum(values))}
+
+def replay_report(rows, replay):
+    routes = {}
+    for route in sorted({row['route'] for row in rows}):
+        route_rows = [row for row in rows if row['route'] == route]
+        routes[route] = {
+            'requests': len(route_rows),
+            'recorded_duration': percentiles([row['recorded_duration'] for row in route_rows]),
+            'duration': percentiles([row['duration'] for row in route_rows]),
+            'recorded_overhead': percentiles([row['recorded_overhead'] for row in route_rows]),
+            'overhead': percentiles([row['overhead'] for row in route_rows])
+        }
+    return {
+        'requests': len(rows),
+        'routes': routes,
+        'solver_matches': dict(replay.matches),
+        'changed_results': [
+            {key: row[key] for key in ('route', 'recorded_at', 'recorded_response', 'response')}
+            for row in rows if row['changed']
+        ]
+    }
+
+def run_replay(records, post, solver_url, speed=0.0, concurrency=1):
+    """
+    Chạy lại các record qua app.
+
+    Parameters:
+    - speed: 0 = gửi liên tục; 1 = giữ khoảng cách thời gian gốc giữa các request; 2 = nhanh gấp đôi
+    - concurrency: số request chạy song song
+    """
+    if not records:
+        return []
+    first = records[0]['recorded_at']
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        futures = []
+        for record in records:
+            if speed > 0:
+                delay = (record['recorded_at'] - first) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(executor.submit(replay_record, post, record, solver_url))
+        return [future.result() for future in futures]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded solver traffic')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='Serve recorded solver responses with their original latency')
+    run = commands.add_parser('run', help='Re-run a recorded day of traffic against the app')
+    for command in (serve, run):
+        command.add_argument('--dir', default=os.environ.get('SOLVER_RECORD_DIR', 'recordings'))
+        command.add_argument('--day', required=True, help='YYYY-MM-DD')
+        command.add_argument('--latency-scale', type=float, default=1.0)
+    serve.add_argument('--host', default='0.0.0.0')
+    serve.add_argument('--port', type=int, default=3002)
+    run.add_argument('--app-url', help='Base URL of a running app (default: in-process Flask app)')
+    run.add_argument('--solver-url', help='Base URL of a running replay server (default: embedded)')
+    run.add_argument('--speed', type=float, default=0.0)
+    run.add_argument('--concurrency', type=int, default=1)
+    run.add_argument('--output', help='Write per-request rows as JSON lines')
+    args = parser.parse_args()
+
+    records = load_day(args.dir, args.day)
+    replay = SolverReplay(records, args.latency_scale)
+    logging.info(f"Loaded {len(records)} recorded requests from {args.day}")
+
+    if args.command == 'serve':
+        create_replay_app(replay).run(host=args.host, port=args.port, threaded=True)
+        return
+
+    server = None
+    solver_url = args.solver_url
+    if solver_url is None:
+        server, solver_url = start_replay_server(replay)
+    post = http_poster(args.app_url) if args.app_url else in_process_poster()
+    try:
+        rows = run_replay(records, post, solver_url.rstrip('/'), args.speed, args.concurrency)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+    print(json.dumps(replay_report(rows, replay), indent=2))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,174 +1,40 @@
-from flask import render_template, request, jsonify, flash, current_app
+from flask import render_template, request, jsonify, flash, current_app, g, Response, stream_with_context
 import json
 import logging
-import requests
-from urllib.parse import urlparse
-
-def f(x, bin_size):
-    """Exponential decay function for area scoring"""
-    return 4 * x * (2 ** (-(x/bin_size)))
-
-def area_score_by_l(px, py, pz, l, w, h, bin_l, bin_w, bin_h):
-    """Calculate area score based on length dimension"""
-    return (f(px + l, bin_l) - f(px, bin_l)) * w * h
-
-def area_score_by_w(px, py, pz, l, w, h, bin_l, bin_w, bin_h):
-    """Calculate area score based on width dimension"""
-    return (f(py + w, bin_w) - f(py, bin_w)) * l * h
-
-def same_h_score(item_id, all_items):
-    """Calculate score for items with same height"""
-    if len(all_items) <= 1:
-        return 0.0
-        
-    score = 0.0
-    item = all_items[item_id]
-    px, py, pz = item['x'], item['y'], item['z']
-    l, w, h = get_rotation_by_id(item['original_length'], item['original_width'], item['original_height'], item.get('rotation_id', 0), True)
-    
-    for i, other_item in enumerate(all_items):
-        if i == item_id:
-            continue
-        x, y, z = other_item['x'], other_item['y'], other_item['z']
-        this_l, this_w, this_h = get_rotation_by_id(other_item['original_length'], other_item['original_width'], other_item['original_height'], other_item.get('rotation_id', 0), True)
-        
-        # Check if items have same top height
-        if abs((this_h + z) - (pz + h)) < 0.001:  # Using small epsilon for float comparison
-            score += 1.0
-    
-    return score / (len(all_items) - 1)
-
-def calculate_algorithm_training_score(packed_items, bin_l, bin_w, bin_h, lock_axis=True):
-    """Calculate training score using complex algorithm formula"""
-    if not packed_items or bin_l <= 0 or bin_w <= 0 or bin_h <= 0:
-        return 0.0
-    
-    total_score = 0.0
-    
-    for i, item in enumerate(packed_items):
-        r_id = item.get('rotation_id', 0)
-        px, py, pz = item['x'], item['y'], item['z']
-        
-        # Get rotated dimensions
-        l, w, h = get_rotation_by_id(
-            item['original_length'], 
-            item['original_width'], 
-            item['original_height'], 
-            r_id, 
-            lock_axis
-        )
-        
-        # Calculate area scores
-        area_score_l = area_score_by_l(px, py, pz, l, w, h, bin_l, bin_w, bin_h)
-        area_score_w = area_score_by_w(px, py, pz, l, w, h, bin_l, bin_w, bin_h)
-        area_score = (area_score_l + area_score_w) / 2.0  # Mean of area scores
-        
-        # Calculate same height score
-        same_height_score = same_h_score(i, packed_items)
-        
-        # Add to total score
-        total_score += area_score + same_height_score
-    
-    # Normalize by bin volume
-    return total_score / (bin_l * bin_w * bin_h)
-
-def get_rotation_by_id(l0, w0, h0, rotation_id, lock_axis):
-    """
-    Trả về (l, w, h) đã xoay tương ứng với rotation_id.
-
-    Parameters:
-    - l0, w0, h0: Kích thước gốc
-    - rotation_id: ID phép xoay
-    - lock_axis: True nếu chỉ xoay đáy (l, w), False nếu xoay cả 3 trục
-
-    Returns:
-    - (l, w, h): kích thước sau khi xoay
-    """
-    if lock_axis:
-        if rotation_id == 0:
-            return l0, w0, h0
-        elif rotation_id == 1:
-            return w0, l0, h0
-        else:
-            return -1, -1, -1  # rotation_id không hợp lệ trong lock_axis
-    else:
-        if rotation_id == 0:
-            return w0, l0, h0
-        elif rotation_id == 1:
-            return w0, h0, l0
-        elif rotation_id == 2:
-            return l0, w0, h0
-        elif rotation_id == 3:
-            return l0, h0, w0
-        elif rotation_id == 4:
-            return h0, w0, l0
-        elif rotation_id == 5:
-            return h0, l0, w0
-        else:
-            return -1, -1, -1  # rotation_id vượt quá 5
+import time
+
+from packing import (
+    PackingError, build_step_request, log_packing_request, shape_step_result, solver_error_message,
+    validate_endpoint_url, shape_health_status
+)
+from pipeline import PackPlan, plan_pack, solver_results, finish_pack
+from solver_client import call_solver, call_solver_many, SolverUnavailable, SolverTimeout
+from health_monitor import get_monitor, cached_health, record_call, route_endpoint
+from admission import AdmissionRejected, admitted, admission_metrics, client_key
+from recording import start_recording
+from profiling import profiled, list_profiles, read_profile, token_ok
+from run_store import (
+    save_run, list_runs, get_run, latest_run_for_manifest, run_result, run_manifest, attach_incremental_base
+)
+from export import EXPORT_FORMATS, group_by_dimensions, export_run_results, export_run_items
+from lod import lod_view
+from step_codec import decode_step, is_encoded
 
 def index():
     """Main page with 3D visualization interface"""
     return render_template('index.html')
 
 def check_packing_endpoint():
-    """Kiểm tra endpoint thuật toán packing có hoạt động không"""
+    """Kiểm tra endpoint thuật toán packing có hoạt động không (trạng thái từ health monitor)"""
     try:
         data = request.get_json()
-        endpoint_url = data.get('endpoint_url', '')
+        endpoint_url = validate_endpoint_url(data)
 
-        if not endpoint_url:
-            return jsonify({
-                'success': False, 
-                'message': 'Vui lòng nhập endpoint URL'
-            }), 400
-
-        # Validate URL format
-        try:
-            parsed = urlparse(endpoint_url)
-            if not all([parsed.scheme, parsed.netloc]):
-                return jsonify({
-                    'success': False,
-                    'message': 'URL không hợp lệ. Vui lòng nhập URL đầy đủ (ví dụ: http://localhost:3001/pack)'
-                }), 400
-        except Exception:
-            return jsonify({
-                'success': False,
-                'message': 'URL không hợp lệ'
-            }), 400
-
-        # Kiểm tra endpoint có phản hồi không
-        try:
-            # Thử gọi với timeout ngắn
-            response = requests.get(endpoint_url.replace('/pack', '/health'), timeout=5)
-            if response.status_code == 200:
-                return jsonify({
-                    'success': True,
-                    'message': 'Endpoint hoạt động bình thường',
-                    'endpoint_info': response.json() if response.headers.get('content-type', '').startswith('application/json') else None
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'message': f'Endpoint trả về status code: {response.status_code}'
-                }), 400
-
-        except requests.exceptions.ConnectionError:
-            return jsonify({
-                'success': False,
-                'message': 'Không thể kết nối tới endpoint. Kiểm tra URL và server có đang chạy không.'
-            }), 400
-        except requests.exceptions.Timeout:
-            return jsonify({
-                'success': False,
-                'message': 'Timeout khi kết nối tới endpoint'
-            }), 400
-        except Exception as e:
-            return jsonify({
-                'success': False,
-                'message': f'Lỗi khi kiểm tra endpoint: {str(e)}'
-            }), 400
+        payload, status_code = shape_health_status(cached_health(endpoint_url))
+        return jsonify(payload), status_code
 
+    except PackingError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status_code
     except Exception as e:
         logging.error(f"Check endpoint error: {str(e)}")
         return jsonify({
@@ -176,298 +42,99 @@ def check_packing_endpoint():
             'message': f'Lỗi server: {str(e)}'
         }), 500
 
+def admission_rejected(error):
+    """Response 429 khi admission control từ chối request"""
+    return jsonify({
+        'success': False,
+        'message': error.message,
+        'retry_after': error.retry_after
+    }), 429, {'Retry-After': str(error.retry_after)}
+
+def admission_status():
+    """Metrics của admission control: slot đang dùng, hàng đợi, queue time theo client"""
+    return jsonify({'success': True, **admission_metrics()})
+
+def health_check():
+    """Health của app cùng trạng thái đã cache của các solver endpoint"""
+    # Chỉ các solver của deployment; endpoint do client nhập chỉ được đếm
+    monitor = get_monitor()
+    solvers = monitor.snapshot(configured_only=True)
+    return jsonify({
+        'status': 'degraded' if any(solver['down'] for solver in solvers) else 'ok',
+        'solvers': solvers,
+        'other_endpoints': len(monitor.snapshot()) - len(solvers)
+    })
+
 
 def pack_items():
     """API endpoint for packing items - sử dụng external endpoint"""
     try:
-        import time
         start_time = time.time()
         logging.info("Starting packing request...")
 
         data = request.get_json()
 
-        if not data:
-            return jsonify({'success': False, 'message': 'No data provided'}), 400
-
-        # Lấy endpoint URL từ request
-        packing_endpoint = data.get('packing_endpoint', '')
-        if not packing_endpoint:
-            return jsonify({
-                'success': False, 
-                'message': 'Vui lòng cung cấp packing_endpoint URL'
-            }), 400
-
-        # Get bin size
-        bin_size = data.get('bin_size', {})
-        bin_length = int(bin_size.get('length', 10))
-        bin_width = int(bin_size.get('width', 10))
-        bin_height = int(bin_size.get('height', 10))
-
-        # Get items
-        items = data.get('items', [])
-
-        logging.info(f"Received {len(items)} items to pack in bin {bin_length}x{bin_width}x{bin_height}")
-        logging.info(f"Using external endpoint: {packing_endpoint}")
-
-        if not items:
-            return jsonify({'success': False, 'message': 'No items to pack'}), 400
-
         # Chuẩn bị data để gửi tới external endpoint
         # Chuyển đổi format từ webapp sang format của packing API
+        attach_incremental_base(data)
+        recording = g.recording = start_recording('/pack', data, start_time)
+        plan = plan_pack(data)
 
-        # Tạo default parameters dựa trên số items
-        num_unique_items = len(set(item.get('id', 0) for item in items))
-
-        # Default stack rule - tất cả items có thể stack trên nhau
-        default_stack_rule = []
-        for i in range(num_unique_items):
-            row = [3] * num_unique_items  # 3 = unlimited stacking
-            default_stack_rule.append(row)
-
-        # Default lifo order - không có ràng buộc LIFO
-        default_lifo_order = [0] * num_unique_items
-
-        # Extract parameters from input data
-        input_parameters = data.get('parameters', {})
-
-        # Handle weights parameter - pass through original format to let algorithm decide
-        weights_param = input_parameters.get('weights')
-        if weights_param is not None:
-            # Pass weights in original format (object or array)
-            weights_value = weights_param
-            logging.info(f"Passing weights in original format: {type(weights_param).__name__} with {len(weights_param) if hasattr(weights_param, '__len__') else 'N/A'} items")
-        else:
-            # Default weights object for new format
-            weights_value = {
-                "W_lifo": 10.0,
-                "W_sim_l": -1.0,
-                "W_sim_w": -1.0,
-                "W_sim_h": 0.0,
-                "W_leftover_l_ratio": -5.0,
-                "W_leftover_w_ratio": -5.0,
-                "W_packable_l": -0.5,
-                "W_packable_w": -0.5
-            }
-            logging.info(f"Using default weights object: {weights_value}")
-
-        packing_request = {
-            "items": [],
-            "bin_size": {
-                "L": bin_length,
-                "W": bin_width, 
-                "H": bin_height
-            },
-            "parameters": {
-                "stack_rule": input_parameters.get('stack_rule', default_stack_rule),
-                "lifo_order": input_parameters.get('lifo_order', default_lifo_order),
-                "weights": weights_value
-            }
-        }
-
-        # Chuyển đổi items sang format API
-        for item in items:
-            # Kiểm tra format - ưu tiên format cũ (length/width/height) vì đó là format từ webapp
-            if 'length' in item and 'width' in item and 'height' in item:
-                # Format từ webapp với length/width/height
-                packing_request["items"].append({
-                    "id": item.get('id', 0),
-                    "request_id": item.get('request_id', item.get('id', 0)),
-                    "L": float(item['length']),
-                    "W": float(item['width']),
-                    "H": float(item['height']),
-                    "num_axis": item.get('number_axis', item.get('num_axis', 2)),
-                    "quantity": 1  # Mỗi item đã được expand sẵn
-                })
-            elif 'L' in item and 'W' in item and 'H' in item:
-                # Format JSON upload với L/W/H
-                packing_request["items"].append({
-                    "id": item.get('id', 0),
-                    "request_id": item.get('request_id', item.get('id', 0)),
-                    "L": float(item['L']),
-                    "W": float(item['W']),
-                    "H": float(item['H']),
-                    "num_axis": item.get('num_axis', 2),
-                    "quantity": item.get('quantity', 1)
-                })
-            else:
-                logging.error(f"Invalid item format: {item}")
-                continue
-
-        # Validate dữ liệu trước khi gửi
-        if not packing_request["items"]:
-            return jsonify({
-                'success': False, 
-                'message': 'Không có items hợp lệ để pack'
-            }), 400
-
-        # Ensure stack_rule is properly sized
-        actual_num_items = len(packing_request["items"])
-        if len(packing_request["parameters"]["stack_rule"]) != actual_num_items:
-            # Recreate stack_rule with correct size
-            packing_request["parameters"]["stack_rule"] = [[3] * actual_num_items for _ in range(actual_num_items)]
-
-        if len(packing_request["parameters"]["lifo_order"]) != actual_num_items:
-            # Recreate lifo_order with correct size  
-            packing_request["parameters"]["lifo_order"] = [0] * actual_num_items
-
-        logging.info(f"Final item count: {len(packing_request['items'])}")
-        logging.info(f"Stack rule size: {len(packing_request['parameters']['stack_rule'])}x{len(packing_request['parameters']['stack_rule'][0]) if packing_request['parameters']['stack_rule'] else 0}")
-        logging.info(f"LIFO order size: {len(packing_request['parameters']['lifo_order'])}")
-
-        # Gọi external packing endpoint
+        # Gọi external packing endpoint - các request trong cùng một plan chạy song song,
+        # finish có thể trả về plan tiếp theo (ví dụ: spill-over sang container khác)
         try:
-            logging.info("Calling external packing endpoint...")
-            logging.info(f"Request data: {json.dumps(packing_request, indent=2)}")
-
-            response = requests.post(
-                packing_endpoint,
-                json=packing_request,
-                headers={'Content-Type': 'application/json'}
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                end_time = time.time()
-
-                # Chuyển đổi kết quả về format webapp
-                packed_items = []
-                leftover_items = []
-
-                # Xử lý packed items - đọc theo thứ tự trong output để có pack_order
-                pack_order = 1  # Thứ tự pack bắt đầu từ 1
-                if 'packed_items' in result:
-                    for item_group in result['packed_items']:
-                        positions = item_group.get('positions', [])
-                        # rotation_id giờ là một số duy nhất, không phải array
-                        rotation_id = item_group.get('rotation_id', 0)
-
-                        # Mỗi position tương ứng với 1 item đã pack
-                        for i, pos in enumerate(positions):
-                            # Tính kích thước thực tế sau khi xoay
-                            l0, w0, h0 = item_group['L'], item_group['W'], item_group['H']
-                            num_axis = item_group.get('num_axis', 2)
-                            lock_axis = (num_axis == 2)
-
-                            # Áp dụng rotation
-                            actual_l, actual_w, actual_h = get_rotation_by_id(l0, w0, h0, rotation_id, lock_axis)
-
-                            packed_items.append({
-                                'id': item_group['id'],
-                                'request_id': item_group.get('request_id', item_group['id']),
-                                'length': actual_l,  # Kích thước sau khi xoay
-                                'width': actual_w,   # Kích thước sau khi xoay
-                                'height': actual_h,  # Kích thước sau khi xoay
-                                'original_length': l0,  # Kích thước gốc
-                                'original_width': w0,   # Kích thước gốc
-                                'original_height': h0,  # Kích thước gốc
-                                'rotation_id': rotation_id,
-                                'x': pos['x'],
-                                'y': pos['y'],
-                                'z': pos['z'],
-                                'pack_order': pack_order,  # Thứ tự pack theo output
-                                'position_index': i + 1,  # Vị trí thứ i của item này
-                                'total_positions': len(positions),  # Tổng số vị trí của item này
-                                'item_type_id': item_group['id']  # ID loại item
-                            })
-                            pack_order += 1
-
-                # Xử lý leftover items
-                if 'leftover_items' in result:
-                    for item_group in result['leftover_items']:
-                        for _ in range(item_group.get('quantity', 1)):
-                            leftover_items.append({
-                                'id': item_group['id'],
-                                'request_id': item_group.get('request_id', item_group['id']),
-                                'length': item_group['L'],
-                                'width': item_group['W'],
-                                'height': item_group['H']
-                            })
-
-                # Tính utilization dựa trên volume, không phải số lượng items
-                bin_volume = bin_length * bin_width * bin_height
-
-                # Tính tổng volume của items đã pack (sử dụng kích thước thực tế sau khi xoay)
-                packed_volume = 0
-                for item in packed_items:
-                    packed_volume += item['length'] * item['width'] * item['height']
-
-                # Utilization = volume used / total bin volume
-                utilization = packed_volume / bin_volume if bin_volume > 0 else 0
-
-                # Tính training score theo công thức algorithm phức tạp
-                training_score = 0.0
-                if packed_items:
-                    training_score = calculate_algorithm_training_score(packed_items, bin_length, bin_width, bin_height)
-
-                # Tạo packing steps từ packed_items theo thứ tự pack_order
-                packing_steps = []
-                for item in sorted(packed_items, key=lambda x: x['pack_order']):
-                    rotation_info = f" (Rotation: {item['rotation_id']})" if 'rotation_id' in item else ""
-                    size_info = f"{item['length']}×{item['width']}×{item['height']}"
-                    orig_size_info = ""
-                    if 'original_length' in item:
-                        orig_size_info = f" [Original: {item['original_length']}×{item['original_width']}×{item['original_height']}]"
-
-                    packing_steps.append({
-                        'item_id': item['id'],
-                        'position': {
-                            'x': item['x'],
-                            'y': item['y'], 
-                            'z': item['z']
-                        },
-                        'dimensions': {
-                            'length': item['length'],
-                            'width': item['width'],
-                            'height': item['height']
-                        },
-                        'original_dimensions': {
-                            'length': item.get('original_length', item['length']),
-                            'width': item.get('original_width', item['width']),
-                            'height': item.get('original_height', item['height'])
-                        },
-                        'rotation_id': item.get('rotation_id', 0),
-                        'step': item['pack_order'],
-                        'description': f"Packed item {item['id']} (#{item['pack_order']}) at ({item['x']}, {item['y']}, {item['z']}) - Size: {size_info}{orig_size_info}{rotation_info}"
-                    })
-
-                logging.info(f"Packing completed in {end_time - start_time:.2f} seconds")
-                logging.info(f"Packed: {len(packed_items)}, Leftover: {len(leftover_items)}, Utilization: {utilization:.2%}")
-
-                return jsonify({
-                    'success': True,
-                    'packed_items': packed_items,
-                    'leftover_items': leftover_items,
-                    'bin_size': {
-                        'length': bin_length,
-                        'width': bin_width,
-                        'height': bin_height
-                    },
-                    'utilization': utilization,
-                    'training_score': training_score,
-                    'packing_time': end_time - start_time,
-                    'external_result': result.get('metadata', {}),
-                    'packing_steps': packing_steps  # Thêm packing steps cho step-by-step visualization
-                })
-
-            else:
-                error_msg = f"External endpoint returned status {response.status_code}"
-                try:
-                    error_detail = response.json()
-                    error_msg += f": {error_detail.get('message', error_detail.get('error', 'Unknown error'))}"
-                except:
-                    error_msg += f": {response.text}"
-
-                logging.error(f"External endpoint error: {error_msg}")
-                return jsonify({
-                    'success': False,
-                    'message': error_msg
-                }), 400
-
-        except requests.exceptions.ConnectionError:
+            root_plan = plan
+            solver_time = 0.0
+            # Admission control: chờ slot solver theo client và kích thước manifest
+            queue_time = None
+            client = client_key(request.headers, request.remote_addr)
+            while True:
+                logging.info(f"Calling external packing endpoint ({len(plan.calls)} requests)...")
+                for packing_request in plan.calls:
+                    log_packing_request(packing_request)
+
+                # Admission control: mỗi vòng gọi solver chờ slot theo client và kích thước của vòng đó
+                with admitted(client, plan.calls, request.environ.get('wsgi.multithread', False)) as ticket:
+                    solver_start = time.time()
+                    endpoint = route_endpoint(plan.endpoint)
+                    try:
+                        responses = call_solver_many(endpoint, plan.calls)
+                    except (SolverUnavailable, SolverTimeout) as e:
+                        record_call(endpoint, error=e)
+                        raise
+                    record_call(endpoint, responses)
+                    solver_time += time.time() - solver_start
+                if ticket is not None:
+                    queue_time = (queue_time or 0.0) + ticket.queue_time
+                if recording is not None:
+                    recording.add_calls(plan.calls, responses, time.time() - solver_start)
+
+                results = solver_results(responses)
+                outcome = finish_pack(plan, results, time.time() - start_time)
+                if not isinstance(outcome, PackPlan):
+                    break
+                plan = outcome
+
+            payload = outcome
+            if queue_time is not None:
+                payload['queue_time'] = queue_time
+            payload['run_id'] = save_run(root_plan.endpoint, root_plan.manifest, payload, solver_time, root_plan.mode)
+            return jsonify(payload)
+
+        except PackingError:
+            raise
+        except AdmissionRejected as e:
+            return admission_rejected(e)
+        except SolverUnavailable:
             return jsonify({
                 'success': False,
                 'message': 'Không thể kết nối tới packing endpoint. Kiểm tra URL và server có đang chạy không.'
             }), 400
+        except SolverTimeout:
+            return jsonify({
+                'success': False,
+                'message': 'Packing endpoint không phản hồi trong thời gian cho phép (timeout)'
+            }), 504
         except Exception as e:
             logging.error(f"External endpoint call error: {str(e)}")
             return jsonify({
@@ -475,6 +142,8 @@ def pack_items():
                 'message': f'Lỗi khi gọi external endpoint: {str(e)}'
             }), 500
 
+    except PackingError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status_code
     except Exception as e:
         logging.error(f"Packing error: {str(e)}")
         return jsonify({
@@ -485,185 +154,53 @@ def pack_items():
 def pack_items_step_by_step():
     """API endpoint for step-by-step packing - trả về từng step một"""
     try:
-        import time
         start_time = time.time()
         logging.info("Starting step-by-step packing request...")
 
         data = request.get_json()
 
-        if not data:
-            return jsonify({'success': False, 'message': 'No data provided'}), 400
-
-        # Lấy endpoint URL từ request
-        packing_endpoint = data.get('packing_endpoint', '')
-        if not packing_endpoint:
-            return jsonify({
-                'success': False, 
-                'message': 'Vui lòng cung cấp packing_endpoint URL'
-            }), 400
-
-        # Get bin size
-        bin_size = data.get('bin_size', {})
-        bin_length = int(bin_size.get('length', 10))
-        bin_width = int(bin_size.get('width', 10))
-        bin_height = int(bin_size.get('height', 10))
-
-        # Get items
-        items = data.get('items', [])
-
-        logging.info(f"Received {len(items)} items for step-by-step packing")
-
-        if not items:
-            return jsonify({'success': False, 'message': 'No items to pack'}), 400
-
-        # Chuẩn bị data để gửi tới external endpoint
-        packing_request = {
-            "items": [],
-            "bin_size": {
-                "L": bin_length,
-                "W": bin_width, 
-                "H": bin_height
-            },
-            "parameters": {
-                "return_steps": True,  # Yêu cầu trả về steps
-                "step_by_step": True   # Chỉ định step-by-step mode
-            }
-        }
-
-        # Chuyển đổi items sang format API
-        for item in items:
-            if 'length' in item and 'width' in item and 'height' in item:
-                packing_request["items"].append({
-                    "id": item.get('id', 0),
-                    "request_id": item.get('request_id', item.get('id', 0)),
-                    "L": float(item['length']),
-                    "W": float(item['width']),
-                    "H": float(item['height']),
-                    "num_axis": item.get('number_axis', item.get('num_axis', 2)),
-                    "quantity": 1
-                })
-            elif 'L' in item and 'W' in item and 'H' in item:
-                packing_request["items"].append({
-                    "id": item.get('id', 0),
-                    "request_id": item.get('request_id', item.get('id', 0)),
-                    "L": float(item['L']),
-                    "W": float(item['W']),
-                    "H": float(item['H']),
-                    "num_axis": item.get('num_axis', 2),
-                    "quantity": item.get('quantity', 1)
-                })
+        packing_endpoint, packing_request, bin_dims = build_step_request(data)
+        packing_endpoint = route_endpoint(packing_endpoint)
+        recording = g.recording = start_recording('/pack_step_by_step', data, start_time)
 
         # Gọi external packing endpoint với step-by-step mode
         try:
             logging.info("Calling external step-by-step packing endpoint...")
 
-            response = requests.post(
-                packing_endpoint,
-                json=packing_request,
-                headers={'Content-Type': 'application/json'}
-            )
+            with admitted(client_key(request.headers, request.remote_addr), [packing_request], request.environ.get('wsgi.multithread', False)):
+                try:
+                    response = call_solver(packing_endpoint, packing_request)
+                except (SolverUnavailable, SolverTimeout) as e:
+                    record_call(packing_endpoint, error=e)
+                    raise
+                record_call(packing_endpoint, [response])
+            if recording is not None:
+                recording.add_calls([packing_request], [response], response.elapsed)
 
             if response.status_code == 200:
-                result = response.json()
                 end_time = time.time()
-
-                # Xử lý kết quả step-by-step
-                algorithm_steps = result.get('algorithm_steps', [])
-                final_result = result.get('final_result', {})
-
-                # Chuyển đổi algorithm steps sang format webapp
-                webapp_steps = []
-                for i, step in enumerate(algorithm_steps):
-                    webapp_step = {
-                        'step_number': i + 1,
-                        'step_type': step.get('type', 'unknown'),
-                        'description': step.get('description', f'Algorithm step {i + 1}'),
-                        'data': step.get('data', {}),
-                        'timestamp': step.get('timestamp', time.time())
-                    }
-                    webapp_steps.append(webapp_step)
-
-                # Xử lý final result như bình thường
-                packed_items = []
-                leftover_items = []
-
-                if 'packed_items' in final_result:
-                    for item_group in final_result['packed_items']:
-                        positions = item_group.get('positions', [])
-                        rotation_id = item_group.get('rotation_id', 0)
-
-                        for i, pos in enumerate(positions):
-                            l0, w0, h0 = item_group['L'], item_group['W'], item_group['H']
-                            num_axis = item_group.get('num_axis', 2)
-                            lock_axis = (num_axis == 2)
-                            actual_l, actual_w, actual_h = get_rotation_by_id(l0, w0, h0, rotation_id, lock_axis)
-
-                            packed_items.append({
-                                'id': item_group['id'],
-                                'request_id': item_group.get('request_id', item_group['id']),
-                                'length': actual_l,
-                                'width': actual_w,
-                                'height': actual_h,
-                                'original_length': l0,
-                                'original_width': w0,
-                                'original_height': h0,
-                                'rotation_id': rotation_id,
-                                'x': pos['x'],
-                                'y': pos['y'],
-                                'z': pos['z'],
-                                'pack_order': i + 1
-                            })
-
-                if 'leftover_items' in final_result:
-                    for item_group in final_result['leftover_items']:
-                        for _ in range(item_group.get('quantity', 1)):
-                            leftover_items.append({
-                                'id': item_group['id'],
-                                'request_id': item_group.get('request_id', item_group['id']),
-                                'length': item_group['L'],
-                                'width': item_group['W'],
-                                'height': item_group['H']
-                            })
-
-                # Tính utilization
-                bin_volume = bin_length * bin_width * bin_height
-                packed_volume = sum(item['length'] * item['width'] * item['height'] for item in packed_items)
-                utilization = packed_volume / bin_volume if bin_volume > 0 else 0
-
-                return jsonify({
-                    'success': True,
-                    'algorithm_steps': webapp_steps,
-                    'packed_items': packed_items,
-                    'leftover_items': leftover_items,
-                    'bin_size': {
-                        'length': bin_length,
-                        'width': bin_width,
-                        'height': bin_height
-                    },
-                    'utilization': utilization,
-                    'packing_time': end_time - start_time,
-                    'total_steps': len(webapp_steps)
-                })
+                return jsonify(shape_step_result(response.body, bin_dims, end_time - start_time, data.get('step_encoding', 'delta')))
 
             else:
-                error_msg = f"External endpoint returned status {response.status_code}"
-                try:
-                    error_detail = response.json()
-                    error_msg += f": {error_detail.get('message', error_detail.get('error', 'Unknown error'))}"
-                except:
-                    error_msg += f": {response.text}"
-
+                error_msg = solver_error_message(response.status_code, response.body, response.text)
                 logging.error(f"External step-by-step endpoint error: {error_msg}")
                 return jsonify({
                     'success': False,
                     'message': error_msg
                 }), 400
 
-        except requests.exceptions.ConnectionError:
+        except AdmissionRejected as e:
+            return admission_rejected(e)
+        except SolverUnavailable:
             return jsonify({
                 'success': False,
                 'message': 'Không thể kết nối tới packing endpoint'
             }), 400
+        except SolverTimeout:
+            return jsonify({
+                'success': False,
+                'message': 'Packing endpoint không phản hồi trong thời gian cho phép (timeout)'
+            }), 504
         except Exception as e:
             logging.error(f"External step-by-step endpoint call error: {str(e)}")
             return jsonify({
@@ -671,6 +208,8 @@ def pack_items_step_by_step():
                 'message': f'Lỗi khi gọi external endpoint: {str(e)}'
             }), 500
 
+    except PackingError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status_code
     except Exception as e:
         logging.error(f"Step-by-step packing error: {str(e)}")
         return jsonify({
@@ -696,6 +235,9 @@ def get_specific_step():
             }), 400
 
         step = algorithm_steps[step_number]
+        # Steps dạng delta (step_encoding mặc định) được giải mã về data đầy đủ
+        if is_encoded(step):
+            step = decode_step(algorithm_steps, step_number)
 
         return jsonify({
             'success': True,
@@ -827,6 +369,10 @@ def visualize_items():
         if not data:
             return jsonify({'success': False, 'message': 'No data provided'}), 400
 
+        # Level-of-detail cho kết quả đã pack (chỉ khi được yêu cầu rõ bằng lod hoặc run_id)
+        if data.get('lod') is not None or data.get('run_id') is not None:
+            return jsonify(lod_view(data))
+
         # Get bin size
         bin_size = data.get('bin_size', {})
         bin_length = int(bin_size.get('length', 10))
@@ -881,6 +427,8 @@ def visualize_items():
             'item_count': len(visualization_items)
         })
 
+    except PackingError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status_code
     except Exception as e:
         logging.error(f"Visualization error: {str(e)}")
         return jsonify({
@@ -910,20 +458,17 @@ def export_items():
         }
 
         # Group items by dimensions to combine quantity
-        item_groups = {}
-        for item in items:
-            key = f"{item['length']}x{item['width']}x{item['height']}"
-            if key not in item_groups:
-                item_groups[key] = {
-                    'id': item['id'],
-                    'L': item['length'],
-                    'W': item['width'],
-                    'H': item['height'],
-                    'quantity': 0
-                }
-            item_groups[key]['quantity'] += 1
-
-        export_data['items'] = list(item_groups.values())
+        first, totals = group_by_dimensions([(item['length'], item['width'], item['height']) for item in items])
+        export_data['items'] = [
+            {
+                'id': items[index]['id'],
+                'L': items[index]['length'],
+                'W': items[index]['width'],
+                'H': items[index]['height'],
+                'quantity': int(total)
+            }
+            for index, total in zip(first.tolist(), totals.tolist())
+        ]
 
         return jsonify({
             'success': True,
@@ -945,6 +490,13 @@ def export_results():
         if not data:
             return jsonify({'success': False, 'message': 'No data provided'}), 400
 
+        # Kết quả đã lưu trên server - client chỉ cần gửi run_id
+        if data.get('run_id') is not None:
+            run = get_run(int(data['run_id']))
+            if run is None:
+                return jsonify({'success': False, 'message': f"Run {data['run_id']} not found"}), 404
+            data = run_result(run)
+
         # Format results for export - structure compatible with visualization only
         export_data = {
             'bin_size': {
@@ -980,6 +532,122 @@ def export_results():
             'message': f'Export results error: {str(e)}'
         }), 500
 
+def export_stream(run, part, fmt):
+    """Response stream (download) cho kết quả hoặc manifest của run"""
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': f"Unsupported export format: {fmt}"}), 400
+    if part == 'results':
+        chunks, filename = export_run_results(run, fmt)
+    elif part == 'items':
+        chunks, filename = export_run_items(run, fmt)
+    else:
+        return jsonify({'success': False, 'message': f"Unsupported export part: {part}"}), 400
+    return Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt][0], headers={
+        'Content-Disposition': f'attachment; filename={filename}'
+    })
+
+def export_run(run_id):
+    """Export kết quả (part=results) hoặc items (part=items) của run đã lưu - JSON, NDJSON hoặc CSV"""
+    try:
+        run = get_run(run_id)
+        if run is None:
+            return jsonify({'success': False, 'message': f'Run {run_id} not found'}), 404
+        return export_stream(run, request.args.get('part', 'results'), request.args.get('format', 'json'))
+
+    except Exception as e:
+        logging.error(f"Export run error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'Export run error: {str(e)}'
+        }), 500
+
+def export_manifest(manifest_hash):
+    """Export items của manifest (theo run mới nhất có manifest_hash này)"""
+    try:
+        run = latest_run_for_manifest(manifest_hash)
+        if run is None:
+            return jsonify({'success': False, 'message': f'Manifest {manifest_hash} not found'}), 404
+        return export_stream(run, 'items', request.args.get('format', 'json'))
+
+    except Exception as e:
+        logging.error(f"Export manifest error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'Export manifest error: {str(e)}'
+        }), 500
+
+def list_packing_runs():
+    """Danh sách các lần chạy đã lưu (phân trang, không kèm items)"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 20, type=int)
+        min_utilization = request.args.get('min_utilization', type=float)
+
+        result = list_runs(
+            page=page,
+            per_page=per_page,
+            manifest_hash=request.args.get('manifest_hash'),
+            min_utilization=min_utilization,
+            order_by=request.args.get('order_by', 'created_at'),
+            # URL solver nội bộ chỉ trả về cho admin (cùng token với /profiles)
+            include_endpoint=token_ok(request.headers)
+        )
+
+        return jsonify({'success': True, **result})
+
+    except Exception as e:
+        logging.error(f"List runs error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'List runs error: {str(e)}'
+        }), 500
+
+def get_packing_run(run_id):
+    """Lấy kết quả đầy đủ của một lần chạy đã lưu"""
+    try:
+        run = get_run(run_id)
+        if run is None:
+            return jsonify({'success': False, 'message': f'Run {run_id} not found'}), 404
+
+        result = run_result(run)
+        result['run'] = run.summary(token_ok(request.headers))
+        if request.args.get('include_manifest', '0') == '1':
+            result['manifest'] = run_manifest(run)
+
+        return jsonify(result)
+
+    except Exception as e:
+        logging.error(f"Get run error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'Get run error: {str(e)}'
+        }), 500
+
+def list_request_profiles():
+    """Danh sách các profile đã lưu (mới nhất trước)"""
+    if not token_ok(request.headers):
+        return jsonify({'success': False, 'message': 'Invalid profile token'}), 403
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({'success': True, 'profiles': list_profiles(limit)})
+
+def download_request_profile(profile_id):
+    """Tải profile (folded stacks) của một request"""
+    if not token_ok(request.headers):
+        return jsonify({'success': False, 'message': 'Invalid profile token'}), 403
+    folded = read_profile(profile_id)
+    if folded is None:
+        return jsonify({'success': False, 'message': f'Profile {profile_id} not found'}), 404
+    return Response(folded, mimetype='text/plain', headers={
+        'Content-Disposition': f'attachment; filename={profile_id}.folded'
+    })
+
+def finish_recording(response):
+    """Hoàn tất traffic recording của request (nếu có) với response cuối cùng"""
+    recording = g.pop('recording', None)
+    if recording is not None:
+        recording.finish(response.status_code, response.get_json(silent=True))
+    return response
+
 def not_found(error):
     return render_template('index.html'), 404
 
@@ -990,13 +658,22 @@ def internal_error(error):
 # Function to register all routes
 def register_routes(app):
     app.add_url_rule('/', 'index', index)
+    app.add_url_rule('/health', 'health_check', health_check, methods=['GET'])
+    app.add_url_rule('/admission', 'admission_status', admission_status, methods=['GET'])
     app.add_url_rule('/check_endpoint', 'check_packing_endpoint', check_packing_endpoint, methods=['POST'])
-    app.add_url_rule('/pack', 'pack_items', pack_items, methods=['POST'])
-    app.add_url_rule('/pack_step_by_step', 'pack_items_step_by_step', pack_items_step_by_step, methods=['POST'])
+    app.add_url_rule('/pack', 'pack_items', profiled(pack_items, '/pack'), methods=['POST'])
+    app.add_url_rule('/pack_step_by_step', 'pack_items_step_by_step', profiled(pack_items_step_by_step, '/pack_step_by_step'), methods=['POST'])
     app.add_url_rule('/get_step', 'get_specific_step', get_specific_step, methods=['POST'])
     app.add_url_rule('/validate_json', 'validate_json', validate_json, methods=['POST'])
-    app.add_url_rule('/visualize', 'visualize_items', visualize_items, methods=['POST'])
-    app.add_url_rule('/export_items', 'export_items', export_items, methods=['POST'])
-    app.add_url_rule('/export_results', 'export_results', export_results, methods=['POST'])
+    app.add_url_rule('/visualize', 'visualize_items', profiled(visualize_items, '/visualize'), methods=['POST'])
+    app.add_url_rule('/export_items', 'export_items', profiled(export_items, '/export_items'), methods=['POST'])
+    app.add_url_rule('/export_results', 'export_results', profiled(export_results, '/export_results'), methods=['POST'])
+    app.add_url_rule('/runs', 'list_packing_runs', list_packing_runs, methods=['GET'])
+    app.add_url_rule('/runs/<int:run_id>', 'get_packing_run', get_packing_run, methods=['GET'])
+    app.add_url_rule('/runs/<int:run_id>/export', 'export_run', export_run, methods=['GET'])
+    app.add_url_rule('/manifests/<manifest_hash>/export', 'export_manifest', export_manifest, methods=['GET'])
+    app.add_url_rule('/profiles', 'list_request_profiles', list_request_profiles, methods=['GET'])
+    app.add_url_rule('/profiles/<profile_id>', 'download_request_profile', download_request_profile, methods=['GET'])
+    app.after_request(finish_recording)
     app.register_error_handler(404, not_found)
     app.register_error_handler(500, internal_error)
@@ -0,0 +1,283 @@
+"""
+Lưu trữ lịch sử các lần chạy packing.
+
+Manifest, parameters và kết quả được lưu dưới dạng JSON nén (zlib); packed items
+được gom thành các nhóm liên tiếp cùng loại (giống format của packing API) nên
+kết quả lớn chỉ chiếm vài KB. Query danh sách chỉ đọc các cột tóm tắt.
+"""
+import hashlib
+import json
+import logging
+import zlib
+
+from flask import current_app
+
+from app import db
+from models import PackingRun
+from packing import PackingError, build_packing_steps
+
+MAX_PER_PAGE = 100
+
+
+def pack_blob(obj):
+    return zlib.compress(json.dumps(obj, separators=(',', ':')).encode('utf-8'), 6)
+
+def unpack_blob(blob):
+    if blob is None:
+        return None
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+def manifest_hash(bin_dims, api_items):
+    """Hash của manifest, không phụ thuộc thứ tự items hay cách expand quantity"""
+    counts = {}
+    for item in api_items:
+        key = (item.get('request_id'), item['L'], item['W'], item['H'], item.get('num_axis', 2))
+        counts[key] = counts.get(key, 0) + item.get('quantity', 1)
+    canonical = {
+        'bin_size': [float(d) for d in bin_dims],
+        'items': sorted(([*key, quantity] for key, quantity in counts.items()), key=json.dumps)
+    }
+    return hashlib.sha256(json.dumps(canonical, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+def compact_packed_items(packed_items):
+    """Gom packed items liên tiếp cùng loại thành nhóm {dims, positions}"""
+    groups = []
+    last_key = None
+    for item in packed_items:
+        key = (
+            item['id'], item.get('request_id', item['id']),
+            item['length'], item['width'], item['height'],
+            item.get('original_length', item['length']),
+            item.get('original_width', item['width']),
+            item.get('original_height', item['height']),
+            item.get('rotation_id', 0)
+        )
+        if key != last_key or item.get('position_index') == 1:
+            groups.append({
+                'id': key[0],
+                'request_id': key[1],
+                'dims': list(key[2:5]),
+                'original': list(key[5:8]),
+                'rotation_id': key[8],
+                'positions': []
+            })
+            last_key = key
+        groups[-1]['positions'].append([item['x'], item['y'], item['z']])
+    return groups
+
+def iter_packed_items(groups):
+    """Packed items theo format /pack, sinh lần lượt từ các nhóm (không giữ cả danh sách trong bộ nhớ)"""
+    pack_order = 1
+    for group in groups:
+        l, w, h = group['dims']
+        l0, w0, h0 = group['original']
+        positions = group['positions']
+        for i, (x, y, z) in enumerate(positions):
+            yield {
+                'id': group['id'],
+                'request_id': group['request_id'],
+                'length': l,
+                'width': w,
+                'height': h,
+                'original_length': l0,
+                'original_width': w0,
+                'original_height': h0,
+                'rotation_id': group['rotation_id'],
+                'x': x,
+                'y': y,
+                'z': z,
+                'pack_order': pack_order,
+                'position_index': i + 1,
+                'total_positions': len(positions),
+                'item_type_id': group['id']
+            }
+            pack_order += 1
+
+def expand_packed_items(groups):
+    """Ngược lại với compact_packed_items - trả về packed items theo format /pack"""
+    return list(iter_packed_items(groups))
+
+def compact_leftover_items(leftover_items):
+    groups = []
+    last_key = None
+    for item in leftover_items:
+        key = (item['id'], item.get('request_id', item['id']), item['length'], item['width'], item['height'])
+        if key != last_key:
+            groups.append({'id': key[0], 'request_id': key[1], 'dims': list(key[2:5]), 'quantity': 0})
+            last_key = key
+        groups[-1]['quantity'] += 1
+    return groups
+
+def iter_leftover_items(groups):
+    for group in groups:
+        l, w, h = group['dims']
+        for _ in range(group['quantity']):
+            yield {
+                'id': group['id'],
+                'request_id': group['request_id'],
+                'length': l,
+                'width': w,
+                'height': h
+            }
+
+def expand_leftover_groups(groups):
+    return list(iter_leftover_items(groups))
+
+def save_run(packing_endpoint, packing_request, payload, solver_time=None, mode='pack'):
+    """
+    Lưu một lần chạy thành công. Cần Flask app context.
+
+    Returns:
+    - run id, hoặc None nếu run store bị tắt / lưu thất bại (không làm hỏng request)
+    """
+    if not current_app.config.get('RUN_STORE_ENABLED', True):
+        return None
+
+    try:
+        bin_size = packing_request['bin_size']
+        bin_dims = (bin_size['L'], bin_size['W'], bin_size['H'])
+        items = packing_request['items']
+
+        result = {
+            'packed': compact_packed_items(payload.get('packed_items', [])),
+            'leftover': compact_leftover_items(payload.get('leftover_items', [])),
+            'external_result': payload.get('external_result', {})
+        }
+        packed_count = len(payload.get('packed_items', []))
+        utilization = payload.get('utilization', 0.0)
+
+        # Multi-container: lưu từng container, top-level chỉ là bản sao của container đầu tiên
+        if payload.get('containers') is not None:
+            result['packed'] = []
+            result['containers'] = [
+                {
+                    'container_index': container['container_index'],
+                    'type_index': container['type_index'],
+                    'name': container['name'],
+                    'bin_size': container['bin_size'],
+                    'utilization': container['utilization'],
+                    'training_score': container['training_score'],
+                    'external_result': container['external_result'],
+                    'packed': compact_packed_items(container['packed_items'])
+                }
+                for container in payload['containers']
+            ]
+            result['fleet'] = payload['fleet']
+            packed_count = payload['fleet']['packed_count']
+            utilization = payload['fleet']['utilization']
+
+        manifest = {'items': items}
+        if packing_request.get('containers') is not None:
+            manifest['containers'] = packing_request['containers']
+
+        run = PackingRun(
+            mode=mode,
+            manifest_hash=manifest_hash(bin_dims, items),
+            bin_length=bin_dims[0],
+            bin_width=bin_dims[1],
+            bin_height=bin_dims[2],
+            item_count=sum(item.get('quantity', 1) for item in items),
+            solver_endpoint=packing_endpoint,
+            solver_time=solver_time,
+            packing_time=payload.get('packing_time'),
+            packed_count=packed_count,
+            leftover_count=len(payload.get('leftover_items', [])),
+            utilization=utilization,
+            training_score=payload.get('training_score'),
+            manifest_blob=pack_blob(manifest),
+            parameters_blob=pack_blob(packing_request.get('parameters', {})),
+            result_blob=pack_blob(result)
+        )
+        db.session.add(run)
+        db.session.commit()
+        return run.id
+
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Run store error: {str(e)}")
+        return None
+
+def list_runs(page=1, per_page=20, manifest_hash=None, min_utilization=None, order_by='created_at', include_endpoint=False):
+    """Danh sách runs có phân trang - chỉ đọc các cột tóm tắt, không load blobs"""
+    query = db.select(PackingRun)
+    if manifest_hash:
+        query = query.where(PackingRun.manifest_hash == manifest_hash)
+    if min_utilization is not None:
+        query = query.where(PackingRun.utilization >= min_utilization)
+
+    if order_by == 'utilization':
+        query = query.order_by(PackingRun.utilization.desc(), PackingRun.id.desc())
+    else:
+        query = query.order_by(PackingRun.created_at.desc(), PackingRun.id.desc())
+
+    pagination = db.paginate(query, page=page, per_page=per_page, max_per_page=MAX_PER_PAGE, error_out=False)
+    return {
+        'runs': [run.summary(include_endpoint) for run in pagination.items],
+        'page': pagination.page,
+        'per_page': pagination.per_page,
+        'total': pagination.total,
+        'pages': pagination.pages
+    }
+
+def get_run(run_id):
+    return db.session.get(PackingRun, run_id)
+
+def latest_run_for_manifest(manifest_hash):
+    """Run mới nhất của manifest (theo manifest_hash), hoặc None"""
+    query = db.select(PackingRun).where(PackingRun.manifest_hash == manifest_hash)
+    return db.session.scalars(query.order_by(PackingRun.created_at.desc(), PackingRun.id.desc()).limit(1)).first()
+
+def run_result(run):
+    """Kết quả của run theo đúng format response của /pack"""
+    result = unpack_blob(run.result_blob)
+    packed_items = expand_packed_items(result['packed'])
+    payload = {
+        'success': True,
+        'run_id': run.id,
+        'packed_items': packed_items,
+        'leftover_items': expand_leftover_groups(result['leftover']),
+        'bin_size': {
+            'length': run.bin_length,
+            'width': run.bin_width,
+            'height': run.bin_height
+        },
+        'utilization': run.utilization,
+        'training_score': run.training_score,
+        'packing_time': run.packing_time,
+        'external_result': result.get('external_result', {}),
+        'packing_steps': build_packing_steps(packed_items)
+    }
+
+    if 'containers' in result:
+        containers = []
+        for stored in result['containers']:
+            container_items = expand_packed_items(stored.pop('packed'))
+            containers.append({
+                **stored,
+                'packed_items': container_items,
+                'packing_steps': build_packing_steps(container_items)
+            })
+        payload['containers'] = containers
+        payload['fleet'] = result['fleet']
+        if containers:
+            for key in ('packed_items', 'bin_size', 'utilization', 'training_score', 'external_result', 'packing_steps'):
+                payload[key] = containers[0][key]
+
+    return payload
+
+def run_manifest(run):
+    """Manifest (items theo format packing API, containers nếu có) và parameters của run"""
+    manifest = unpack_blob(run.manifest_blob)
+    manifest['parameters'] = unpack_blob(run.parameters_blob) or {}
+    return manifest
+
+def attach_incremental_base(data):
+    """Nạp kết quả và manifest của run gốc cho incremental repack theo run_id"""
+    spec = (data or {}).get('incremental')
+    if not spec or spec.get('previous_result') or spec.get('run_id') is None:
+        return
+    run = get_run(int(spec['run_id']))
+    if run is None:
+        raise PackingError(f"Run {spec['run_id']} not found", 404)
+    spec['previous_result'] = run_result(run)
+    spec['previous_manifest'] = run_manifest(run)
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Timeout (giây) cho các lời gọi tới external packing endpoint; 0 = không giới hạn
+SOLVER_TIMEOUT = float(os.environ.get('SOLVER_TIMEOUT', 0)) or None
+HEALTH_TIMEOUT = 5
+
+# Số lời gọi solver chạy song song trong một request (blocking mode)
+SOLVER_PARALLEL_CALLS = int(os.environ.get('SOLVER_PARALLEL_CALLS', 8))
+
+# Giới hạn connection pool của async client (ASGI mode)
+ASYNC_MAX_CONNECTIONS = int(os.environ.get('SOLVER_MAX_CONNECTIONS', 1000))
+ASYNC_MAX_KEEPALIVE = int(os.environ.get('SOLVER_MAX_KEEPALIVE', 100))
+
+# elapsed: thời gian round-trip của lời gọi (giây)
+SolverResponse = namedtuple('SolverResponse', ['status_code', 'body', 'text', 'content_type', 'elapsed'], defaults=(None,))
+
+
+class SolverUnavailable(Exception):
+    """Không kết nối được tới external endpoint"""
+
+
+class SolverTimeout(Exception):
+    """External endpoint không phản hồi trong thời gian cho phép"""
+
+
+def health_url(endpoint_url):
+    """URL health check tương ứng với packing endpoint"""
+    return endpoint_url.replace('/pack', '/health')
+
+def _make_response(response, probe=False, elapsed=None):
+    content_type = response.headers.get('content-type', '')
+    if probe:
+        body = response.json() if content_type.startswith('application/json') else None
+        return SolverResponse(response.status_code, body, None, content_type, elapsed)
+    if response.status_code == 200:
+        return SolverResponse(200, response.json(), None, content_type, elapsed)
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    return SolverResponse(response.status_code, body, response.text, content_type, elapsed)
+
+def call_solver(url, payload, timeout=SOLVER_TIMEOUT):
+    """POST payload tới external packing endpoint (blocking)"""
+    started = time.perf_counter()
+    try:
+        response = requests.post(
+            url,
+            json=payload,
+            headers={'Content-Type': 'application/json'},
+            timeout=timeout
+        )
+    except requests.exceptions.ConnectionError as e:
+        raise SolverUnavailable(str(e)) from e
+    except requests.exceptions.Timeout as e:
+        raise SolverTimeout(str(e)) from e
+    return _make_response(response, elapsed=time.perf_counter() - started)
+
+def call_solver_many(url, payloads, timeout=SOLVER_TIMEOUT):
+    """POST nhiều payload song song (thread pool), kết quả theo đúng thứ tự payloads"""
+    if len(payloads) <= 1:
+        return [call_solver(url, payload, timeout) for payload in payloads]
+    with ThreadPoolExecutor(max_workers=min(SOLVER_PARALLEL_CALLS, len(payloads))) as executor:
+        return list(executor.map(lambda payload: call_solver(url, payload, timeout), payloads))
+
+def probe_solver(endpoint_url, timeout=HEALTH_TIMEOUT):
+    """GET health URL của external endpoint (blocking)"""
+    try:
+        response = requests.get(health_url(endpoint_url), timeout=timeout)
+    except requests.exceptions.ConnectionError as e:
+        raise SolverUnavailable(str(e)) from e
+    except requests.exceptions.Timeout as e:
+        raise SolverTimeout(str(e)) from e
+    return _make_response(response, probe=True)
+
+
+# Async client dùng chung cho toàn bộ event loop (ASGI mode)
+_async_client = None
+
+def get_async_client():
+    """Trả về httpx.AsyncClient dùng chung, tạo lazily trong event loop hiện tại"""
+    global _async_client
+    if _async_client is None:
+        import httpx
+        _async_client = httpx.AsyncClient(
+            timeout=SOLVER_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_MAX_KEEPALIVE
+            )
+        )
+    return _async_client
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+async def acall_solver(url, payload, timeout=SOLVER_TIMEOUT):
+    """POST payload tới external packing endpoint (async)"""
+    import httpx
+    started = time.perf_counter()
+    try:
+        response = await get_async_client().post(url, json=payload, timeout=timeout)
+    except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+        raise SolverUnavailable(str(e)) from e
+    except httpx.TimeoutException as e:
+        raise SolverTimeout(str(e)) from e
+    return _make_response(response, elapsed=time.perf_counter() - started)
+
+async def aprobe_solver(endpoint_url, timeout=HEALTH_TIMEOUT):
+    """GET health URL của external endpoint (async)"""
+    import httpx
+    try:
+        response = await get_async_client().get(health_url(endpoint_url), timeout=timeout)
+    except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+        raise SolverUnavailable(str(e)) from e
+    except httpx.TimeoutException as e:
+        raise SolverTimeout(str(e)) from e
+    return _make_response(response, probe=True)
+
+async def acall_solver_many(url, payloads, timeout=SOLVER_TIMEOUT):
+    """POST nhiều payload đồng thời trên event loop, kết quả theo đúng thứ tự payloads"""
+    return await asyncio.gather(*[acall_solver(url, payload, timeout) for payload in payloads])
@@ -1,3 +1,96 @@
+// Algorithm steps of /pack_step_by_step: keyframes + deltas (same format as step_codec.py)
+class StepStream {
+    constructor(steps, encoding) {
+        this.steps = steps || [];
+        this.isDelta = !!encoding && encoding.format === 'delta';
+        // Most recently decoded data - sequential playback continues from here
+        this.cursor = -1;
+        this.data = null;
+    }
+
+    get length() {
+        return this.steps.length;
+    }
+
+    static boxKeys(boxes) {
+        const seen = {};
+        return boxes.map(box => {
+            const ident = box.id !== undefined ? box.id : box.item_id;
+            const count = seen[ident] || 0;
+            seen[ident] = count + 1;
+            return `${ident}:${count}`;
+        });
+    }
+
+    static applyBoxes(previous, delta) {
+        const boxes = new Map();
+        StepStream.boxKeys(previous).forEach((key, index) => boxes.set(key, previous[index]));
+        (delta.removed || []).forEach(key => boxes.delete(key));
+        (delta.moved || []).forEach(([key, box]) => boxes.set(key, box));
+        (delta.placed || []).forEach(([key, box]) => boxes.set(key, box));
+        return [...boxes.values()];
+    }
+
+    static applyDelta(previous, delta) {
+        const data = { ...previous };
+        (delta.unset || []).forEach(key => delete data[key]);
+        Object.assign(data, delta.set || {}, delta.scores || {});
+        Object.entries(delta.boxes || {}).forEach(([key, changes]) => {
+            data[key] = StepStream.applyBoxes(previous[key], changes);
+        });
+        return data;
+    }
+
+    dataAt(index) {
+        if (index < 0 || index >= this.steps.length) return null;
+        if (!this.isDelta) return this.steps[index].data;
+
+        // Start from the nearest preceding keyframe, or from the decoded step if that is closer
+        let keyframe = index;
+        while (keyframe > 0 && !this.steps[keyframe].keyframe) keyframe--;
+
+        let data = this.steps[keyframe].data;
+        let position = keyframe;
+        if (this.cursor >= keyframe && this.cursor <= index) {
+            data = this.data;
+            position = this.cursor;
+        }
+        for (let i = position + 1; i <= index; i++) {
+            data = StepStream.applyDelta(data, this.steps[i].delta);
+        }
+
+        this.cursor = index;
+        this.data = data;
+        return data;
+    }
+
+    boxesAt(index) {
+        // Boxes of the step snapshot with position and size, or null if the solver sent no snapshot
+        const data = this.dataAt(index);
+        if (!data || typeof data !== 'object') return null;
+
+        const boxes = [];
+        Object.values(data).forEach(value => {
+            if (!Array.isArray(value)) return;
+            value.forEach(box => {
+                if (!box || box.x === undefined || box.y === undefined || box.z === undefined) return;
+                const length = box.length !== undefined ? box.length : (box.L !== undefined ? box.L : box.l);
+                const width = box.width !== undefined ? box.width : (box.W !== undefined ? box.W : box.w);
+                const height = box.height !== undefined ? box.height : (box.H !== undefined ? box.H : box.h);
+                if (length === undefined || width === undefined || height === undefined) return;
+                boxes.push({ ...box, length, width, height });
+            });
+        });
+        return boxes.length > 0 ? boxes : null;
+    }
+}
+
+// Results with more packed items than this are drawn as an occupancy grid (level of detail)
+const LOD_ITEM_THRESHOLD = 1500;
+const LOD_MAX_RESOLUTION = 64;
+const BOX_FACES = [[0, 1, 2], [0, 2, 3], [4, 7, 6], [4, 6, 5], [0, 4, 5], [0, 5, 1],
+                   [2, 6, 7], [2, 7, 3], [0, 3, 7], [0, 7, 4], [1, 5, 6], [1, 6, 2]];
+
 class BinPackingVisualizer {
     constructor() {
         this.items = [];
@@ -11,11 +104,18 @@ class BinPackingVisualizer {
 
         // Step-by-step visualization
         this.packingSteps = [];
+        this.stepStream = null;
         this.currentStepIndex = -1;
         this.isPlaying = false;
         this.playInterval = null;
         this.stepSpeed = 1000; // ms
 
+        // Level of detail for large results
+        this.lodMode = 'voxels';
+        this.lodView = null;
+        this.lodZoomTimer = null;
+        this.lodRequestId = 0; // Only the latest LOD request may redraw the plot
+
         // Algorithm weights and training
         this.weights = {}; // Store original loaded algorithm weights
         this.currentWeights = {}; // Store editable weights
@@ -54,6 +154,7 @@ class BinPackingVisualizer {
 
         // Packing events
         document.getElementById('runPacking').addEventListener('click', () => this.runPacking());
+        document.getElementById('runStepByStep').addEventListener('click', () => this.runStepByStep());
         document.getElementById('reloadWarehouse').addEventListener('click', () => this.reloadWarehouse());
 
         // Export events
@@ -86,6 +187,9 @@ class BinPackingVisualizer {
         document.getElementById('nextStep').addEventListener('click', () => this.nextStep());
         document.getElementById('prevStep').addEventListener('click', () => this.previousStep());
         document.getElementById('stepSpeed').addEventListener('input', (e) => this.updateStepSpeed(e.target.value));
+
+        // Level of detail events
+        document.getElementById('lodMode').addEventListener('change', (e) => this.onLodModeChange(e.target.value));
     }
 
     setupFormValidation() {
@@ -223,6 +327,7 @@ class BinPackingVisualizer {
         this.items = [];
         this.packedResults = null;
         this.packingSteps = [];
+        this.stepStream = null;
         this.currentStepIndex = -1;
         this.pauseAnimation();
         this.updateItemsList();
@@ -514,6 +619,17 @@ class BinPackingVisualizer {
     }
 
     visualizePackedItems(packedItems) {
+        if (packedItems.length > LOD_ITEM_THRESHOLD) {
+            // Items of the current result are summarized by run_id when it was saved on the server
+            const source = this.packedResults && this.packedResults.packed_items === packedItems
+                ? this.lodSource()
+                : { packed_items: packedItems, bin_size: this.binSize };
+            this.visualizeLod(source);
+            document.getElementById('placedBadge').textContent = `Packed: ${packedItems.length}`;
+            return;
+        }
+        this.clearLod();
+
         // Create plot data for packed items with their coordinates
         const traces = [];
 
@@ -815,6 +931,16 @@ class BinPackingVisualizer {
     visualizePacking() {
         if (!this.packedResults) return;
 
+        // Show all packed items (no limit to match visualization only mode)
+        const packedItems = this.packedResults.packed_items || [];
+
+        // Large result: draw the occupancy grid, details are loaded on zoom / region click
+        if (packedItems.length > LOD_ITEM_THRESHOLD) {
+            this.visualizeLod(this.lodSource());
+            return;
+        }
+        this.clearLod();
+
         const data = [];
 
         // Add warehouse outline
@@ -827,9 +953,6 @@ class BinPackingVisualizer {
             '#BAE1FF', '#DDA0DD', '#98FB98', '#F0E68C'
         ];
 
-        // Show all packed items (no limit to match visualization only mode)
-        const packedItems = this.packedResults.packed_items || [];
-
         // Add placed items
         packedItems.forEach((item, index) => {
             const color = colors[index % colors.length];
@@ -837,10 +960,18 @@ class BinPackingVisualizer {
             data.push(itemMesh);
         });
 
+        try {
+            Plotly.react('plot3d', data, this.createPackingLayout());
+        } catch (error) {
+            console.error('Plot update error:', error);
+            this.showToast('Visualization update failed.', 'warning');
+        }
+    }
+
+    createPackingLayout() {
         const aspectRatio = this.calculateAspectRatio();
 
-        // Update plot
-        const layout = {
+        return {
             scene: {
                 xaxis: {
                     title: 'Length',
@@ -875,13 +1006,236 @@ class BinPackingVisualizer {
             paper_bgcolor: 'transparent',
             showlegend: false
         };
+    }
+
+    // Level of detail: occupancy grid from /visualize instead of one mesh per box
+    isLargeResult() {
+        return !!this.packedResults && (this.packedResults.packed_items || []).length > LOD_ITEM_THRESHOLD;
+    }
+
+    lodSource(maxPackOrder = null) {
+        // Saved on the server: send only the run_id instead of the packed items
+        const source = this.packedResults.run_id != null
+            ? { run_id: this.packedResults.run_id }
+            : { packed_items: this.packedResults.packed_items, bin_size: this.binSize };
+        if (maxPackOrder != null) {
+            source.max_pack_order = maxPackOrder;
+        }
+        return source;
+    }
+
+    clearLod() {
+        // Back to per-box drawing: drop the LOD view and ignore LOD requests still in flight
+        this.lodView = null;
+        this.lodRequestId++;
+        clearTimeout(this.lodZoomTimer);
+        document.getElementById('lodMode').style.display = 'none';
+    }
+
+    lodResolution() {
+        // Roughly one cell per 20px of plot width
+        const width = document.getElementById('plot3d').clientWidth || 800;
+        return Math.min(Math.max(Math.round(width / 20), 8), 48);
+    }
+
+    async fetchLod(source, lod) {
+        try {
+            const response = await fetch('/visualize', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ ...source, lod: { mode: this.lodMode, ...lod } })
+            });
+            const result = await response.json();
+            if (!result.success) {
+                this.showToast(`Visualization error: ${result.message}`, 'danger');
+                return null;
+            }
+            return result;
+        } catch (error) {
+            console.error('Level of detail error:', error);
+            this.showToast('Visualization error. Please try again.', 'danger');
+            return null;
+        }
+    }
+
+    async visualizeLod(source, resolution = this.lodResolution(), camera = null) {
+        const requestId = ++this.lodRequestId;
+        const result = await this.fetchLod(source, { resolution });
+        if (!result || requestId !== this.lodRequestId) return;
+
+        const baseResolution = this.lodView && this.lodView.source === source ? this.lodView.baseResolution : resolution;
+        this.lodView = {
+            source,
+            resolution,
+            baseResolution,
+            camera,
+            levels: [{ summary: result.lod, hidden: new Set() }],
+            items: []
+        };
+        document.getElementById('lodMode').style.display = 'inline-block';
+        this.drawLod();
+    }
+
+    createLodMesh(summary, hidden, level) {
+        // All cells in one mesh3d trace: the trace count does not depend on the item count
+        const x = [], y = [], z = [], i = [], j = [], k = [], intensity = [], text = [];
+        const [ox, oy, oz] = summary.origin;
+        const [ex, ey, ez] = summary.extent;
+        const [cx, cy, cz] = summary.cell_size;
+        const cells = summary.cells;
+
+        cells.i.forEach((ci, n) => {
+            const key = `${ci},${cells.j[n]},${cells.k[n]}`;
+            if (hidden.has(key)) return;
+
+            const x0 = ox + ci * cx, x1 = Math.min(x0 + cx, ox + ex);
+            const y0 = oy + cells.j[n] * cy, y1 = Math.min(y0 + cy, oy + ey);
+            const z0 = oz + cells.k[n] * cz, z1 = Math.min(z0 + cz, oz + ez);
+            const label = `<b>${cells.count[n]} items</b><br>Fill: ${Math.round(cells.fill[n] * 100)}%<br>Click to load details`;
+            const base = x.length;
+
+            [[x0, y0, z0], [x1, y0, z0], [x1, y1, z0], [x0, y1, z0],
+             [x0, y0, z1], [x1, y0, z1], [x1, y1, z1], [x0, y1, z1]].forEach(vertex => {
+                x.push(vertex[0]);
+                y.push(vertex[1]);
+                z.push(vertex[2]);
+                intensity.push(cells.fill[n]);
+                text.push(label);
+            });
+            BOX_FACES.forEach(face => {
+                i.push(base + face[0]);
+                j.push(base + face[1]);
+                k.push(base + face[2]);
+            });
+        });
 
+        return {
+            type: 'mesh3d',
+            x: x,
+            y: y,
+            z: z,
+            i: i,
+            j: j,
+            k: k,
+            intensity: intensity,
+            colorscale: 'YlOrRd',
+            cmin: 0,
+            cmax: 1,
+            opacity: 0.85,
+            text: text,
+            hoverinfo: 'text',
+            name: 'LOD',
+            meta: level,
+            showscale: false,
+            flatshading: true
+        };
+    }
+
+    drawLod() {
+        const view = this.lodView;
+        const data = [this.createWarehouseOutline()];
+        view.levels.forEach((level, index) => data.push(this.createLodMesh(level.summary, level.hidden, index)));
+
+        const colors = ['#FF6B35', '#F7931E', '#FFD23F', '#06FFA5', '#BAE1FF', '#DDA0DD'];
+        view.items.forEach((item, index) => data.push(this.createItemMesh(item, colors[index % colors.length])));
+
+        const layout = this.createPackingLayout();
+        if (view.camera) {
+            layout.scene.camera = view.camera;
+        }
 
         try {
             Plotly.react('plot3d', data, layout);
         } catch (error) {
             console.error('Plot update error:', error);
             this.showToast('Visualization update failed.', 'warning');
+            return;
+        }
+
+        const plot = document.getElementById('plot3d');
+        plot.removeAllListeners('plotly_click');
+        plot.removeAllListeners('plotly_relayout');
+        plot.on('plotly_click', (event) => this.onLodClick(event));
+        plot.on('plotly_relayout', (event) => this.onLodRelayout(event));
+    }
+
+    lodCellAt(summary, hidden, point) {
+        // The clicked point lies on a cell face: try both neighbouring cells when it is on a boundary
+        const candidates = [point.x, point.y, point.z].map((value, axis) => {
+            const position = (value - summary.origin[axis]) / summary.cell_size[axis];
+            const rounded = Math.round(position);
+            return Math.abs(position - rounded) < 1e-6 ? [rounded - 1, rounded] : [Math.floor(position)];
+        });
+        const cells = new Set(summary.cells.i.map((ci, n) => `${ci},${summary.cells.j[n]},${summary.cells.k[n]}`));
+        for (const ci of candidates[0]) {
+            for (const cj of candidates[1]) {
+                for (const ck of candidates[2]) {
+                    const key = `${ci},${cj},${ck}`;
+                    if (cells.has(key) && !hidden.has(key)) {
+                        return [ci, cj, ck];
+                    }
+                }
+            }
+        }
+        return null;
+    }
+
+    async onLodClick(event) {
+        const view = this.lodView;
+        const point = event.points && event.points[0];
+        if (!view || !point || point.data.name !== 'LOD') return;
+
+        const level = view.levels[point.data.meta];
+        const cell = this.lodCellAt(level.summary, level.hidden, point);
+        if (!cell) return;
+
+        const { origin, extent, cell_size: size } = level.summary;
+        const region = {
+            min: cell.map((index, axis) => origin[axis] + index * size[axis]),
+            max: cell.map((index, axis) => Math.min(origin[axis] + (index + 1) * size[axis], origin[axis] + extent[axis]))
+        };
+        const result = await this.fetchLod(view.source, { resolution: Math.max(Math.round(view.resolution / 2), 4), region });
+        if (!result || this.lodView !== view) return;
+
+        // Small enough region -> individual items; otherwise -> a finer grid of just that region
+        level.hidden.add(cell.join(','));
+        if (result.packed_items) {
+            view.items.push(...result.packed_items);
+            this.showToast(`Loaded ${result.packed_items.length} items in selected region`, 'info');
+        } else {
+            view.levels.push({ summary: result.lod, hidden: new Set() });
+        }
+        this.drawLod();
+    }
+
+    onLodRelayout(event) {
+        const view = this.lodView;
+        const camera = event && event['scene.camera'];
+        if (!view || !camera || !camera.eye) return;
+        view.camera = camera;
+
+        // Zooming in -> raise the grid resolution in proportion to the camera distance
+        const aspectRatio = this.calculateAspectRatio();
+        const defaultDistance = 1.5 * Math.hypot(aspectRatio.x, aspectRatio.y, aspectRatio.z);
+        const distance = Math.hypot(camera.eye.x, camera.eye.y, camera.eye.z);
+        const zoom = Math.max(defaultDistance / distance, 1);
+        const resolution = Math.min(Math.round(view.baseResolution * zoom), LOD_MAX_RESOLUTION);
+        if (resolution < view.resolution * 1.5 && resolution > view.resolution / 1.5) return;
+
+        clearTimeout(this.lodZoomTimer);
+        this.lodZoomTimer = setTimeout(() => {
+            if (this.lodView === view) {
+                this.visualizeLod(view.source, resolution, view.camera);
+            }
+        }, 400);
+    }
+
+    onLodModeChange(mode) {
+        this.lodMode = mode;
+        if (this.lodView) {
+            this.visualizeLod(this.lodView.source, this.lodView.baseResolution);
         }
     }
 
@@ -1081,6 +1435,18 @@ class BinPackingVisualizer {
                 console.log('Sending weights with request:', currentWeights);
             }
 
+            // Late changes to an already packed load: send only the delta against the saved run
+            const delta = this.getIncrementalDelta(requestData.parameters);
+            if (delta) {
+                requestData.incremental = {
+                    run_id: this.packedResults.run_id,
+                    added_items: delta.added,
+                    removed_items: delta.removed
+                };
+                delete requestData.items;
+                console.log(`Incremental repack: +${delta.added.length} -${delta.removed.length} items`);
+            }
+
             console.log('Request data:', requestData);
 
             const response = await fetch('/pack', {
@@ -1101,7 +1467,8 @@ class BinPackingVisualizer {
             }
 
             console.log('Setting packed results...');
-            this.packedResults = result;
+            // Remember the parameters of this run so a later incremental repack can detect changes
+            this.packedResults = { ...result, request_parameters: requestData.parameters || null };
 
             // Process results immediately without blocking UI
             setTimeout(() => {
@@ -1137,6 +1504,93 @@ class BinPackingVisualizer {
         }
     }
 
+    async runStepByStep() {
+        if (this.items.length === 0) {
+            this.showToast('Please add items before running the packing algorithm', 'warning');
+            return;
+        }
+
+        const packingEndpoint = document.getElementById('packingEndpoint').value.trim();
+        if (!packingEndpoint) {
+            this.showToast('Vui lòng cấu hình endpoint thuật toán packing trước', 'warning');
+            return;
+        }
+
+        this.showProcessingToast('Running step-by-step packing...');
+
+        try {
+            const response = await fetch('/pack_step_by_step', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    packing_endpoint: packingEndpoint,
+                    bin_size: this.binSize,
+                    items: this.items,
+                    step_encoding: 'delta'
+                })
+            });
+
+            const result = await response.json();
+            if (!result.success) {
+                this.showToast(`Step-by-step packing failed: ${result.message}`, 'danger');
+                return;
+            }
+
+            console.log(`Received ${result.total_steps} algorithm steps`, result.step_encoding);
+            this.packedResults = result;
+
+            setTimeout(() => {
+                try {
+                    this.visualizePacking();
+                    this.updateStats();
+                    this.initializeStepControls();
+                    this.displayItemsInfo(result.packed_items || [], result.leftover_items || []);
+                    document.getElementById('exportResults').disabled = false;
+                    this.showToast(`Step-by-step packing completed - ${result.total_steps} steps`, 'success');
+                } catch (error) {
+                    console.error('Visualization error:', error);
+                    this.showToast(`Visualization error: ${error.message || 'Please try again.'}`, 'danger');
+                }
+            }, 10);
+
+        } catch (error) {
+            console.error('Step-by-step packing error:', error);
+            this.showToast(`Network error: ${error.message}`, 'danger');
+        }
+    }
+
+    getIncrementalDelta(parameters) {
+        // Items added / removed since the last saved packing run, or null if a full solve is needed
+        if (!this.packedResults || this.packedResults.run_id == null || !this.packedResults.bin_size) {
+            return null;
+        }
+
+        // Changed weights or parameters invalidate the saved placement
+        if (JSON.stringify(this.packedResults.request_parameters || null) !== JSON.stringify(parameters || null)) {
+            return null;
+        }
+
+        const packedBin = this.packedResults.bin_size;
+        if (packedBin.length !== this.binSize.length || packedBin.width !== this.binSize.width || packedBin.height !== this.binSize.height) {
+            return null;
+        }
+
+        const previousIds = new Set();
+        (this.packedResults.packed_items || []).forEach(item => previousIds.add(item.id));
+        (this.packedResults.leftover_items || []).forEach(item => previousIds.add(item.id));
+        const currentIds = new Set(this.items.map(item => item.id));
+
+        const added = this.items.filter(item => !previousIds.has(item.id));
+        const removed = [...previousIds].filter(id => !currentIds.has(id));
+
+        if (added.length === 0 && removed.length === 0) {
+            return null;
+        }
+        return { added, removed };
+    }
+
     calculateAspectRatio() {
         // Calculate proper aspect ratios based on bin dimensions
         const maxDim = Math.max(this.binSize.length, this.binSize.width, this.binSize.height);
@@ -1395,17 +1849,22 @@ class BinPackingVisualizer {
             return;
         }
 
+        // Results saved on the server are streamed straight from it as a download
+        if (this.packedResults.run_id != null) {
+            this.downloadFromServer(`/runs/${this.packedResults.run_id}/export?part=results&format=json`);
+            this.showToast('Results exported successfully!', 'success');
+            return;
+        }
+
         try {
-            // Send results to server for proper formatting
+            const exportRequest = { ...this.packedResults, bin_size: this.binSize };
+
             const response = await fetch('/export_results', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({
-                    ...this.packedResults,
-                    bin_size: this.binSize
-                })
+                body: JSON.stringify(exportRequest)
             });
 
             const result = await response.json();
@@ -1440,6 +1899,16 @@ class BinPackingVisualizer {
         }
     }
 
+    downloadFromServer(url) {
+        // The server sets Content-Disposition, so the browser streams the file to disk
+        const a = document.createElement('a');
+        a.href = url;
+        a.style.display = 'none';
+        document.body.appendChild(a);
+        a.click();
+        setTimeout(() => document.body.removeChild(a), 1000);
+    }
+
     exportOriginalFile() {
         // Export original input file if available, otherwise export current items
         if (this.originalInputData) {
@@ -1528,6 +1997,7 @@ class BinPackingVisualizer {
         this.items = [];
         this.packedResults = null;
         this.packingSteps = [];
+        this.stepStream = null;
         this.currentStepIndex = -1;
         this.nextItemId = 1;
         this.originalInputData = null; // Clear original input data
@@ -1711,12 +2181,19 @@ class BinPackingVisualizer {
 
     // Step-by-step visualization methods
     initializeStepControls() {
-        if (!this.packedResults || !this.packedResults.packing_steps || this.packedResults.packing_steps.length === 0) {
+        // Step-by-step results replay the solver's algorithm steps, /pack results replay packing_steps
+        const algorithmSteps = this.packedResults && this.packedResults.algorithm_steps;
+        this.stepStream = algorithmSteps && algorithmSteps.length > 0
+            ? new StepStream(algorithmSteps, this.packedResults.step_encoding)
+            : null;
+        const steps = this.stepStream ? algorithmSteps : (this.packedResults && this.packedResults.packing_steps);
+
+        if (!steps || steps.length === 0) {
             document.getElementById('stepControlPanel').style.display = 'none';
             return;
         }
 
-        this.packingSteps = this.packedResults.packing_steps;
+        this.packingSteps = steps;
         // Start at the final step instead of beginning
         this.currentStepIndex = this.packingSteps.length - 1;
 
@@ -1730,8 +2207,11 @@ class BinPackingVisualizer {
         this.isPlaying = false;
         this.updatePlayPauseButton();
 
-        // Initialize with final step visualization (show all items packed)
-        this.showStepVisualization(this.currentStepIndex);
+        // Initialize with final step visualization (show all items packed);
+        // large results are already drawn as a level-of-detail view by visualizePacking
+        if (!this.isLargeResult()) {
+            this.showStepVisualization(this.currentStepIndex);
+        }
     }
 
     previousStep() {
@@ -1853,13 +2333,25 @@ class BinPackingVisualizer {
             '#BAE1FF', '#DDA0DD', '#98FB98', '#F0E68C'
         ];
 
-        // Show items up to the current step
-        if (stepIndex >= 0 && this.packedResults && this.packedResults.packed_items) {
-            // Lấy các items đã pack đến step hiện tại (dựa trên pack_order)
-            const itemsToShow = this.packedResults.packed_items.filter(item =>
-                item.pack_order && item.pack_order <= stepIndex + 1
-            );
+        // Bin state snapshot of the algorithm step (if the solver sent one)
+        const snapshot = stepIndex >= 0 && this.stepStream ? this.stepStream.boxesAt(stepIndex) : null;
+        // Otherwise show items up to the current step
+        // Lấy các items đã pack đến step hiện tại (dựa trên pack_order)
+        const itemsToShow = !snapshot && stepIndex >= 0 && this.packedResults && this.packedResults.packed_items
+            ? this.packedResults.packed_items.filter(item => item.pack_order && item.pack_order <= stepIndex + 1)
+            : [];
+
+        if ((snapshot || itemsToShow).length > LOD_ITEM_THRESHOLD) {
+            this.showLargeStep(stepIndex, snapshot || itemsToShow, !!snapshot);
+            return;
+        }
+        this.clearLod();
 
+        if (snapshot) {
+            snapshot.forEach((box, index) => {
+                data.push(this.createItemMesh(box, colors[(index + 1) % colors.length]));
+            });
+        } else {
             itemsToShow.forEach((item, index) => {
                 const color = colors[item.pack_order % colors.length];
                 const itemMesh = this.createItemMesh(item, color);
@@ -1915,6 +2407,67 @@ class BinPackingVisualizer {
         }
     }
 
+    showLargeStep(stepIndex, boxes, fromSnapshot) {
+        // Too many boxes for one mesh per box: the final step shows the full LOD view,
+        // earlier steps of a saved run use the LOD view limited by pack order
+        if (stepIndex === this.packingSteps.length - 1 && this.isLargeResult()) {
+            this.visualizeLod(this.lodSource());
+            return;
+        }
+        if (!fromSnapshot && this.packedResults.run_id != null) {
+            this.visualizeLod(this.lodSource(stepIndex + 1));
+            return;
+        }
+
+        // Otherwise draw all boxes as a single merged mesh
+        this.clearLod();
+        try {
+            Plotly.react('plot3d', [this.createWarehouseOutline(), this.createBoxesMesh(boxes)], this.createPackingLayout());
+        } catch (error) {
+            console.error('Plot update error:', error);
+            this.showToast('Visualization update failed.', 'warning');
+        }
+    }
+
+    createBoxesMesh(boxes) {
+        // One mesh3d trace for many boxes, coloured by height
+        const x = [], y = [], z = [], i = [], j = [], k = [], intensity = [];
+        boxes.forEach(box => {
+            const x1 = box.x + box.length, y1 = box.y + box.width, z1 = box.z + box.height;
+            const base = x.length;
+            [[box.x, box.y, box.z], [x1, box.y, box.z], [x1, y1, box.z], [box.x, y1, box.z],
+             [box.x, box.y, z1], [x1, box.y, z1], [x1, y1, z1], [box.x, y1, z1]].forEach(vertex => {
+                x.push(vertex[0]);
+                y.push(vertex[1]);
+                z.push(vertex[2]);
+                intensity.push(vertex[2]);
+            });
+            BOX_FACES.forEach(face => {
+                i.push(base + face[0]);
+                j.push(base + face[1]);
+                k.push(base + face[2]);
+            });
+        });
+
+        return {
+            type: 'mesh3d',
+            x: x,
+            y: y,
+            z: z,
+            i: i,
+            j: j,
+            k: k,
+            intensity: intensity,
+            colorscale: 'Viridis',
+            cmin: 0,
+            cmax: this.binSize.height,
+            opacity: 0.9,
+            hoverinfo: 'skip',
+            showscale: false,
+            flatshading: true
+        };
+    }
+
     // JSON Structure Modal methods
     showJsonStructure() {
         this.jsonStructureModal.show();
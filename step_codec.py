@@ -0,0 +1,142 @@
+"""
+Delta encoding cho algorithm steps của /pack_step_by_step.
+
+Khi solver đính kèm snapshot trạng thái bin trong data của từng step, payload tăng
+theo bình phương số step. Codec lưu mỗi step dưới dạng delta so với step trước:
+- boxes: với mỗi trường snapshot (list các box có x, y, z) - placed / moved / removed
+- scores: các trường số đã thay đổi (giá trị mới)
+- set / unset: các trường khác đã thay đổi / bị bỏ
+Cứ STEP_KEYFRAME_INTERVAL step có một keyframe chứa data đầy đủ để nhảy tới step bất kỳ
+mà không phải giải mã từ đầu. Một step chỉ được lưu dạng delta nếu giải mã lại đúng
+data gốc, nếu không nó được lưu thành keyframe.
+
+static/js/main.js (StepStream) giải mã cùng format này cho playback controls.
+"""
+import os
+
+STEP_KEYFRAME_INTERVAL = int(os.environ.get('STEP_KEYFRAME_INTERVAL', 50))
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def is_box_list(value):
+    return isinstance(value, list) and all(
+        isinstance(box, dict) and 'x' in box and 'y' in box and 'z' in box for box in value
+    )
+
+def box_keys(boxes):
+    """Khóa của từng box: "<id>:<lần xuất hiện thứ n của id>" - không đổi khi box chỉ bị dời chỗ"""
+    seen = {}
+    keys = []
+    for box in boxes:
+        ident = box.get('id', box.get('item_id'))
+        count = seen.get(ident, 0)
+        seen[ident] = count + 1
+        keys.append(f'{ident}:{count}')
+    return keys
+
+def diff_boxes(previous, current):
+    previous_boxes = dict(zip(box_keys(previous), previous))
+    current_keys = box_keys(current)
+    current_set = set(current_keys)
+    delta = {'placed': [], 'moved': [], 'removed': [key for key in previous_boxes if key not in current_set]}
+    for key, box in zip(current_keys, current):
+        if key not in previous_boxes:
+            delta['placed'].append([key, box])
+        elif previous_boxes[key] != box:
+            delta['moved'].append([key, box])
+    return {name: changes for name, changes in delta.items() if changes}
+
+def apply_boxes(previous, delta):
+    boxes = dict(zip(box_keys(previous), previous))
+    for key in delta.get('removed', []):
+        boxes.pop(key, None)
+    for key, box in delta.get('moved', []):
+        boxes[key] = box
+    for key, box in delta.get('placed', []):
+        boxes[key] = box
+    return list(boxes.values())
+
+def diff_data(previous, current):
+    """Delta giữa data của hai step liên tiếp (cả hai là dict)"""
+    delta = {}
+    for key, value in current.items():
+        if key in previous and previous[key] == value:
+            continue
+        if key in previous and is_box_list(value) and is_box_list(previous[key]):
+            delta.setdefault('boxes', {})[key] = diff_boxes(previous[key], value)
+        elif is_number(value):
+            delta.setdefault('scores', {})[key] = value
+        else:
+            delta.setdefault('set', {})[key] = value
+    unset = [key for key in previous if key not in current]
+    if unset:
+        delta['unset'] = unset
+    return delta
+
+def apply_delta(previous, delta):
+    data = dict(previous)
+    for key in delta.get('unset', []):
+        data.pop(key, None)
+    data.update(delta.get('set', {}))
+    data.update(delta.get('scores', {}))
+    for key, changes in delta.get('boxes', {}).items():
+        data[key] = apply_boxes(previous[key], changes)
+    return data
+
+def encode_steps(steps, keyframe_interval=STEP_KEYFRAME_INTERVAL):
+    """
+    Encode danh sách steps (format webapp, có 'data') thành keyframes + deltas.
+
+    Returns:
+    - (encoded steps, thông tin encoding cho response)
+    """
+    encoded = []
+    previous = None
+    keyframes = 0
+    for i, step in enumerate(steps):
+        data = step.get('data', {})
+        entry = {key: value for key, value in step.items() if key != 'data'}
+
+        delta = None
+        if previous is not None and i % keyframe_interval != 0 and isinstance(data, dict):
+            delta = diff_data(previous, data)
+            if apply_delta(previous, delta) != data:
+                delta = None
+
+        if delta is None:
+            entry['keyframe'] = True
+            entry['data'] = data
+            keyframes += 1
+        else:
+            entry['delta'] = delta
+        encoded.append(entry)
+        previous = data if isinstance(data, dict) else None
+
+    return encoded, {
+        'format': 'delta',
+        'keyframe_interval': keyframe_interval,
+        'keyframes': keyframes
+    }
+
+def decode_steps(encoded):
+    """Ngược lại với encode_steps - trả về steps với data đầy đủ"""
+    steps = []
+    data = None
+    for entry in encoded:
+        data = entry['data'] if entry.get('keyframe') else apply_delta(data, entry['delta'])
+        step = {key: value for key, value in entry.items() if key not in ('keyframe', 'delta')}
+        step['data'] = data
+        steps.append(step)
+    return steps
+
+def is_encoded(entry):
+    return isinstance(entry, dict) and (entry.get('keyframe') or 'delta' in entry)
+
+def decode_step(encoded, index):
+    """Step thứ index với data đầy đủ, giải mã từ keyframe gần nhất phía trước"""
+    start = index
+    while start > 0 and not encoded[start].get('keyframe'):
+        start -= 1
+    return decode_steps(encoded[start:index + 1])[-1]
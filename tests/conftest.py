@@ -0,0 +1,116 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Cấu hình phải có trước khi import app
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'runs.db'))
+os.environ.setdefault('HEALTH_INTERVAL', '0')
+os.environ.setdefault('PACKING_CPU_EXECUTOR', 'thread')
+os.environ.setdefault('SOLVER_TIMEOUT', '1')
+
+# app phải được import trước các module dùng db (run_store, lod, export)
+from app import app as flask_app  # noqa: E402
+
+SLOW_SOLVER_DELAY = 2.0
+
+
+def shelf_pack(request_data):
+    """Solver giả: xếp items theo hàng dọc trục x, theo từng lớp chiều cao"""
+    L, W, H = (request_data['bin_size'][key] for key in ('L', 'W', 'H'))
+    x = y = z = shelf_l = layer_h = 0.0
+    packed, leftover, steps = [], [], []
+    for item in request_data['items']:
+        for _ in range(int(item.get('quantity', 1))):
+            l, w, h = item['L'], item['W'], item['H']
+            if y + w > W:
+                y, x, shelf_l = 0.0, x + shelf_l, 0.0
+            if x + l > L:
+                x, y, z, layer_h, shelf_l = 0.0, 0.0, z + layer_h, 0.0, 0.0
+            if l > L or w > W or h > H or z + h > H:
+                leftover.append({**item, 'quantity': 1})
+                continue
+            position = {'x': x, 'y': y, 'z': z}
+            packed.append({
+                'id': item['id'], 'request_id': item.get('request_id', item['id']),
+                'L': l, 'W': w, 'H': h, 'num_axis': item.get('num_axis', 2),
+                'rotation_id': 0, 'positions': [position]
+            })
+            steps.append({
+                'type': 'place',
+                'description': f"place {item['id']}",
+                'data': {'box': [x, y, z, l, w, h], 'placed': [group['positions'][0] for group in packed]}
+            })
+            y += w
+            shelf_l, layer_h = max(shelf_l, l), max(layer_h, h)
+    result = {'packed_items': packed, 'leftover_items': leftover, 'metadata': {'solver': 'shelf'}}
+    if request_data.get('parameters', {}).get('return_steps'):
+        return {'algorithm_steps': steps, 'final_result': result}
+    return result
+
+
+def create_solver_app():
+    from flask import Flask, jsonify, request
+
+    solver = Flask('fake_solver')
+
+    @solver.get('/health')
+    @solver.get('/slow/health')
+    @solver.get('/broken/health')
+    def health():
+        return jsonify({'status': 'ok'})
+
+    @solver.post('/pack')
+    def pack():
+        return jsonify(shelf_pack(request.get_json()))
+
+    @solver.post('/broken/pack')
+    def broken_pack():
+        # Trang lỗi không phải JSON, lặp lại id khách hàng như một số proxy / solver thật
+        ids = ', '.join(str(item['id']) for item in request.get_json()['items'])
+        return f'<html>solver crashed on items {ids}</html>', 502, {'Content-Type': 'text/html'}
+
+    @solver.post('/slow/pack')
+    def slow_pack():
+        time.sleep(SLOW_SOLVER_DELAY)
+        return jsonify(shelf_pack(request.get_json()))
+
+    return solver
+
+
+@pytest.fixture(scope='session')
+def solver_url():
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, create_solver_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+
+@pytest.fixture(scope='session')
+def app():
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def pack_body(solver_url):
+    def build(items, bin_size=(10, 10, 10), endpoint='/pack', **extra):
+        return {
+            'packing_endpoint': solver_url + endpoint,
+            'bin_size': dict(zip(('length', 'width', 'height'), bin_size)),
+            'items': items,
+            **extra
+        }
+    return build
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+import admission
+from admission import AdmissionRejected, FairScheduler, client_key
+
+
+def run_in_thread(scheduler, client, cost, order, hold=0.05, timeout=5):
+    def work():
+        try:
+            with scheduler.slot(client, cost, timeout=timeout):
+                order.append(client)
+                time.sleep(hold)
+        except AdmissionRejected:
+            order.append(f'rejected:{client}')
+    thread = threading.Thread(target=work)
+    thread.start()
+    return thread
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_waiting_requests_get_slot_smallest_first():
+    scheduler = FairScheduler(1, client_concurrency=1, policy='smallest')
+    order = []
+
+    with scheduler.slot('holder', 1):
+        threads = []
+        for client, cost in (('large', 500), ('small', 5), ('medium', 50)):
+            threads.append(run_in_thread(scheduler, client, cost, order))
+            wait_for(lambda: scheduler.snapshot()['waiting'] == len(threads))
+    for thread in threads:
+        thread.join()
+
+    assert order == ['small', 'medium', 'large']
+    snapshot = scheduler.snapshot()
+    assert snapshot['running'] == 0 and snapshot['waiting'] == 0
+    assert snapshot['queue_time']['samples'] == 4
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    scheduler = FairScheduler(1, client_concurrency=1, max_queue=1, client_queue=1)
+    order = []
+
+    with scheduler.slot('a', 1):
+        thread = run_in_thread(scheduler, 'b', 1, order)
+        wait_for(lambda: scheduler.snapshot()['waiting'] == 1)
+        with pytest.raises(AdmissionRejected) as rejected:
+            with scheduler.slot('c', 1):
+                pass
+    thread.join()
+
+    assert rejected.value.retry_after >= 1
+    assert order == ['b']
+    assert scheduler.snapshot()['clients']['c']['rejected'] == 1
+
+
+def test_queue_timeout_is_rejected():
+    scheduler = FairScheduler(1, client_concurrency=1)
+    order = []
+
+    with scheduler.slot('a', 1):
+        run_in_thread(scheduler, 'b', 1, order, timeout=0.05).join()
+
+    assert order == ['rejected:b']
+    assert scheduler.snapshot()['waiting'] == 0
+
+
+def test_client_key_ignores_forgeable_headers(monkeypatch):
+    headers = {'X-Client-Id': 'planner', 'X-Forwarded-For': '6.6.6.6, 10.0.0.5', 'X-Real-IP': '10.0.0.5'}
+
+    assert client_key(headers, '172.18.0.3') == '172.18.0.3'
+
+    monkeypatch.setattr(admission, 'ADMISSION_PROXY_HOPS', 1)
+    assert client_key(headers, '172.18.0.3') == '10.0.0.5'
+    assert client_key({'X-Forwarded-For': '6.6.6.6, 10.0.0.7'}, '172.18.0.3') == '10.0.0.7'
+
+    monkeypatch.setattr(admission, 'ADMISSION_PROXY_TOKEN', 'secret')
+    assert client_key(headers, '172.18.0.3') == '10.0.0.5'
+    assert client_key({**headers, 'X-Proxy-Token': 'secret'}, '172.18.0.3') == 'planner'
+
+
+def test_sync_worker_keeps_admission_and_warns(monkeypatch):
+    scheduler = FairScheduler(1)
+    monkeypatch.setattr(admission, '_scheduler', scheduler)
+    monkeypatch.setattr(admission, '_serving_warning', None)
+
+    with admission.admitted('a', [{'items': [{'quantity': 1}]}], multithread=False) as ticket:
+        assert ticket is not None and scheduler.snapshot()['running'] == 1
+
+    assert admission.get_scheduler() is scheduler
+    metrics = admission.admission_metrics()
+    assert metrics['enabled'] is True
+    assert 'sync worker' in metrics['warning']
+
+
+def test_every_solver_round_is_admitted(client, pack_body, monkeypatch):
+    scheduler = FairScheduler(1, client_concurrency=1)
+    monkeypatch.setattr(admission, '_scheduler', scheduler)
+    # Vòng 1 gọi một container, leftover tràn sang container thứ hai ở vòng 2
+    body = pack_body([{'id': 1, 'L': 3, 'W': 3, 'H': 1, 'quantity': 6}])
+    del body['bin_size']
+    body['containers'] = [{'name': 'small', 'length': 4, 'width': 4, 'height': 4, 'count': 2}]
+
+    payload = client.post('/pack', json=body).get_json()
+
+    assert len(payload['containers']) == 2
+    assert payload['queue_time'] >= 0
+    snapshot = scheduler.snapshot()
+    assert snapshot['clients']['127.0.0.1']['admitted'] == 2
+    assert snapshot['running'] == 0
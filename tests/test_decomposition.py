@@ -0,0 +1,94 @@
+from itertools import combinations
+
+from conftest import shelf_pack
+from decomposition import finish_decomposed, plan_decomposed, split_items, zone_bounds
+
+
+def api_item(item_id, dims, quantity):
+    return {'id': item_id, 'request_id': item_id, 'L': dims[0], 'W': dims[1], 'H': dims[2], 'num_axis': 2, 'quantity': quantity}
+
+
+def overlaps(a, b):
+    return all(
+        a[axis] < b[axis] + b[size] - 1e-6 and b[axis] < a[axis] + a[size] - 1e-6
+        for axis, size in (('x', 'length'), ('y', 'width'), ('z', 'height'))
+    )
+
+
+def test_split_items_spreads_every_type_across_zones():
+    api_items = [api_item(1, (2, 2, 2), 7), api_item(2, (1, 1, 1), 5)]
+
+    shares, volumes = split_items(api_items, 3)
+
+    assert [sum(share.get(i, 0) for share in shares) for i in range(2)] == [7, 5]
+    assert all(2 <= share[0] <= 3 for share in shares)
+    assert sum(volumes) == 7 * 8 + 5
+    assert max(volumes) - min(volumes) <= 8
+
+
+def test_zone_bounds_follow_volume_and_respect_min_length():
+    assert zone_bounds(10, [1.0, 1.0]) == [0, 5, 10]
+    assert zone_bounds(10, [1.0, 9.0]) == [0, 1, 10]
+    # Zone đầu cần ít nhất 4 (làm tròn lên từ 3.5); phần còn lại cho zone sau
+    assert zone_bounds(10, [1.0, 9.0], [3.5, 1.0]) == [0, 4, 10]
+    # Zone bị giữ ở min_length thì các zone còn lại chia phần còn lại theo thể tích
+    assert zone_bounds(20, [1.0, 3.0, 6.0], [8.0, 1.0, 1.0]) == [0, 8, 12, 20]
+
+
+def test_plan_clamps_zone_to_longest_item(solver_url):
+    # 3 items 8x8: zone có 1 item theo thể tích chỉ dài 7 nếu không giữ min_length
+    data = {
+        'packing_endpoint': solver_url + '/pack',
+        'bin_size': {'length': 20, 'width': 10, 'height': 10},
+        'items': [{'id': 1, 'L': 8, 'W': 8, 'H': 1, 'quantity': 3}],
+        'decomposition': {'zones': 2}
+    }
+
+    plan = plan_decomposed(data)
+
+    assert [zone['length'] for zone in plan.state['zones']] == [12, 8]
+    assert [call['bin_size']['L'] for call in plan.calls] == [12, 8]
+
+
+def test_decomposed_pack_merges_zones_without_overlaps(client, pack_body):
+    items = [{'id': i % 4, 'length': 2, 'width': 3, 'height': 2} for i in range(60)]
+
+    payload = client.post('/pack', json=pack_body(items, bin_size=(20, 10, 10), decomposition={'zones': 3})).get_json()
+
+    zones = payload['decomposition']['zones']
+    assert [zone['x'] for zone in zones] == [0, zones[0]['length'], zones[0]['length'] + zones[1]['length']]
+    assert len(payload['packed_items']) + len(payload['leftover_items']) == len(items)
+    for item in payload['packed_items']:
+        assert 0 <= item['x'] and item['x'] + item['length'] <= 20 + 1e-6
+    assert not any(overlaps(a, b) for a, b in combinations(payload['packed_items'], 2))
+
+
+def test_boundary_repair_places_zone_leftovers(solver_url):
+    data = {
+        'packing_endpoint': solver_url + '/pack',
+        'bin_size': {'length': 20, 'width': 10, 'height': 10},
+        'items': [{'id': 1, 'L': 2, 'W': 2, 'H': 2, 'quantity': 8}],
+        'decomposition': {'zones': 2}
+    }
+    plan = plan_decomposed(data)
+    results = [shelf_pack(call) for call in plan.calls]
+    # Zone thứ hai trả hết items về leftover: bước repair phải đặt chúng vào chỗ trống của bin
+    results[1] = {'packed_items': [], 'leftover_items': plan.calls[1]['items'], 'metadata': {}}
+
+    payload = finish_decomposed(plan.state, results, 0.0)
+
+    assert payload['decomposition']['repaired'] == 4
+    assert payload['leftover_items'] == []
+    assert len(payload['packed_items']) == 8
+    assert not any(overlaps(a, b) for a, b in combinations(payload['packed_items'], 2))
+
+
+def test_compare_round_reports_monolithic_solve(client, pack_body):
+    items = [{'id': i, 'length': 2, 'width': 2, 'height': 2} for i in range(20)]
+
+    payload = client.post('/pack', json=pack_body(items, bin_size=(20, 10, 10), decomposition={'zones': 2, 'compare': True})).get_json()
+
+    comparison = payload['decomposition']['comparison']
+    assert comparison['monolithic_packed'] == 20
+    assert comparison['utilization_loss'] == comparison['monolithic_utilization'] - payload['utilization']
+    assert comparison['speedup'] is None or comparison['speedup'] > 0
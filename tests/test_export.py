@@ -0,0 +1,119 @@
+import csv
+import io
+import json
+
+import pytest
+
+import export
+from run_store import get_run, run_result
+
+CHUNK_ROWS = 4
+
+
+@pytest.fixture
+def saved_run(app, client, pack_body, monkeypatch):
+    monkeypatch.setattr(export, 'EXPORT_CHUNK_ROWS', CHUNK_ROWS)
+    # 12 items vừa bin, 3 items không vừa hàng cuối -> cả packed lẫn leftover đều nhiều hơn 1 khối
+    items = [{'id': i, 'length': 3, 'width': 3, 'height': 10} for i in range(9)]
+    items += [{'id': 100 + i, 'length': 2, 'width': 2, 'height': 2} for i in range(6)]
+    payload = client.post('/pack', json=pack_body(items, bin_size=(9, 9, 10), presolve=False)).get_json()
+    with app.app_context():
+        run = get_run(payload['run_id'])
+        return run.id, run.manifest_hash, run_result(run)
+
+
+def result_rows(expected):
+    packed = expected['packed_items']
+    leftover = [
+        {'id': item['id'], 'length': item['length'], 'width': item['width'], 'height': item['height'], 'quantity': 1}
+        for item in expected['leftover_items']
+    ]
+    return packed, leftover
+
+
+def parse_export(fmt, text):
+    """(header, {section: rows}) của một export"""
+    if fmt == 'json':
+        data = json.loads(text)
+        sections = {key: value for key, value in data.items() if isinstance(value, list)}
+        return {key: value for key, value in data.items() if key not in sections}, sections
+    if fmt == 'ndjson':
+        lines = [json.loads(line) for line in text.splitlines()]
+        sections = {}
+        for line in lines[1:]:
+            sections.setdefault(line.pop('section'), []).append(line)
+        lines[0].pop('section')
+        return lines[0], sections
+    sections = {}
+    for row in csv.DictReader(io.StringIO(text)):
+        sections.setdefault(row.pop('section'), []).append({key: value for key, value in row.items() if value != ''})
+    return None, sections
+
+
+def as_text(rows, columns=None):
+    """So sánh với CSV: chỉ các cột của export, mọi giá trị thành chuỗi như csv.DictWriter"""
+    return [{key: str(value) for key, value in row.items() if columns is None or key in columns} for row in rows]
+
+
+@pytest.mark.parametrize('fmt', ['json', 'ndjson', 'csv'])
+def test_run_export_matches_run_result(client, saved_run, fmt):
+    run_id, _, expected = saved_run
+    packed, leftover = result_rows(expected)
+    assert len(packed) > CHUNK_ROWS and len(leftover) > CHUNK_ROWS
+
+    response = client.get(f'/runs/{run_id}/export?format={fmt}')
+
+    assert response.status_code == 200
+    assert response.mimetype == export.EXPORT_FORMATS[fmt][0]
+    assert f'packing_results_run{run_id}.{fmt}' in response.headers['Content-Disposition']
+    header, sections = parse_export(fmt, response.get_data(as_text=True))
+    if fmt == 'csv':
+        assert sections['packed_items'] == as_text(packed, export.RESULT_COLUMNS)
+        assert sections['leftover_items'] == as_text(leftover, export.RESULT_COLUMNS)
+    else:
+        assert header['run_id'] == run_id and header['utilization'] == expected['utilization']
+        assert sections['packed_items'] == packed
+        assert sections['leftover_items'] == leftover
+
+
+def test_run_export_is_streamed_in_chunks(app, saved_run):
+    run_id, _, expected = saved_run
+
+    with app.app_context():
+        chunks = list(export.export_run_results(get_run(run_id), 'ndjson')[0])
+
+    # Header + các khối CHUNK_ROWS dòng của packed và leftover
+    rows = len(expected['packed_items']) + len(expected['leftover_items'])
+    assert len(chunks) >= 1 + rows // CHUNK_ROWS
+    assert all(chunk.count('\n') <= CHUNK_ROWS for chunk in chunks[1:])
+
+
+@pytest.mark.parametrize('fmt', ['json', 'ndjson', 'csv'])
+def test_manifest_export_groups_items_by_dimensions(client, saved_run, fmt):
+    run_id, manifest_hash, _ = saved_run
+
+    response = client.get(f'/manifests/{manifest_hash}/export?format={fmt}')
+
+    assert response.status_code == 200
+    header, sections = parse_export(fmt, response.get_data(as_text=True))
+    items = sections['items']
+    if fmt == 'csv':
+        assert items == as_text([
+            {'id': 0, 'L': 3.0, 'W': 3.0, 'H': 10.0, 'num_axis': 2, 'quantity': 9},
+            {'id': 100, 'L': 2.0, 'W': 2.0, 'H': 2.0, 'num_axis': 2, 'quantity': 6}
+        ])
+    else:
+        assert header['manifest_hash'] == manifest_hash
+        assert items == [
+            {'id': 0, 'L': 3.0, 'W': 3.0, 'H': 10.0, 'num_axis': 2, 'quantity': 9},
+            {'id': 100, 'L': 2.0, 'W': 2.0, 'H': 2.0, 'num_axis': 2, 'quantity': 6}
+        ]
+
+
+def test_export_errors(client, saved_run):
+    run_id, _, _ = saved_run
+
+    assert client.get(f'/runs/{run_id}/export?format=xml').status_code == 400
+    assert client.get(f'/runs/{run_id}/export?part=steps').status_code == 400
+    assert client.get('/runs/999999/export').status_code == 404
+    assert client.get('/manifests/unknown/export').status_code == 404
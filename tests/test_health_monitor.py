@@ -0,0 +1,61 @@
+import health_monitor
+from health_monitor import HealthMonitor
+
+
+def test_background_probe_covers_configured_endpoints_only(solver_url):
+    configured, adhoc = solver_url + '/pack', solver_url + '/slow/pack'
+    monitor = HealthMonitor([configured], interval=0)
+    monitor.watch(adhoc)
+
+    monitor.probe_all()
+
+    assert monitor.get(configured).available is True
+    assert monitor.get(adhoc).checked_at is None
+
+
+def test_probe_does_not_register_endpoint(solver_url):
+    monitor = HealthMonitor(interval=0)
+
+    health = monitor.probe(solver_url + '/pack')
+
+    assert health.available is True
+    assert monitor.get(solver_url + '/pack') is None
+    assert monitor.snapshot() == []
+
+
+def test_adhoc_endpoints_expire_after_ttl(monkeypatch):
+    monitor = HealthMonitor(['http://solver/pack'], interval=0)
+    monitor.watch('http://adhoc/pack').used_at -= 120
+    monitor.watch('http://recent/pack')
+    monkeypatch.setattr(health_monitor, 'HEALTH_ENDPOINT_TTL', 60)
+
+    monitor.watch('http://other/pack')
+
+    assert [entry['endpoint'] for entry in monitor.snapshot()] == [
+        'http://solver/pack', 'http://recent/pack', 'http://other/pack'
+    ]
+
+
+def test_pack_failures_mark_adhoc_endpoint_down(client, pack_body, monkeypatch):
+    monkeypatch.setattr(health_monitor, 'HEALTH_STALE_AFTER', 60)
+    body = {**pack_body([{'id': 1, 'length': 1, 'width': 1, 'height': 1}]), 'packing_endpoint': 'http://127.0.0.1:1/pack'}
+
+    statuses = [client.post('/pack', json=body).status_code for _ in range(3)]
+
+    assert statuses == [400, 400, 503]
+    assert health_monitor.get_monitor().get('http://127.0.0.1:1/pack').error == 'unavailable'
+    health = client.get('/health').get_json()
+    assert all(solver['endpoint'] != 'http://127.0.0.1:1/pack' for solver in health['solvers'])
+    assert health['other_endpoints'] >= 1
+
+
+def test_solver_5xx_counts_as_failure_until_call_succeeds(monkeypatch):
+    monkeypatch.setattr(health_monitor, 'HEALTH_STALE_AFTER', 60)
+    health = health_monitor.EndpointHealth('http://solver/pack')
+
+    health.record_call(status_code=502)
+    health.record_call(error='timeout')
+    assert health.down() and health.error == 'timeout'
+
+    health.record_call(status_code=400)
+    assert not health.down() and health.available is True and health.consecutive_failures == 0
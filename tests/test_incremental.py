@@ -0,0 +1,84 @@
+from incremental import plan_incremental
+
+
+def unit_items(ids, dims=(2, 2, 2), **extra):
+    return [{'id': i, 'length': dims[0], 'width': dims[1], 'height': dims[2], **extra} for i in ids]
+
+
+def test_incremental_delta_adds_and_removes(client, pack_body):
+    base = client.post('/pack', json=pack_body(unit_items(range(10)))).get_json()
+
+    payload = client.post('/pack', json=pack_body([], incremental={
+        'run_id': base['run_id'],
+        'added_items': unit_items([100, 101]),
+        'removed_items': [9, {'id': 0, 'quantity': 1}]
+    })).get_json()
+
+    assert payload['success'] is True
+    assert payload['incremental']['mode'] == 'incremental'
+    assert payload['incremental']['added'] == 2 and payload['incremental']['removed'] == 2
+    ids = sorted(item['id'] for item in payload['packed_items'])
+    assert ids == sorted(set(range(10)) - {9, 0} | {100, 101})
+    # Các box cũ còn lại giữ nguyên vị trí
+    before = {item['id']: (item['x'], item['y'], item['z']) for item in base['packed_items']}
+    for item in payload['packed_items']:
+        if item['id'] in before:
+            assert (item['x'], item['y'], item['z']) == before[item['id']]
+
+
+def test_incremental_previous_result_requires_manifest(client, pack_body):
+    base = client.post('/pack', json=pack_body(unit_items(range(3)))).get_json()
+
+    response = client.post('/pack', json=pack_body([], incremental={
+        'previous_result': base, 'added_items': unit_items([9])
+    }))
+
+    assert response.status_code == 400
+    assert 'previous_manifest' in response.get_json()['message']
+
+
+def test_incremental_keeps_num_axis_from_manifest():
+    previous_result = {
+        'bin_size': {'length': 8, 'width': 8, 'height': 4},
+        'packed_items': [{'id': 1, 'request_id': 1, 'length': 8, 'width': 8, 'height': 3, 'x': 0, 'y': 0, 'z': 0}],
+        'leftover_items': [{'id': 2, 'request_id': 2, 'length': 1, 'width': 1, 'height': 6}]
+    }
+    previous_manifest = {'items': [
+        {'id': 1, 'request_id': 1, 'L': 8, 'W': 8, 'H': 3, 'num_axis': 2, 'quantity': 1},
+        {'id': 2, 'request_id': 2, 'L': 1, 'W': 1, 'H': 6, 'num_axis': 6, 'quantity': 1}
+    ]}
+
+    plan = plan_incremental({'incremental': {
+        'previous_result': previous_result, 'previous_manifest': previous_manifest, 'removed_items': [1]
+    }})
+
+    assert {unit['id']: unit['num_axis'] for unit in plan.manifest['items']} == {2: 6}
+    # Item xoay tự do nằm ngang được sau khi bớt box cũ
+    assert [item['id'] for item in plan.state['packed_items']] == [2]
+
+
+def test_incremental_unknown_removed_ids_are_rejected(client, pack_body):
+    base = client.post('/pack', json=pack_body(unit_items(range(3)))).get_json()
+
+    response = client.post('/pack', json=pack_body([], incremental={
+        'run_id': base['run_id'], 'removed_items': [1, 42, {'id': 2, 'quantity': 3}]
+    }))
+
+    assert response.status_code == 400
+    assert '42 (x1)' in response.get_json()['message'] and '2 (x2)' in response.get_json()['message']
+
+
+def test_incremental_with_custom_constraints_runs_full_solve(client, pack_body):
+    base = client.post('/pack', json=pack_body(unit_items(range(3)))).get_json()
+    parameters = {'stack_rule': [[3, 0, 3], [3, 3, 3], [3, 3, 3]], 'lifo_order': [0, 0, 1]}
+
+    payload = client.post('/pack', json=pack_body([], parameters=parameters, incremental={
+        'run_id': base['run_id'], 'added_items': unit_items([100]), 'removed_items': [0]
+    })).get_json()
+
+    assert payload['incremental']['mode'] == 'full_solve'
+    assert payload['incremental']['fallback_reason'] == 'custom stack_rule / lifo_order'
+    assert sorted(item['id'] for item in payload['packed_items']) == [1, 2, 100]
+    stored = client.get(f"/runs/{payload['run_id']}?include_manifest=1").get_json()
+    assert [item['id'] for item in stored['manifest']['items']] == [1, 2, 100]
+    assert stored['manifest']['parameters']['stack_rule'] == parameters['stack_rule']
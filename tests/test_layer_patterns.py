@@ -0,0 +1,43 @@
+import itertools
+
+import pytest
+
+from layer_patterns import block_pattern
+
+EPS = 1e-9
+
+
+def overlaps(a, b):
+    return all(
+        min(a[axis] + a[size], b[axis] + b[size]) - max(a[axis], b[axis]) > EPS
+        for axis, size in (('x', 'length'), ('y', 'width'), ('z', 'height'))
+    )
+
+
+@pytest.mark.parametrize('dims, count', [((3, 2, 2), 60), ((4, 3, 5), 9)])
+def test_layered_pack_has_no_overlaps(client, pack_body, dims, count):
+    items = [{'id': i, 'length': dims[0], 'width': dims[1], 'height': dims[2]} for i in range(count)]
+    items += [{'id': 1000, 'length': 1, 'width': 1, 'height': 1}]
+
+    payload = client.post('/pack', json=pack_body(items, bin_size=(10, 10, 10))).get_json()
+
+    assert payload['success'] is True
+    assert payload['layer_patterns']['blocks']
+    packed = payload['packed_items']
+    assert len(packed) + len(payload['leftover_items']) == len(items)
+    for item in packed:
+        assert item['x'] >= -EPS and item['x'] + item['length'] <= 10 + EPS
+        assert item['y'] >= -EPS and item['y'] + item['width'] <= 10 + EPS
+        assert item['z'] >= -EPS and item['z'] + item['height'] <= 10 + EPS
+    for a, b in itertools.combinations(packed, 2):
+        assert not overlaps(a, b), (a, b)
+
+
+def test_block_pattern_rects_are_disjoint():
+    rects = block_pattern(11, 7, 3, 2)
+
+    assert len(rects) >= 11
+    for x, y, l, w in rects:
+        assert x + l <= 11 + EPS and y + w <= 7 + EPS
+    for (x1, y1, l1, w1), (x2, y2, l2, w2) in itertools.combinations(rects, 2):
+        assert min(x1 + l1, x2 + l2) - max(x1, x2) <= EPS or min(y1 + w1, y2 + w2) - max(y1, y2) <= EPS
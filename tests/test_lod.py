@@ -0,0 +1,72 @@
+import numpy as np
+
+from lod import grid_shape, lod_summary, occupancy
+
+
+def cube_items(count, size=2.0, per_row=5):
+    return [
+        {'id': i, 'x': (i % per_row) * size, 'y': (i // per_row % per_row) * size, 'z': (i // per_row ** 2) * size,
+         'length': size, 'width': size, 'height': size, 'pack_order': i + 1}
+        for i in range(count)
+    ]
+
+
+def test_occupancy_fill_is_exact_volume_fraction():
+    # Một box 1.5 x 1 x 1 trên lưới ô cạnh 1: ô đầu đầy, ô sau đầy một nửa
+    boxes = np.array([[0.0, 0.0, 0.0, 1.5, 1.0, 1.0]])
+    shape, cell = grid_shape((2.0, 1.0, 1.0), 2, 'voxels')
+
+    fill, counts = occupancy(boxes, np.zeros(3), np.array([2.0, 1.0, 1.0]), shape, cell)
+
+    assert shape.tolist() == [2, 1, 1]
+    assert np.allclose(fill, [1.0, 0.5])
+    assert counts.tolist() == [1, 0]
+
+
+def test_lod_summary_conserves_volume():
+    boxes = np.array([[item[key] for key in ('x', 'y', 'z', 'length', 'width', 'height')] for item in cube_items(60)])
+    extent = (10.0, 10.0, 10.0)
+
+    for mode in ('voxels', 'slabs'):
+        summary = lod_summary(boxes, (0.0, 0.0, 0.0), extent, 7, mode)
+        cells = summary['cells']
+        # Ô cuối mỗi trục bị cắt bởi extent
+        sizes = [
+            np.minimum(np.array(cells[axis]) * size + size, extent[n]) - np.array(cells[axis]) * size
+            for n, (axis, size) in enumerate(zip('ijk', summary['cell_size']))
+        ]
+        filled = (np.array(cells['fill']) * sizes[0] * sizes[1] * sizes[2]).sum()
+        assert abs(filled - 60 * 8) < 60 * 8 * 0.01, mode
+        assert sum(cells['count']) == 60
+
+
+def test_visualize_lod_by_run_id(client, pack_body):
+    items = [{'id': i, 'length': 2, 'width': 2, 'height': 2} for i in range(30)]
+    run_id = client.post('/pack', json=pack_body(items)).get_json()['run_id']
+
+    summary = client.post('/visualize', json={'run_id': str(run_id), 'lod': {'resolution': 5}}).get_json()
+    partial = client.post('/visualize', json={'run_id': run_id, 'max_pack_order': 10, 'lod': {'resolution': 5}}).get_json()
+    region = client.post('/visualize', json={
+        'run_id': run_id, 'lod': {'region': {'min': [0, 0, 0], 'max': [2, 10, 2]}}
+    }).get_json()
+
+    assert summary['item_count'] == 30 and sum(summary['lod']['cells']['count']) == 30
+    assert partial['item_count'] == 10 and sum(partial['lod']['cells']['count']) == 10
+    assert region['region']['item_count'] == len(region['packed_items']) == 5
+
+
+def test_visualize_lod_rejects_bad_run_id(client):
+    response = client.post('/visualize', json={'run_id': 'abc', 'lod': {}})
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_visualize_packed_items_needs_lod_flag(client):
+    items = cube_items(10)
+
+    plain = client.post('/visualize', json={'packed_items': items, 'items': [{'id': 1, 'L': 1, 'W': 1, 'H': 1}]}).get_json()
+    lod = client.post('/visualize', json={'packed_items': items, 'max_pack_order': 4, 'lod': {'mode': 'slabs'}}).get_json()
+
+    assert 'lod' not in plain and plain['success'] is True
+    assert lod['item_count'] == 4 and lod['lod']['mode'] == 'slabs'
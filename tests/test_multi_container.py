@@ -0,0 +1,66 @@
+from multi_container import container_calls, container_parameters, parse_containers
+from placement import expand_units
+
+
+def test_leftover_spills_to_unused_container(client, pack_body):
+    # Theo volume cả 6 items được gán cho container đầu; solver chỉ xếp được 4
+    body = pack_body([{'id': 1, 'L': 3, 'W': 3, 'H': 1, 'quantity': 6}])
+    del body['bin_size']
+    body['containers'] = [{'name': 'small', 'length': 4, 'width': 4, 'height': 4, 'count': 2}]
+
+    payload = client.post('/pack', json=body).get_json()
+
+    assert payload['success'] is True
+    assert [len(container['packed_items']) for container in payload['containers']] == [4, 2]
+    assert payload['fleet']['containers_used'] == 2
+    assert payload['fleet']['packed_count'] == 6
+    assert payload['leftover_items'] == []
+
+
+def test_container_parameters_slice_custom_constraints():
+    parameters = {
+        'stack_rule': [[3, 0, 1], [2, 3, 0], [1, 1, 3]],
+        'lifo_order': [1, 2, 3],
+        'weights': {'W_lifo': 1.0}
+    }
+
+    sliced = container_parameters(parameters, 3, [2, 0, 0])
+
+    assert sliced['stack_rule'] == [[3, 1, 1], [1, 3, 3], [1, 3, 3]]
+    assert sliced['lifo_order'] == [3, 1, 1]
+    assert sliced['weights'] == {'W_lifo': 1.0}
+    # Kích thước không khớp số items thì để mặc định
+    assert container_parameters(parameters, 4, [0]) == {'weights': {'W_lifo': 1.0}}
+
+
+def test_container_calls_slice_by_manifest_row_for_shared_ids():
+    # Hai dòng manifest cùng id 1 nhưng khác kích thước và khác ràng buộc
+    api_items = [
+        {'id': 1, 'request_id': 1, 'L': 2.0, 'W': 2.0, 'H': 2.0, 'num_axis': 2, 'quantity': 1},
+        {'id': 1, 'request_id': 1, 'L': 3.0, 'W': 2.0, 'H': 2.0, 'num_axis': 2, 'quantity': 1},
+        {'id': 2, 'request_id': 2, 'L': 1.0, 'W': 1.0, 'H': 1.0, 'num_axis': 2, 'quantity': 1}
+    ]
+    parameters = {'stack_rule': [[3, 0, 1], [2, 3, 0], [1, 1, 3]], 'lifo_order': [1, 2, 3]}
+    units = expand_units(api_items, rows=True)
+    instances = parse_containers([{'L': 10, 'W': 10, 'H': 10}])
+
+    calls, _ = container_calls({'packing_endpoint': 'x', 'parameters': parameters}, instances, {0: units[1:]}, 3)
+
+    assert [item['L'] for item in calls[0]['items']] == [3.0, 1.0]
+    assert calls[0]['parameters']['stack_rule'] == [[3, 0], [1, 3]]
+    assert calls[0]['parameters']['lifo_order'] == [2, 3]
+
+
+def test_custom_constraints_skip_free_space_spill_over(client, pack_body):
+    # Solver giả để lại 4 items nhỏ; chỗ trống phía trên box lớn chứa được chúng khi nằm ngang
+    items = [{'id': 1, 'L': 4, 'W': 4, 'H': 3, 'quantity': 1}, {'id': 2, 'L': 1, 'W': 1, 'H': 2, 'num_axis': 6, 'quantity': 4}]
+    counts = []
+    for parameters in ({}, {'stack_rule': [[3, 0], [3, 3]], 'lifo_order': [0, 0]}):
+        body = pack_body(items, parameters=parameters)
+        del body['bin_size']
+        body['containers'] = [{'name': 'small', 'length': 4, 'width': 4, 'height': 4, 'count': 2}]
+        payload = client.post('/pack', json=body).get_json()
+        assert payload['leftover_items'] == []
+        counts.append([len(container['packed_items']) for container in payload['containers']])
+
+    assert counts == [[5], [1, 4]]
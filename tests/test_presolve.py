@@ -0,0 +1,87 @@
+import numpy as np
+
+from presolve import l2_bound, presolve, trim_quantities
+
+
+def test_l2_bound_beats_volume_bound():
+    # 3 items > nửa bin và 3 items nhỏ không ghép được với chúng
+    sizes = np.array([6.0, 4.5])
+    counts = np.array([3.0, 3.0])
+
+    assert l2_bound(sizes, counts, 10.0) == 5
+    assert np.ceil((sizes * counts).sum() / 10.0) == 4
+    assert l2_bound(np.array([]), np.array([]), 10.0) == 0
+
+
+def test_presolve_bounds_for_long_items():
+    # Mỗi item lớn hơn nửa bin theo cả L và W (lock axis): phải xếp chồng theo chiều cao
+    data = {
+        'bin_size': {'length': 10, 'width': 10, 'height': 10},
+        'items': [{'id': 1, 'L': 6, 'W': 6, 'H': 4, 'quantity': 3}]
+    }
+
+    _, report = presolve(data)
+    bounds = report['bounds']
+
+    assert bounds['lower_bounds']['volume'] == 1
+    assert bounds['lower_bounds']['l1'] == 2
+    assert bounds['lower_bounds']['l2'] == 2
+    assert bounds['bins_needed'] == 2
+    assert bounds['single_bin_possible'] is False
+
+
+def test_presolve_drops_unfit_and_trims_by_priority():
+    data = {
+        'bin_size': {'length': 10, 'width': 10, 'height': 10},
+        'items': [
+            {'id': 1, 'L': 5, 'W': 10, 'H': 10, 'quantity': 2, 'priority': 0},
+            {'id': 2, 'L': 5, 'W': 5, 'H': 10, 'quantity': 2, 'priority': 1},
+            {'id': 3, 'L': 12, 'W': 1, 'H': 1, 'quantity': 1}
+        ],
+        'volume_budget': 1
+    }
+
+    trimmed, report = presolve(data)
+
+    assert [(item['id'], item['quantity']) for item in trimmed['items']] == [(1, 1), (2, 2)]
+    assert report['bounds']['dropped'] == [{'id': 3, 'quantity': 1}]
+    assert report['bounds']['trimmed'] == 1
+    assert sorted(item['id'] for item in report['leftover_items']) == [1, 3]
+
+
+def test_trim_quantities_cuts_after_budget_in_request_order():
+    volumes, quantities = np.array([2.0, 2.0, 1.0]), np.array([2.0, 2.0, 3.0])
+
+    assert trim_quantities(volumes, quantities, np.zeros(3), 7.0).tolist() == [2.0, 1.0, 0.0]
+    assert trim_quantities(volumes, quantities, np.zeros(3), 9.0).tolist() == [2.0, 2.0, 1.0]
+    assert trim_quantities(volumes, quantities, np.array([0.0, 0.0, 1.0]), 4.0).tolist() == [0.0, 0.0, 3.0]
+
+
+def test_unfit_items_end_in_leftovers_with_or_without_presolve(client, pack_body):
+    items = [{'id': 1, 'length': 2, 'width': 2, 'height': 2}, {'id': 2, 'length': 12, 'width': 1, 'height': 1}]
+
+    for extra in ({}, {'presolve': False}):
+        response = client.post('/pack', json=pack_body(items, **extra))
+        payload = response.get_json()
+        assert response.status_code == 200
+        assert [item['id'] for item in payload['packed_items']] == [1]
+        assert [item['id'] for item in payload['leftover_items']] == [2]
+
+    response = client.post('/pack_step_by_step', json=pack_body(items))
+    assert response.status_code == 200
+
+
+def test_run_store_keeps_manifest_before_presolve(client, pack_body):
+    items = [{'id': i, 'length': 2, 'width': 2, 'height': 2} for i in range(4)]
+    items.append({'id': 9, 'length': 12, 'width': 1, 'height': 1})
+
+    baseline = client.post('/pack', json=pack_body(items, presolve=False)).get_json()
+    trimmed = client.post('/pack', json=pack_body(items, volume_budget=0.01)).get_json()
+    dropped = client.post('/pack', json=pack_body(items[-1:])).get_json()
+
+    assert trimmed['bounds']['trimmed'] > 0
+    assert dropped['packed_items'] == [] and dropped['bounds']['dropped'] == [{'id': 9, 'quantity': 1}]
+    runs = [client.get(f"/runs/{payload['run_id']}?include_manifest=1").get_json() for payload in (baseline, trimmed, dropped)]
+    assert runs[0]['run']['manifest_hash'] == runs[1]['run']['manifest_hash']
+    assert [item['id'] for item in runs[1]['manifest']['items']] == [0, 1, 2, 3, 9]
+    assert [item['id'] for item in runs[2]['manifest']['items']] == [9]
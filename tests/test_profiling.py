@@ -0,0 +1,115 @@
+import time
+
+import pytest
+from flask import Flask, jsonify
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import asgi
+import profiling
+
+TOKEN = 'secret-token'
+
+
+def busy_work(duration=0.05):
+    deadline = time.perf_counter() + duration
+    total = 0
+    while time.perf_counter() < deadline:
+        total += 1
+    return total
+
+
+@pytest.fixture
+def profile_settings(monkeypatch, tmp_path):
+    def configure(token=None, sample_rate=0.0):
+        monkeypatch.setattr(profiling, 'PROFILE_ADMIN_TOKEN', token)
+        monkeypatch.setattr(profiling, 'PROFILE_SAMPLE_RATE', sample_rate)
+        monkeypatch.setattr(profiling, 'PROFILING_ENABLED', token is not None or sample_rate > 0)
+        monkeypatch.setattr(profiling, 'PROFILE_INTERVAL', 0.001)
+        monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path))
+        return tmp_path
+    return configure
+
+
+def profiled_flask_client(route='/work'):
+    test_app = Flask(__name__)
+
+    def work():
+        busy_work()
+        return jsonify({'success': True})
+
+    test_app.add_url_rule(route, 'work', profiling.profiled(work, route), methods=['POST'])
+    return test_app.test_client()
+
+
+def test_disabled_profiler_returns_raw_view(profile_settings):
+    profile_settings()
+
+    def view():
+        return None
+
+    async def handler(request):
+        return None
+
+    assert profiling.profiled(view, '/pack') is view
+    assert profiling.aprofiled(handler, '/pack') is handler
+
+
+def test_token_triggers_profile_with_folded_output(profile_settings):
+    profile_dir = profile_settings(token=TOKEN)
+    test_client = profiled_flask_client()
+
+    assert 'X-Profile-Id' not in test_client.post('/work').headers
+    assert 'X-Profile-Id' not in test_client.post('/work', headers={'X-Profile-Token': 'wrong'}).headers
+    response = test_client.post('/work', headers={'X-Profile-Token': TOKEN, 'X-Request-Id': 'req-1'})
+
+    profile_id = response.headers['X-Profile-Id']
+    folded = (profile_dir / f'{profile_id}.folded').read_text().splitlines()
+    assert folded and any('busy_work (test_profiling.py' in line for line in folded)
+    for line in folded:
+        stack, count = line.rsplit(' ', 1)
+        assert stack and int(count) > 0
+    meta = profiling.list_profiles()[0]
+    assert meta['id'] == profile_id and meta['route'] == '/work' and meta['request_id'] == 'req-1'
+    assert meta['status_code'] == 200 and meta['samples'] == sum(int(line.rsplit(' ', 1)[1]) for line in folded)
+
+
+def test_sample_rate_triggers_profile(profile_settings):
+    profile_settings(sample_rate=1.0)
+
+    response = profiled_flask_client().post('/work')
+
+    assert profiling.read_profile(response.headers['X-Profile-Id'])
+
+
+def test_profiles_routes_require_token(client, profile_settings):
+    profile_settings()
+    assert client.get('/profiles', headers={'X-Profile-Token': ''}).status_code == 403
+
+    profile_settings(token=TOKEN)
+    profile_id = profiled_flask_client().post('/work', headers={'X-Profile-Token': TOKEN}).headers['X-Profile-Id']
+
+    assert client.get('/profiles').status_code == 403
+    assert client.get('/profiles', headers={'X-Profile-Token': 'wrong'}).status_code == 403
+    assert client.get(f'/profiles/{profile_id}').status_code == 403
+    listing = client.get('/profiles', headers={'X-Profile-Token': TOKEN}).get_json()
+    assert [meta['id'] for meta in listing['profiles']] == [profile_id]
+    download = client.get(f'/profiles/{profile_id}', headers={'X-Profile-Token': TOKEN})
+    assert download.status_code == 200 and 'busy_work' in download.get_data(as_text=True)
+
+
+def test_async_profile_includes_executor_samples(profile_settings):
+    profile_settings(token=TOKEN)
+
+    async def work(request):
+        await asgi.run_cpu(busy_work, 0.1)
+        return JSONResponse({'success': True})
+
+    with TestClient(Starlette(routes=[Route('/work', profiling.aprofiled(work, '/work'), methods=['POST'])])) as test_client:
+        assert 'X-Profile-Id' not in test_client.post('/work').headers
+        response = test_client.post('/work', headers={'X-Profile-Token': TOKEN})
+
+    folded = profiling.read_profile(response.headers['X-Profile-Id'])
+    assert any('sampled_call (profiling.py' in line and 'busy_work' in line for line in folded.splitlines())
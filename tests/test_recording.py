@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+import recording
+import replay
+from conftest import shelf_pack
+from packing import build_packing_request
+
+ITEM_IDS = [9001, 9002, 9003]
+
+
+@pytest.fixture
+def record_dir(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(recording, 'RECORD_DIR', str(tmp_path))
+    monkeypatch.setattr(recording, 'RECORD_RATE', 1.0)
+    # in_process_poster tắt run store của app dùng chung -> trả lại sau test
+    monkeypatch.setitem(os.environ, 'RUN_STORE_ENABLED', os.environ.get('RUN_STORE_ENABLED', '1'))
+    monkeypatch.setitem(app.config, 'RUN_STORE_ENABLED', app.config.get('RUN_STORE_ENABLED', True))
+    return tmp_path
+
+
+def recorded(record_dir):
+    """Các record đã ghi (chờ writer thread ghi xong)"""
+    recording.get_writer().submit(lambda: None).result()
+    records = []
+    for day in sorted(os.listdir(record_dir)):
+        records += recording.load_day(str(record_dir), day)
+    return records
+
+
+def items_body(pack_body, endpoint='/pack'):
+    items = [{'id': item_id, 'length': 4, 'width': 3, 'height': 2, 'quantity': 2} for item_id in ITEM_IDS]
+    return pack_body(items, endpoint=endpoint, presolve=False)
+
+
+def test_record_then_replay_in_process_has_no_changed_results(client, pack_body, record_dir):
+    assert client.post('/pack', json=items_body(pack_body)).status_code == 200
+    records = recorded(record_dir)
+    assert len(records) == 1 and len(records[0]['calls']) == 1
+
+    solver_replay = replay.SolverReplay(records, latency_scale=0)
+    server, replay_url = replay.start_replay_server(solver_replay)
+    try:
+        rows = replay.run_replay(records, replay.in_process_poster(), replay_url)
+    finally:
+        server.shutdown()
+
+    report = replay.replay_report(rows, solver_replay)
+    assert report['requests'] == 1
+    assert report['changed_results'] == []
+    assert report['solver_matches'] == {'exact': 1}
+    assert rows[0]['response']['packed_items'] == len(ITEM_IDS)
+
+
+def test_recorded_ids_are_anonymized_and_restored_on_replay(client, pack_body, record_dir):
+    data = items_body(pack_body)
+    client.post('/pack', json=data)
+    call = recorded(record_dir)[0]['calls'][0]
+
+    # Không id gốc nào nằm trong record
+    recorded_ids = {item['id'] for item in call['request']['items']}
+    assert recorded_ids == {1, 2, 3}
+    assert {group['id'] for group in call['response']['packed_items']} <= recorded_ids
+
+    # Replay server trả lại đúng response của solver, với id của request mới
+    _, packing_request, _ = build_packing_request(data)
+    status_code, body, _, _ = replay.SolverReplay([{'calls': [call]}], latency_scale=0).respond(packing_request)
+    assert status_code == 200
+    assert body == shelf_pack(packing_request)
+    assert {group['id'] for group in body['packed_items']} == set(ITEM_IDS)
+
+
+def test_non_json_solver_error_text_is_redacted(client, pack_body, record_dir):
+    response = client.post('/pack', json=items_body(pack_body, endpoint='/broken/pack'))
+    assert response.status_code == 400
+    assert '9001' in response.get_json()['message']
+
+    record = recorded(record_dir)[0]
+    call = record['calls'][0]
+    assert call['status_code'] == 502
+    assert call['response'] is None and call['text'] == recording.REDACTED_TEXT
+    assert recording.REDACTED_TEXT in record['response']['message']
+    assert not any(str(item_id) in repr(record) for item_id in ITEM_IDS)
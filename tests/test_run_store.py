@@ -0,0 +1,92 @@
+from run_store import (
+    compact_leftover_items, compact_packed_items, expand_leftover_groups, expand_packed_items, get_run,
+    run_manifest, run_result, save_run
+)
+
+PACKED_KEYS = ('id', 'request_id', 'length', 'width', 'height', 'x', 'y', 'z', 'pack_order')
+
+
+def test_compact_packed_items_round_trip():
+    packed_items = [
+        {
+            'id': i // 3, 'request_id': i // 3, 'length': 2, 'width': 3, 'height': 1,
+            'original_length': 3, 'original_width': 2, 'original_height': 1, 'rotation_id': 1,
+            'x': float(i), 'y': 0.0, 'z': 0.0, 'pack_order': i + 1,
+            'position_index': i % 3 + 1, 'total_positions': 3, 'item_type_id': i // 3
+        }
+        for i in range(9)
+    ]
+
+    groups = compact_packed_items(packed_items)
+
+    assert len(groups) == 3
+    assert expand_packed_items(groups) == packed_items
+
+def test_compact_leftover_items_round_trip():
+    leftover_items = [{'id': i % 2, 'request_id': i % 2, 'length': 1, 'width': 1, 'height': 1} for i in (0, 0, 1, 1, 0)]
+
+    assert expand_leftover_groups(compact_leftover_items(leftover_items)) == leftover_items
+
+def test_saved_run_matches_pack_response(client, pack_body):
+    items = [{'id': i, 'length': 2, 'width': 3, 'height': 2} for i in range(12)]
+    payload = client.post('/pack', json=pack_body(items, parameters={'weights': {'W_lifo': 1.0}})).get_json()
+
+    stored = client.get(f"/runs/{payload['run_id']}?include_manifest=1").get_json()
+
+    for key in ('packed_items', 'leftover_items', 'bin_size', 'utilization', 'training_score', 'packing_steps'):
+        assert stored[key] == payload[key], key
+    assert stored['run']['item_count'] == len(items)
+    assert stored['manifest']['parameters']['weights'] == {'W_lifo': 1.0}
+    assert [item['id'] for item in stored['manifest']['items']] == list(range(len(items)))
+
+def test_save_run_and_load(app):
+    packing_request = {
+        'items': [{'id': 1, 'request_id': 1, 'L': 2.0, 'W': 2.0, 'H': 2.0, 'num_axis': 2, 'quantity': 2}],
+        'bin_size': {'L': 4, 'W': 4, 'H': 4},
+        'parameters': {}
+    }
+    packed_items = [
+        {'id': 1, 'request_id': 1, 'length': 2.0, 'width': 2.0, 'height': 2.0, 'rotation_id': 0,
+         'x': 0.0, 'y': 0.0, 'z': 0.0, 'pack_order': 1, 'position_index': 1, 'total_positions': 1}
+    ]
+    leftover_items = [{'id': 1, 'request_id': 1, 'length': 2.0, 'width': 2.0, 'height': 2.0}]
+    payload = {
+        'packed_items': packed_items, 'leftover_items': leftover_items,
+        'utilization': 0.125, 'training_score': 0.0, 'packing_time': 0.01
+    }
+
+    with app.app_context():
+        run_id = save_run('http://solver/pack', packing_request, payload, solver_time=0.005)
+        run = get_run(run_id)
+        result = run_result(run)
+        manifest = run_manifest(run)
+
+    assert run.item_count == 2 and run.packed_count == 1 and run.leftover_count == 1
+    assert [{key: item[key] for key in PACKED_KEYS} for item in result['packed_items']] == [
+        {key: item[key] for key in PACKED_KEYS} for item in packed_items
+    ]
+    assert result['leftover_items'] == leftover_items
+    assert manifest['items'] == packing_request['items']
+
+def test_run_store_disabled(app):
+    app.config['RUN_STORE_ENABLED'] = False
+    try:
+        with app.app_context():
+            assert save_run('http://solver/pack', {'items': [], 'bin_size': {'L': 1, 'W': 1, 'H': 1}}, {}) is None
+    finally:
+        app.config['RUN_STORE_ENABLED'] = True
+
+def test_solver_endpoint_only_shown_with_admin_token(client, pack_body, monkeypatch):
+    import profiling
+    monkeypatch.setattr(profiling, 'PROFILE_ADMIN_TOKEN', 'secret')
+    body = pack_body([{'id': 1, 'length': 2, 'width': 2, 'height': 2}])
+    run_id = client.post('/pack', json=body).get_json()['run_id']
+
+    listed = client.get('/runs?per_page=100').get_json()['runs']
+    assert listed and not any('solver_endpoint' in run for run in listed)
+    assert 'solver_endpoint' not in client.get(f'/runs/{run_id}').get_json()['run']
+    assert 'solver_endpoint' not in client.get(f'/runs/{run_id}', headers={'X-Profile-Token': 'wrong'}).get_json()['run']
+
+    admin = {'X-Profile-Token': 'secret'}
+    assert client.get(f'/runs/{run_id}', headers=admin).get_json()['run']['solver_endpoint'] == body['packing_endpoint']
+    assert all('solver_endpoint' in run for run in client.get('/runs?per_page=100', headers=admin).get_json()['runs'])
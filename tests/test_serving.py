@@ -0,0 +1,73 @@
+import pytest
+from starlette.testclient import TestClient
+
+import asgi
+
+# Các trường phụ thuộc thời gian chạy hoặc run store
+VOLATILE_KEYS = {'packing_time', 'run_id', 'layer_patterns'}
+
+
+def unit_items(count, dims=(2, 3, 2)):
+    return [{'id': i, 'length': dims[0], 'width': dims[1], 'height': dims[2]} for i in range(count)]
+
+
+@pytest.fixture(scope='module')
+def async_client():
+    with TestClient(asgi.app) as test_client:
+        yield test_client
+
+
+def stable(payload):
+    payload = {key: value for key, value in payload.items() if key not in VOLATILE_KEYS}
+    if 'algorithm_steps' in payload:
+        payload['algorithm_steps'] = [
+            {key: value for key, value in step.items() if key != 'timestamp'} for step in payload['algorithm_steps']
+        ]
+    return payload
+
+
+@pytest.mark.parametrize('route', ['/pack', '/pack_step_by_step'])
+def test_flask_and_asgi_responses_match(client, async_client, pack_body, route):
+    body = pack_body(unit_items(20))
+
+    flask_response = client.post(route, json=body)
+    async_response = async_client.post(route, json=body)
+
+    assert flask_response.status_code == async_response.status_code == 200
+    assert stable(flask_response.get_json()) == stable(async_response.json())
+
+
+def test_flask_and_asgi_errors_match(client, async_client, pack_body):
+    for body in ({}, {'packing_endpoint': 'x'}, pack_body([])):
+        flask_response = client.post('/pack', json=body)
+        async_response = async_client.post('/pack', json=body)
+        assert flask_response.status_code == async_response.status_code
+        assert flask_response.get_json() == async_response.json()
+
+
+@pytest.mark.parametrize('route', ['/pack', '/pack_step_by_step'])
+def test_solver_timeout_returns_504(client, async_client, pack_body, route):
+    body = pack_body(unit_items(3), endpoint='/slow/pack')
+
+    for status_code, payload in (
+        (lambda r: (r.status_code, r.get_json()))(client.post(route, json=body)),
+        (lambda r: (r.status_code, r.json()))(async_client.post(route, json=body)),
+    ):
+        assert status_code == 504
+        assert payload['success'] is False
+        assert 'timeout' in payload['message']
+
+
+def test_asgi_check_endpoint_probes_without_blocking_client(client, async_client, solver_url, monkeypatch):
+    import health_monitor
+
+    def blocking_probe(*args, **kwargs):
+        raise AssertionError('ASGI /check_endpoint must not use the blocking probe')
+
+    for endpoint in (solver_url + '/pack', 'http://127.0.0.1:1/pack'):
+        flask_payload = client.post('/check_endpoint', json={'endpoint_url': endpoint}).get_json()
+        with monkeypatch.context() as patched:
+            patched.setattr(health_monitor, 'probe_solver', blocking_probe)
+            async_response = async_client.post('/check_endpoint', json={'endpoint_url': endpoint})
+        assert async_response.json()['success'] == flask_payload['success']
+        assert async_response.json()['message'] == flask_payload['message']
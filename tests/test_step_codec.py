@@ -0,0 +1,46 @@
+from step_codec import decode_step, decode_steps, encode_steps
+
+
+def make_steps(count):
+    steps, placed = [], []
+    for i in range(count):
+        placed = placed + [{'id': i % 4, 'x': float(i), 'y': 0.0, 'z': 0.0}]
+        if i % 5 == 4:
+            # Dời một box và bỏ một box
+            placed = [{**placed[0], 'y': 1.0}] + placed[2:]
+        data = {'placed': placed, 'score': i * 0.5, 'phase': 'fill' if i < count // 2 else 'repair'}
+        if i % 3 == 0:
+            data['note'] = f'step {i}'
+        steps.append({'step_number': i + 1, 'step_type': 'place', 'description': f'step {i}', 'data': data})
+    return steps
+
+
+def test_encode_decode_round_trip():
+    steps = make_steps(23)
+
+    encoded, info = encode_steps(steps, keyframe_interval=8)
+
+    assert decode_steps(encoded) == steps
+    assert info['keyframes'] == sum(1 for entry in encoded if entry.get('keyframe'))
+    assert all(encoded[i].get('keyframe') for i in (0, 8, 16))
+    assert sum(1 for entry in encoded if 'delta' in entry) > len(steps) // 2
+
+
+def test_decode_single_step_from_nearest_keyframe():
+    steps = make_steps(23)
+    encoded, _ = encode_steps(steps, keyframe_interval=8)
+
+    for index in range(len(steps)):
+        assert decode_step(encoded, index) == steps[index]
+
+
+def test_get_step_returns_full_data(client, pack_body):
+    items = [{'id': i, 'length': 2, 'width': 3, 'height': 2} for i in range(12)]
+    result = client.post('/pack_step_by_step', json=pack_body(items)).get_json()
+    assert result['step_encoding']['format'] == 'delta'
+
+    payload = client.post('/get_step', json={'step_number': 5, 'algorithm_steps': result['algorithm_steps']}).get_json()
+
+    assert payload['success'] is True
+    assert payload['step'] == decode_steps(result['algorithm_steps'])[5]
+    assert len(payload['step']['data']['placed']) == 6